@@ -0,0 +1,92 @@
+import math
+import time
+import logging
+
+import redis
+
+from app.services.keys import get_request_queue_key, get_request_stream_key, get_throughput_key
+from app.services.metrics import ESTIMATED_WAIT, ADMISSION_REJECTIONS
+from app.core.config import (
+    QUEUE_BACKEND, ADMISSION_SLO, ADMISSION_SLOS, ADMISSION_WINDOW, ADMISSION_REFRESH, THROUGHPUT_BUCKET_SECONDS,
+    PRIORITY_LANES, DEFAULT_PRIORITY
+)
+
+logger = logging.getLogger(__name__)
+
+#--- Admission Control ---
+#estimates how long a new job would wait in its language queue: queue depth / worker throughput
+#the depth counts the jobs of the job's own lane and of the more urgent lanes, which are served first
+#the worker adds every batch's job count and inference seconds to per-language time buckets, and
+#the throughput is the jobs of the last `window` seconds divided by the shorter of the window and
+#the summed busy seconds. Saturated workers give the real aggregate rate; idle ones give the speed
+#of a single worker, a cautious guess of what they could do under load.
+#jobs that would wait longer than the language's SLO are rejected with a Retry-After of the time
+#the queue needs to drain back to the SLO, instead of being accepted and expiring unread
+#each API process reads a language's depth and throughput at most once per `refresh` seconds
+class AdmissionController:
+    def __init__(self, redis_client, slo: float = ADMISSION_SLO, language_slos: dict | None = None,
+                 window: int = ADMISSION_WINDOW, refresh: float = ADMISSION_REFRESH):
+        self.redis_client = redis_client
+        self.slo = slo
+        self.language_slos = ADMISSION_SLOS if language_slos is None else language_slos
+        self.window = window
+        self.refresh = refresh
+        #(language, lane) -> (read at, queue depth, jobs per second or None without recent batches)
+        self._estimates = {}
+
+    #returns the SLO of a language in seconds; 0 means its jobs are always admitted
+    def get_slo(self, lang: str):
+        return self.language_slos.get(lang.lower(), self.slo)
+
+    #returns None if a job for lang may be queued in a lane, or else the seconds to send in Retry-After
+    async def check(self, lang: str, priority: str = DEFAULT_PRIORITY):
+        slo = self.get_slo(lang)
+        if not slo:
+            return None
+        depth, throughput = await self._estimate(lang.lower(), priority)
+        #without batches in the window there is nothing to estimate from, e.g. right after an idle spell
+        if not throughput:
+            return None
+        wait = depth / throughput
+        ESTIMATED_WAIT.labels(lang.lower()).set(wait)
+        if wait <= slo:
+            return None
+        ADMISSION_REJECTIONS.labels(lang.lower()).inc()
+        logger.warning(f"Rejecting a {priority} {lang} job: {depth} queued at {throughput:.2f} jobs/s is ~{wait:.0f}s, over the {slo:.0f}s SLO.")
+        return max(1, math.ceil(wait - slo))
+
+    #returns the queue depth ahead of a lane and the language's throughput, reading them if the last read is too old
+    async def _estimate(self, lang: str, priority: str):
+        now = time.time()
+        read_at, depth, throughput = self._estimates.get((lang, priority), (0.0, 0, None))
+        if now - read_at < self.refresh:
+            return depth, throughput
+        #requests arriving while this one reads keep using the previous estimate
+        self._estimates[(lang, priority)] = (now, depth, throughput)
+        lanes = PRIORITY_LANES[:PRIORITY_LANES.index(priority) + 1]
+
+        current_bucket = int(now // THROUGHPUT_BUCKET_SECONDS)
+        buckets = range(current_bucket - max(1, self.window // THROUGHPUT_BUCKET_SECONDS) + 1, current_bucket + 1)
+        #the buckets cover the seconds since the start of the oldest one, the current one is still filling
+        span = now - buckets[0] * THROUGHPUT_BUCKET_SECONDS
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for lane in lanes:
+                    if QUEUE_BACKEND == 'stream':
+                        pipe.xlen(get_request_stream_key(lang, lane))
+                    else:
+                        pipe.llen(get_request_queue_key(lang, lane))
+                for bucket in buckets:
+                    pipe.hmget(get_throughput_key(lang, bucket), ['jobs', 'busy'])
+                replies = await pipe.execute()
+        except redis.exceptions.RedisError as e:
+            #the submit that follows reports Redis being unreachable, admission keeps the last estimate
+            logger.error(f"Could not read the {lang} queue depth and throughput: {e}")
+            return depth, throughput
+
+        depth, counts = sum(replies[:len(lanes)]), replies[len(lanes):]
+        jobs = sum(int(bucket_jobs or 0) for bucket_jobs, _ in counts)
+        busy = sum(float(bucket_busy or 0) for _, bucket_busy in counts)
+        throughput = jobs / min(span, busy) if jobs and busy else None
+        self._estimates[(lang, priority)] = (now, depth, throughput)
+        return depth, throughput
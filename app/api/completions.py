@@ -0,0 +1,70 @@
+import asyncio
+import logging
+
+import redis
+
+from app.core.config import COMPLETIONS_CHANNEL
+
+logger = logging.getLogger(__name__)
+
+#--- Completion Notifications ---
+#the worker publishes the request ID of every finished job on COMPLETIONS_CHANNEL
+#each API process holds one subscription to that channel and wakes up the requests that are
+#waiting for those IDs, so waiting for a result needs no polling of Redis
+#Redis pub/sub does not store messages: a notification sent while the subscription is being
+#re-established is lost, so waiters always re-read the result key when they wake up or time out
+class CompletionListener:
+    def __init__(self, redis_client, channel: str = COMPLETIONS_CHANNEL, retry_delay: float = 1.0):
+        self.redis_client = redis_client
+        self.channel = channel
+        self.retry_delay = retry_delay
+        #request ID -> queues of the requests waiting for it
+        self._waiters = {}
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    #returns a queue that receives each of the request IDs once its job has finished
+    #call this before reading the results, so a completion in between is not missed
+    def register(self, request_ids: list[str]):
+        queue = asyncio.Queue()
+        for request_id in request_ids:
+            self._waiters.setdefault(request_id, set()).add(queue)
+        return queue
+
+    def unregister(self, request_ids: list[str], queue: asyncio.Queue):
+        for request_id in request_ids:
+            queues = self._waiters.get(request_id)
+            if queues is not None:
+                queues.discard(queue)
+                if not queues:
+                    del self._waiters[request_id]
+
+    #hands a published request ID to every request waiting for it
+    def notify(self, request_id: str):
+        for queue in self._waiters.get(request_id, ()):
+            queue.put_nowait(request_id)
+
+    #reads the channel for the life of the process, resubscribing after a lost connection
+    async def _listen(self):
+        while True:
+            pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                async for message in pubsub.listen():
+                    if message['type'] == 'message':
+                        self.notify(message['data'])
+            except redis.exceptions.RedisError as e:
+                logger.error(f"Lost the subscription to {self.channel}: {e}. Retrying in {self.retry_delay}s.")
+                await asyncio.sleep(self.retry_delay)
+            finally:
+                await pubsub.aclose()
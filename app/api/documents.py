@@ -0,0 +1,270 @@
+import io
+import csv
+import json
+import time
+import uuid
+import asyncio
+import logging
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+
+from app.api.schemas import DocumentProgress
+from app.api.endpoints import get_redis, get_admission_controller, get_translation_memory, admit, recall_translations
+from app.services.keys import (
+    get_translation_cache_key, get_request_queue_key, get_request_stream_key, get_document_key, get_document_results_key
+)
+from app.services.documents import add_document_result, touch_document
+from app.services.codec import encode_job, decode_translation
+from app.services.metrics import REDIS_SECONDS, count_cache_lookups
+from app.core.config import (
+    LANGUAGE_CODES, QUEUE_BACKEND, DOCUMENT_TTL, DOCUMENT_CHUNK_ITEMS, RESULT_STREAM_MAX, RESULT_STREAM_HEARTBEAT,
+    DEFAULT_QUALITY
+)
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+#file format of each accepted Content-Type
+CONTENT_TYPES = {
+    'application/x-ndjson': 'jsonl',
+    'application/jsonl': 'jsonl',
+    'application/json-lines': 'jsonl',
+    'text/csv': 'csv',
+}
+#progress counters of a document, every one starts at 0
+DOCUMENT_COUNTERS = ('total', 'cached', 'completed', 'failed')
+
+#--- Helpers ---
+
+#yields the lines of a request body as bytes as they arrive, holding no more than one line and one network chunk
+async def iter_lines(body):
+    buffer = b''
+    async for chunk in body:
+        buffer += chunk
+        *lines, buffer = buffer.split(b'\n')
+        for line in lines:
+            yield line
+    if buffer:
+        yield buffer
+
+#yields (text, None) for every record of an uploaded file as it arrives, or (None, error) for a record that cannot be read
+#JSONL records are objects with the text in text_field; CSV files start with a header row naming a text_field column
+#a CSV record is complete once its quotes are balanced, so quoted fields may span lines
+async def iter_records(body, file_format: str, text_field: str):
+    column = None
+    pending = ''
+    async for line in iter_lines(body):
+        if file_format == 'jsonl':
+            if not line.strip():
+                continue
+            try:
+                text = json.loads(line)[text_field]
+            except (ValueError, KeyError, TypeError, IndexError):
+                yield None, f"Line is not a JSON object with a '{text_field}' field."
+                continue
+        else:
+            try:
+                pending += line.decode('utf-8-sig') + '\n'
+            except UnicodeDecodeError:
+                pending = ''
+                yield None, "Record is not valid UTF-8."
+                continue
+            if pending.count('"') % 2 or not pending.strip():
+                continue
+            fields, pending = next(csv.reader(io.StringIO(pending))), ''
+            if column is None:
+                if text_field not in fields:
+                    raise HTTPException(status_code=422, detail=f"The CSV header has no '{text_field}' column.")
+                column = fields.index(text_field)
+                continue
+            text = fields[column] if column < len(fields) else None
+        if isinstance(text, str) and text.strip():
+            yield text, None
+        else:
+            yield None, f"Record has no text in '{text_field}'."
+
+#looks up one chunk of a document's records in the cache and queues the misses as jobs, in one transaction
+#records: (index, text or None, error or None); hits and unreadable records go straight to the results stream
+async def enqueue_chunk(redis_client, translation_memory, document_id: str, lang: str, priority: str, records: list,
+                        quality: str = DEFAULT_QUALITY):
+    readable = [(index, text) for index, text, error in records if error is None]
+    cache_keys = [get_translation_cache_key(text, lang, quality) for _, text in readable]
+    with REDIS_SECONDS.labels('cache_lookup').time():
+        cached_results = [decode_translation(value) for value in await redis_client.mget(cache_keys)] if cache_keys else []
+    missing_keys = [cache_key for cache_key, cached_result in zip(cache_keys, cached_results) if cached_result is None]
+    count_cache_lookups('redis', hits=len(cache_keys) - len(missing_keys), misses=len(missing_keys))
+    remembered = await recall_translations(translation_memory, redis_client, missing_keys)
+
+    tasks = []
+    with REDIS_SECONDS.labels('submit').time():
+        async with redis_client.pipeline() as pipe:
+            for index, _, error in records:
+                if error is not None:
+                    add_document_result(pipe, document_id, index, 'failed', error, 'failed')
+            for (index, text), cache_key, cached_result in zip(readable, cache_keys, cached_results):
+                cached_result = cached_result or remembered.get(cache_key)
+                if cached_result:
+                    add_document_result(pipe, document_id, index, 'completed', cached_result, 'cached')
+                    continue
+                #an ordinary job, so the worker batches it with the others of its lane
+                #identical items are not coalesced, the worker translates each sentence of a batch once
+                task = {
+                    'id': f"{document_id}:{index}", 'text': text, 'lang': lang, 'queued_at': time.time(),
+                    'priority': priority, 'document': document_id, 'index': index,
+                }
+                if quality != DEFAULT_QUALITY:
+                    task['quality'] = quality
+                tasks.append(encode_job(task))
+            if tasks and QUEUE_BACKEND == 'stream':
+                stream_key = get_request_stream_key(lang, priority)
+                for task in tasks:
+                    pipe.xadd(stream_key, {'task': task})
+            elif tasks:
+                pipe.rpush(get_request_queue_key(lang, priority), *tasks)
+            pipe.hincrby(get_document_key(document_id), 'total', len(records))
+            touch_document(pipe, document_id)
+            await pipe.execute()
+
+#converts a document's progress hash to its API model
+def to_progress(document_id: str, fields: dict):
+    counts = {counter: int(fields.get(counter, 0)) for counter in DOCUMENT_COUNTERS}
+    done = counts['cached'] + counts['completed'] + counts['failed']
+    if fields.get('uploaded') != '1':
+        document_status = "uploading"
+    else:
+        document_status = "completed" if done >= counts['total'] else "processing"
+    return DocumentProgress(
+        document_id=document_id, status=document_status, target_language=fields['target_language'],
+        priority=fields['priority'], quality=fields.get('quality', DEFAULT_QUALITY), pending=max(counts['total'] - done, 0), **counts
+    )
+
+#returns a document's progress, 404 if the ID is unknown or expired
+async def read_progress(redis_client, document_id: str):
+    fields = await redis_client.hgetall(get_document_key(document_id))
+    if not fields:
+        raise HTTPException(status_code=404, detail="Document ID not found.")
+    return to_progress(document_id, fields)
+
+#--- API Endpoints ---
+
+@router.post(
+    '/documents',
+    response_model=DocumentProgress,
+    status_code=status.HTTP_202_ACCEPTED,
+    tags=['Documents'],
+    responses={429: {"description": "The language's queue would take longer than its SLO, see Retry-After."}},
+    #dependencies=[Depends(verify_token)]
+)
+#accepts a JSONL or CSV file as the request body and queues its texts as they arrive, DOCUMENT_CHUNK_ITEMS at a time
+#the file is never held in memory; the response comes once it is read, with the progress so far
+async def upload_document(
+    request: Request,
+    target_language: str = Query(..., description="The full name of the target language"),
+    priority: Literal["interactive", "bulk"] = Query("bulk", description="Queue lane of the document's items"),
+    quality: Literal["fast", "balanced", "best"] = Query("balanced", description="Quality tier of the document's items"),
+    file_format: Literal["jsonl", "csv"] | None = Query(None, alias="format", description="Overrides the Content-Type"),
+    text_field: str = Query("text", description="JSONL field or CSV column holding the text"),
+    redis_client=Depends(get_redis),
+    admission_controller=Depends(get_admission_controller),
+    translation_memory=Depends(get_translation_memory),
+):
+    lang = target_language.lower()
+    if lang not in LANGUAGE_CODES:
+        raise HTTPException(status_code=422, detail=f"Language '{target_language}' not supported.")
+    file_format = file_format or CONTENT_TYPES.get(request.headers.get('content-type', '').split(';')[0].strip())
+    if file_format is None:
+        raise HTTPException(status_code=415, detail="Send a JSONL (application/x-ndjson) or CSV (text/csv) file, or pass format.")
+    await admit(admission_controller, [lang], priority)
+
+    document_id = str(uuid.uuid4())
+    document_key = get_document_key(document_id)
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.hset(document_key, mapping={'target_language': lang, 'priority': priority, 'quality': quality, 'uploaded': 0,
+                                         **dict.fromkeys(DOCUMENT_COUNTERS, 0)})
+        pipe.expire(document_key, DOCUMENT_TTL)
+        await pipe.execute()
+
+    index = 0
+    chunk = []
+    try:
+        async for text, error in iter_records(request.stream(), file_format, text_field):
+            chunk.append((index, text, error))
+            index += 1
+            if len(chunk) == DOCUMENT_CHUNK_ITEMS:
+                await enqueue_chunk(redis_client, translation_memory, document_id, lang, priority, chunk, quality)
+                chunk = []
+        if chunk:
+            await enqueue_chunk(redis_client, translation_memory, document_id, lang, priority, chunk, quality)
+    except HTTPException:
+        #only a bad CSV header is raised, before anything was queued
+        await redis_client.delete(document_key)
+        raise
+    await redis_client.hset(document_key, 'uploaded', 1)
+
+    progress = await read_progress(redis_client, document_id)
+    logger.info(f"Document {document_id}: {progress.total} {lang} items read, {progress.cached} from cache, {progress.failed} unreadable.")
+    return progress
+
+@router.get(
+    '/documents/{document_id}',
+    response_model=DocumentProgress,
+    tags=['Documents'],
+    #dependencies=[Depends(verify_token)]
+)
+#reports how many items of a document have been read, answered from the cache, translated or failed
+async def get_document_progress(document_id: str, redis_client=Depends(get_redis)):
+    return await read_progress(redis_client, document_id)
+
+@router.get(
+    '/documents/{document_id}/results',
+    tags=['Documents'],
+    response_class=StreamingResponse,
+    #dependencies=[Depends(verify_token)]
+)
+#streams a document's item results as NDJSON in the order they finished, while the document is still being translated
+#every line carries the item's index in the file and a cursor; a client that reconnects passes the last cursor as
+#after and continues from there. With follow, the stream stays open until every item has a result or the timeout
+#passes, otherwise it ends with the results available now
+#if a worker crashes after saving a batch with QUEUE_BACKEND=stream, its items may be reported twice, keep the last line per index
+async def stream_document_results(
+    document_id: str,
+    after: str = Query("0", description="cursor of the last result already received"),
+    follow: bool = Query(True, description="wait for results that are not ready yet"),
+    timeout: float = Query(RESULT_STREAM_MAX, gt=0, le=RESULT_STREAM_MAX, description="seconds to keep the stream open"),
+    redis_client=Depends(get_redis),
+):
+    await read_progress(redis_client, document_id)
+    results_key = get_document_results_key(document_id)
+
+    async def lines():
+        cursor = after
+        deadline = asyncio.get_running_loop().time() + timeout
+        finished = False
+        while True:
+            reply = await redis_client.xread({results_key: cursor}, count=DOCUMENT_CHUNK_ITEMS)
+            entries = reply[0][1] if reply else []
+            for entry_id, fields in entries:
+                cursor = entry_id
+                yield json.dumps({
+                    'index': int(fields['index']), 'status': fields['status'], 'result': fields['result'],
+                    'from_cache': fields['from_cache'] == '1', 'cursor': entry_id,
+                }) + '\n'
+            if entries:
+                continue
+            #the results read before the document was seen finished are not necessarily all of them, so read once more
+            if finished or not follow:
+                return
+            fields = await redis_client.hgetall(get_document_key(document_id))
+            finished = not fields or to_progress(document_id, fields).status == "completed"
+            remaining = deadline - asyncio.get_running_loop().time()
+            if finished:
+                continue
+            if remaining <= 0:
+                return
+            #wait for the next result, without holding the pooled connection longer than a heartbeat
+            await redis_client.xread({results_key: cursor}, count=1,
+                                     block=int(min(remaining, RESULT_STREAM_HEARTBEAT) * 1000))
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers={"Cache-Control": "no-cache"})
@@ -1,45 +1,218 @@
 import uuid
 import json
+import time
+import asyncio
 import logging
-from fastapi import APIRouter, HTTPException, Response, status #,depends
+import redis
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST
 
-from app.api.schemas import TranslationRequest, JobResponse, Result
-from app.services.translation_engine import get_translation_cache_key, RESULTS_CACHE_PREFIX, REQUEST_QUEUE_KEY
+from app.api.schemas import (
+    TranslationRequest, JobResponse, Result,
+    BatchTranslationRequest, BatchTranslationItem, BatchItemResponse, BatchJobResponse,
+    BatchResultRequest, BatchResultItem, BatchResultResponse
+)
+from app.api.l1_cache import translation_l1_cache
+#only lightweight modules are imported here, the API never loads torch or transformers
+from app.services.keys import get_translation_cache_key, get_request_queue_key, get_request_stream_key
+from app.services.coalescing import get_inflight_keys
+from app.services.codec import encode_job, encode_translation, decode_translation
+from app.services.metrics import REDIS_SECONDS, count_cache_lookups, render_metrics
+from app.core.config import (
+    RESULTS_CACHE_PREFIX, QUEUED_RESULT_TTL, FINISHED_RESULT_TTL, INFLIGHT_TTL, LANGUAGE_CODES, MAX_BATCH_ITEMS,
+    RESULT_WAIT_MAX, RESULT_STREAM_MAX, RESULT_STREAM_HEARTBEAT, QUEUE_BACKEND, TRANSLATION_CACHE_TTL, DEFAULT_QUALITY
+)
 #from auth import verify_token
-from app.db.redis_client import redis_client
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+#job statuses after which a result no longer changes
+FINISHED_STATUSES = ('completed', 'failed')
+
+#--- Dependencies ---
+
+#returns the pooled asyncio Redis client created by the lifespan hook in main.py
+#every endpoint awaits its Redis calls, so a slow round-trip never blocks the event loop
+def get_redis(request: Request):
+    redis_client = getattr(request.app.state, 'redis', None)
+    if redis_client is None:
+        raise HTTPException(status_code=503, detail="Service Unavailable: Cannot Connect to Redis.")
+    return redis_client
+
+#returns the submit script registered once on the Redis client by the lifespan hook
+#it runs by its SHA and only falls back to sending the Lua source if Redis does not know it yet
+def get_submit_script(request: Request):
+    submit_script = getattr(request.app.state, 'submit_script', None)
+    if submit_script is None:
+        raise HTTPException(status_code=503, detail="Service Unavailable: Cannot Connect to Redis.")
+    return submit_script
+
+#returns the admission controller created by the lifespan hook, None (admit everything) without one
+def get_admission_controller(request: Request):
+    return getattr(request.app.state, 'admission', None)
+
+#raises 429 with a Retry-After header if a job for any of the languages would wait past its SLO in its lane
+async def admit(admission_controller, languages, priority: str):
+    if admission_controller is None:
+        return
+    retry_after = [seconds for lang in languages if (seconds := await admission_controller.check(lang, priority))]
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many queued translations, retry later.",
+            headers={"Retry-After": str(max(retry_after))}
+        )
+
+#returns the durable translation memory opened by the lifespan hook, None when it is not configured
+def get_translation_memory(request: Request):
+    return getattr(request.app.state, 'translation_memory', None)
+
+#returns the listener for the worker's completion notifications, None if the lifespan hook has not started one
+def get_completion_listener(request: Request):
+    return getattr(request.app.state, 'completion_listener', None)
+
+#--- Helpers ---
+
+#builds the keys and arguments of the submit script for one cache miss, queued in the given priority lane
+#cache_key must be the key of the same quality tier, so only identical requests of that tier attach to the job
+def build_submit_args(cache_key: str, request_id: str, translation_request: TranslationRequest | BatchTranslationItem,
+                      priority: str, quality: str = DEFAULT_QUALITY):
+    inflight_key, waiters_key = get_inflight_keys(cache_key, priority)
+    #dictionary containing all the information the worker needs to process the job
+    task = {
+        'id': request_id,
+        'text': translation_request.text,
+        'lang': translation_request.target_language,
+        #lets the worker's scheduler serve languages whose oldest job has waited too long
+        'queued_at': time.time(),
+        #lets the worker report latency per lane and find the job's in-flight marker
+        'priority': priority,
+    }
+    #jobs of the default tier carry no quality, as jobs of older versions did
+    if quality != DEFAULT_QUALITY:
+        task['quality'] = quality
+    #the initial status lets the user see their job in the queue
+    initial_payload = json.dumps({'status': 'queued', 'result': None})
+    if QUEUE_BACKEND == 'stream':
+        queue_key = get_request_stream_key(translation_request.target_language, priority)
+    else:
+        queue_key = get_request_queue_key(translation_request.target_language, priority)
+    return {
+        'keys': [cache_key, inflight_key, waiters_key, f"{RESULTS_CACHE_PREFIX}{request_id}", queue_key],
+        'args': [request_id, initial_payload, encode_job(task), QUEUED_RESULT_TTL, INFLIGHT_TTL, QUEUE_BACKEND],
+    }
+
+#looks up Redis misses in the translation memory and copies the hits back into Redis and the in-process cache
+#returns {cache key: translation} of the keys found. SQLite calls block, so they run in a thread.
+#the memory only saves work, so errors reading it or copying its hits count as misses or are logged
+async def recall_translations(translation_memory, redis_client, cache_keys: list[str]):
+    if translation_memory is None or not cache_keys:
+        return {}
+    try:
+        remembered = await asyncio.to_thread(translation_memory.get_many, cache_keys)
+    except Exception as e:
+        logger.error(f"Error reading the translation memory: {e}")
+        remembered = {}
+    count_cache_lookups('memory', hits=len(remembered), misses=len(cache_keys) - len(remembered))
+    if remembered:
+        try:
+            with REDIS_SECONDS.labels('promote').time():
+                async with redis_client.pipeline(transaction=False) as pipe:
+                    for cache_key, translation in remembered.items():
+                        pipe.set(cache_key, encode_translation(translation), ex=TRANSLATION_CACHE_TTL)
+                    await pipe.execute()
+        except redis.exceptions.RedisError as e:
+            logger.error(f"Could not copy {len(remembered)} translations from the translation memory to Redis: {e}")
+        for cache_key, translation in remembered.items():
+            translation_l1_cache.set(cache_key, translation)
+    return remembered
+
+#reads the results of many jobs with one MGET and shortens the lifetime of the finished ones
+#returns (request_id, result dict or None if the ID is unknown or expired) in the same order
+async def read_results(redis_client, request_ids: list[str]):
+    result_keys = [f"{RESULTS_CACHE_PREFIX}{request_id}" for request_id in request_ids]
+    results_json = await redis_client.mget(result_keys)
+    results = [json.loads(result_json) if result_json else None for result_json in results_json]
+
+    #shorten the lifetime of picked up results, same as the single result endpoint
+    finished_keys = [key for key, result in zip(result_keys, results) if result and result.get('status') in FINISHED_STATUSES]
+    if finished_keys:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for result_key in finished_keys:
+                pipe.expire(result_key, FINISHED_RESULT_TTL)
+            await pipe.execute()
+    return list(zip(request_ids, results))
+
+#formats one server-sent event
+def format_event(event: str, data: dict):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+#converts a Redis PTTL reply to the seconds an in-process copy of the key may live
+#keys without an expiry (-1) keep the in-process cache's own TTL
+def remaining_ttl(pttl: int):
+    return pttl / 1000 if pttl >= 0 else None
+
 #--- API Endpoints ---
 
 @router.get('/health', tags=['Monitoring'])
 #checks the status of the service and its connection to Redis
-async def health_check():
-    if redis_client and redis_client.ping():
-        return {"api_status": "ok", "redis_status": "ok"}
+async def health_check(redis_client=Depends(get_redis)):
+    try:
+        if await redis_client.ping():
+            return {"api_status": "ok", "redis_status": "ok"}
+    except redis.exceptions.RedisError as e:
+        logger.error(f"Health check could not reach Redis: {e}")
     raise HTTPException(status_code=503, detail="Service Unavailable: Cannot connect to Redis.")
 
+@router.get('/cache/stats', tags=['Monitoring'])
+#reports the hit/miss counters and usage of this worker's in-process translation cache
+async def cache_stats():
+    return {"l1": translation_l1_cache.stats()}
+
+@router.get('/metrics', tags=['Monitoring'])
+#exposes the API's Prometheus metrics: cache lookups by layer and Redis round-trip times
+async def metrics():
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
 #defines the endpoint for submitting a new translation job
 @router.post(
-    '/translate', 
+    '/translate',
     response_model=JobResponse | Result,
     status_code=status.HTTP_202_ACCEPTED,
     tags=['Translation'],
+    responses={429: {"description": "The language's queue would take longer than its SLO, see Retry-After."}},
     #dependencies=[Depends(verify_token)]
 )
 #accepts a translation request, checks the cache, or queues it for a background worker
-async def submit_translation(translation_request: TranslationRequest, response: Response):
-    if not redis_client:
-        raise HTTPException(status_code=503, detail="Service Unavailable: Cannot Connect to Redis.")
-
+async def submit_translation(translation_request: TranslationRequest, response: Response, redis_client=Depends(get_redis),
+                             submit_script=Depends(get_submit_script),
+                             admission_controller=Depends(get_admission_controller),
+                             translation_memory=Depends(get_translation_memory)):
     # --- Cache Check ---
     #generate the unique key for this specific text and language combination.
-    final_cache_key = get_translation_cache_key(translation_request.text, translation_request.target_language)
-    #attempt to get the result from the Redis cache
-    cached_result = redis_client.get(final_cache_key)
+    final_cache_key = get_translation_cache_key(translation_request.text, translation_request.target_language,
+                                                translation_request.quality)
+    #try this process's in-memory cache first, then fall back to the shared Redis cache
+    cached_result = translation_l1_cache.get(final_cache_key)
+    count_cache_lookups('l1', hits=int(bool(cached_result)), misses=int(not cached_result))
+    if not cached_result:
+        #fetch the key's remaining lifetime with it, so the local copy expires no later than Redis'
+        with REDIS_SECONDS.labels('cache_lookup').time():
+            async with redis_client.pipeline(transaction=False) as pipe:
+                pipe.get(final_cache_key)
+                pipe.pttl(final_cache_key)
+                cached_result, pttl = await pipe.execute()
+        cached_result = decode_translation(cached_result)
+        count_cache_lookups('redis', hits=int(bool(cached_result)), misses=int(not cached_result))
+        if cached_result:
+            translation_l1_cache.set(final_cache_key, cached_result, ttl=remaining_ttl(pttl))
+        else:
+            #expired from Redis, but translated before
+            cached_result = (await recall_translations(translation_memory, redis_client, [final_cache_key])).get(final_cache_key)
     if cached_result:
-        truncated_key = final_cache_key.split(':')[-1][:12] 
+        truncated_key = final_cache_key.split(':')[-1][:12]
         logger.info(f"Cache hit for key ending in: ...{truncated_key}")
 
         response.status_code = status.HTTP_200_OK
@@ -50,50 +223,232 @@ async def submit_translation(translation_request: TranslationRequest, response:
         )
 
     # --- Queue New Job ---
-    logger.info(f"Cache miss for key: {final_cache_key}. Submitting new job.")
+    #turn the job away if its queue cannot be drained within the SLO
+    await admit(admission_controller, [translation_request.target_language], translation_request.priority)
     #generate a new, unique ID for this job request
     request_id = str(uuid.uuid4())
-    #dictionary containing all the information the worker needs to process the job
-    task = {
-        'id': request_id,
-        'text': translation_request.text,
-        'lang': translation_request.target_language,
-     }
+    #queue the job, or attach to an identical job that is already pending, in one round-trip
+    with REDIS_SECONDS.labels('submit').time():
+        outcome, value = await submit_script(**build_submit_args(final_cache_key, request_id, translation_request,
+                                                                   translation_request.priority, translation_request.quality))
 
-    #key where the job's result will be stored.
-    result_key = f"{RESULTS_CACHE_PREFIX}{request_id}"
-
-    #set an intial status so user and see their job in the queue
-    initial_payload = json.dumps({'status': 'queued', 'result': None})
-    #store initial status in Redis with TTL of 1 hour
-    redis_client.set(result_key, initial_payload, ex=3600)
+    if outcome == 'cached':
+        #the translation was saved between the cache check and the submit
+        value = decode_translation(value)
+        translation_l1_cache.set(final_cache_key, value)
+        response.status_code = status.HTTP_200_OK
+        return Result(status="completed", result=value, from_cache=True)
 
-    #push job to the end of the worker queue in Redis
-    redis_client.rpush(REQUEST_QUEUE_KEY, json.dumps(task))
+    if outcome == 'attached':
+        logger.info(f"Request {request_id} attached to in-flight job {value}.")
+    else:
+        logger.info(f"Cache miss for key: {final_cache_key}. Submitted new job {request_id}.")
     return JobResponse(message="Request accepted.", request_id=request_id)
 
 @router.get(
-    "/result/{request_id}", 
+    "/result/{request_id}",
     response_model=Result,
     tags=['Translation'],
     #dependencies=[Depends(verify_token)]
 )
 #retrieves the result of a translation job by its ID
-async def get_translation_result(request_id: str):
-    if not redis_client:
-        raise HTTPException(status_code=503, detail="Service Unavailable: Cannot connect to Redis.")
-
+#with wait, a job that has not finished yet is held for up to that many seconds until the
+#worker announces its completion, instead of the client polling
+async def get_translation_result(
+    request_id: str,
+    wait: float = Query(0, ge=0, le=RESULT_WAIT_MAX, description="seconds to wait for the job to finish"),
+    redis_client=Depends(get_redis),
+    completion_listener=Depends(get_completion_listener)
+):
     #key where the result should be stored
     result_key = f"{RESULTS_CACHE_PREFIX}{request_id}"
-    # Try to get the result data from Redis.
-    result_json = redis_client.get(result_key)
+    #listen before reading, so a completion between the read and the wait is not missed
+    completions = completion_listener.register([request_id]) if wait and completion_listener else None
+    try:
+        # Try to get the result data from Redis.
+        result_json = await redis_client.get(result_key)
+        if completions is not None and result_json and json.loads(result_json).get('status') not in FINISHED_STATUSES:
+            try:
+                await asyncio.wait_for(completions.get(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+            #re-read in both cases: a notification can be lost while the listener reconnects
+            result_json = await redis_client.get(result_key)
+    finally:
+        if completions is not None:
+            completion_listener.unregister([request_id], completions)
+
     if not result_json:
         #the ID is invalid or the result has expired
         raise HTTPException(status_code=404, detail="Request ID not found.")
 
     #if data was found, parse the JSON string back into a Python dictionary
     result = json.loads(result_json)
-    if result.get('status') in ['completed', 'failed']:
-        redis_client.expire(result_key, 300)
+    if result.get('status') in FINISHED_STATUSES:
+        await redis_client.expire(result_key, FINISHED_RESULT_TTL)
 
     return Result(**result)
+
+#defines the endpoint for submitting many translation jobs at once
+@router.post(
+    '/translate/batch',
+    response_model=BatchJobResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+    tags=['Translation'],
+    responses={429: {"description": "A language of the batch would wait longer than its SLO, see Retry-After."}},
+    #dependencies=[Depends(verify_token)]
+)
+#resolves every cache hit with a single MGET and queues all misses in one pipelined round-trip
+async def submit_translation_batch(batch_request: BatchTranslationRequest, response: Response, redis_client=Depends(get_redis),
+                                   submit_script=Depends(get_submit_script),
+                                   admission_controller=Depends(get_admission_controller),
+                                   translation_memory=Depends(get_translation_memory)):
+    items = batch_request.items
+    responses = [None] * len(items)
+    #items for a language without a worker queue fail on their own, the rest of the batch goes ahead
+    for i, item in enumerate(items):
+        if item.target_language not in LANGUAGE_CODES:
+            responses[i] = BatchItemResponse(status="failed", result=f"Language '{item.target_language}' not supported.")
+
+    # --- Cache Check ---
+    cache_keys = [get_translation_cache_key(item.text, item.target_language, batch_request.quality) for item in items]
+    cached_results = [translation_l1_cache.get(key) for key in cache_keys]
+    #only the keys missing from the in-memory cache go to Redis, in one MGET
+    missing = [i for i, cached_result in enumerate(cached_results) if not cached_result and responses[i] is None]
+    count_cache_lookups('l1', hits=sum(1 for cached_result in cached_results if cached_result), misses=len(missing))
+    if missing:
+        #the remaining lifetime of every key comes back in the same round-trip
+        with REDIS_SECONDS.labels('cache_lookup').time():
+            async with redis_client.pipeline(transaction=False) as pipe:
+                pipe.mget([cache_keys[i] for i in missing])
+                for i in missing:
+                    pipe.pttl(cache_keys[i])
+                redis_results, *pttls = await pipe.execute()
+        redis_results = [decode_translation(cached_result) for cached_result in redis_results]
+        redis_hits = sum(1 for cached_result in redis_results if cached_result)
+        count_cache_lookups('redis', hits=redis_hits, misses=len(missing) - redis_hits)
+        for i, cached_result, pttl in zip(missing, redis_results, pttls):
+            if cached_result:
+                cached_results[i] = cached_result
+                translation_l1_cache.set(cache_keys[i], cached_result, ttl=remaining_ttl(pttl))
+        #the Redis misses are looked up together in the translation memory
+        missing = [i for i in missing if not cached_results[i]]
+        remembered = await recall_translations(translation_memory, redis_client, [cache_keys[i] for i in missing])
+        for i in missing:
+            cached_results[i] = remembered.get(cache_keys[i])
+
+    # --- Queue New Jobs ---
+    missing = []
+    for i, cached_result in enumerate(cached_results):
+        if responses[i] is not None:
+            continue
+        if cached_result:
+            responses[i] = BatchItemResponse(status="completed", result=cached_result, from_cache=True)
+        else:
+            missing.append(i)
+
+    if missing:
+        #the whole batch is turned away if any of its languages is over its SLO, before anything is queued
+        await admit(admission_controller, dict.fromkeys(items[i].target_language for i in missing), batch_request.priority)
+        #every miss is queued or attached to a pending identical job, all in one pipelined round-trip
+        #identical items within the batch coalesce onto the first of them
+        request_ids = [str(uuid.uuid4()) for _ in missing]
+        with REDIS_SECONDS.labels('submit').time():
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for i, request_id in zip(missing, request_ids):
+                    await submit_script(**build_submit_args(cache_keys[i], request_id, items[i], batch_request.priority,
+                                                            batch_request.quality), client=pipe)
+                outcomes = await pipe.execute()
+
+        for i, request_id, (outcome, value) in zip(missing, request_ids, outcomes):
+            if outcome == 'cached':
+                value = decode_translation(value)
+                translation_l1_cache.set(cache_keys[i], value)
+                responses[i] = BatchItemResponse(status="completed", result=value, from_cache=True)
+            else:
+                responses[i] = BatchItemResponse(status="queued", request_id=request_id)
+
+    queued = sum(1 for item_response in responses if item_response.status == "queued")
+    failed = sum(1 for item_response in responses if item_response.status == "failed")
+    logger.info(f"Batch of {len(items)} items: {len(items) - queued - failed} cache hits, {queued} jobs queued, {failed} failed.")
+    if not queued:
+        response.status_code = status.HTTP_200_OK
+    return BatchJobResponse(items=responses)
+
+@router.post(
+    "/results",
+    response_model=BatchResultResponse,
+    tags=['Translation'],
+    #dependencies=[Depends(verify_token)]
+)
+#retrieves the results of many translation jobs with a single MGET
+async def get_translation_results(batch_request: BatchResultRequest, redis_client=Depends(get_redis)):
+    results = []
+    for request_id, result in await read_results(redis_client, batch_request.request_ids):
+        if result is None:
+            #the ID is invalid or the result has expired
+            results.append(BatchResultItem(request_id=request_id, status="not_found"))
+        else:
+            results.append(BatchResultItem(request_id=request_id, **result))
+
+    return BatchResultResponse(results=results)
+
+@router.get(
+    "/results/stream",
+    tags=['Translation'],
+    response_class=StreamingResponse,
+    #dependencies=[Depends(verify_token)]
+)
+#streams the result of every listed job as a server-sent event as soon as the worker finishes it
+#sends a 'result' event per job (with status 'not_found' for unknown IDs), then 'done', or
+#'timeout' with the IDs still pending once the timeout passes
+async def stream_translation_results(
+    request_id: list[str] = Query(..., max_length=MAX_BATCH_ITEMS, description="IDs to watch, repeat the parameter for each"),
+    timeout: float = Query(RESULT_STREAM_MAX, gt=0, le=RESULT_STREAM_MAX, description="seconds to keep the stream open"),
+    redis_client=Depends(get_redis),
+    completion_listener=Depends(get_completion_listener)
+):
+    if completion_listener is None:
+        raise HTTPException(status_code=503, detail="Service Unavailable: Cannot Connect to Redis.")
+    request_ids = list(dict.fromkeys(request_id))
+    #listen before the first read, so a completion in between is not missed
+    completions = completion_listener.register(request_ids)
+
+    async def events():
+        try:
+            pending = set(request_ids)
+            deadline = asyncio.get_running_loop().time() + timeout
+            to_read = request_ids
+            while True:
+                if to_read:
+                    for finished_id, result in await read_results(redis_client, to_read):
+                        if result is None:
+                            yield format_event("result", BatchResultItem(request_id=finished_id, status="not_found").model_dump())
+                            pending.discard(finished_id)
+                        elif result.get('status') in FINISHED_STATUSES and finished_id in pending:
+                            yield format_event("result", BatchResultItem(request_id=finished_id, **result).model_dump())
+                            pending.discard(finished_id)
+                if not pending:
+                    yield format_event("done", {})
+                    return
+
+                remaining = deadline - asyncio.get_running_loop().time()
+                if remaining <= 0:
+                    yield format_event("timeout", {"pending": sorted(pending)})
+                    return
+                try:
+                    first = await asyncio.wait_for(completions.get(), timeout=min(remaining, RESULT_STREAM_HEARTBEAT))
+                except asyncio.TimeoutError:
+                    #a comment line keeps proxies from closing an idle connection, and every
+                    #pending job is re-read in case a notification was lost during a reconnect
+                    yield ": keep-alive\n\n"
+                    to_read = sorted(pending)
+                    continue
+                #read every job announced so far in one MGET
+                to_read = [first]
+                while not completions.empty():
+                    to_read.append(completions.get_nowait())
+        finally:
+            completion_listener.unregister(request_ids, completions)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
@@ -0,0 +1,93 @@
+import time
+from threading import Lock
+from collections import OrderedDict
+
+from app.core.config import L1_CACHE_MAX_ENTRIES, L1_CACHE_MAX_BYTES, L1_CACHE_TTL
+
+#--- In-Process Translation Cache ---
+#a bounded LRU cache with a fixed time-to-live, kept in the memory of each API worker
+#it sits in front of the Redis translation cache so hot strings are served without a network hop
+#entries are keyed by the same 'translation_cache:<sha256>' key used in Redis
+#callers pass the Redis key's remaining lifetime to set(), so an entry never outlives its Redis copy
+class LocalTTLCache:
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        #key -> (expires_at, value, size), ordered from least to most recently used
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    #returns the cached value, or None if it is missing or has expired
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, value, _ = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    #stores a value, evicting the least recently used entries until the limits hold again
+    #ttl caps the entry's lifetime below the cache-wide TTL, None keeps the cache-wide TTL
+    def set(self, key: str, value: str, ttl: float | None = None):
+        size = len(key) + len(value.encode('utf-8'))
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        #a single value larger than the whole budget is not worth caching
+        if size > self.max_bytes or self.max_entries <= 0 or ttl <= 0:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + ttl, value, size)
+            self._size += size
+
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    #returns the counters and current usage for monitoring
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    #must be called with the lock held
+    def _remove(self, key: str):
+        _, _, size = self._entries.pop(key)
+        self._size -= size
+
+#singleton shared by all requests handled in this process
+translation_l1_cache = LocalTTLCache(L1_CACHE_MAX_ENTRIES, L1_CACHE_MAX_BYTES, L1_CACHE_TTL)
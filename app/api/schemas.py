@@ -1,4 +1,8 @@
-from pydantic import BaseModel, Field
+from typing import Literal
+
+from pydantic import BaseModel, Field, field_validator
+
+from app.core.config import MAX_BATCH_ITEMS, LANGUAGE_CODES
 
 #--- Pydantic models for data validation ---
 #these classes define the expected format for API's input and output
@@ -8,6 +12,22 @@ from pydantic import BaseModel, Field
 class TranslationRequest(BaseModel):
     text: str = Field(..., min_length=1, description="The text to be translated")
     target_language: str = Field(..., min_length=1, description="The full name of the target language")
+    priority: Literal["interactive", "bulk"] = Field(
+        default="interactive", description="Queue lane: 'interactive' jobs are served ahead of 'bulk' back-fills"
+    )
+    #generation settings of each tier are in QUALITY_TIERS; each tier has its own cache entries
+    quality: Literal["fast", "balanced", "best"] = Field(
+        default="balanced", description="Quality tier: 'fast' decodes greedily for low latency, 'best' searches more beams"
+    )
+
+    #every language has its own worker queue, so unsupported languages are rejected up front (422)
+    #the name is lowercased so "French" and "french" share one queue, cache entry and in-flight job
+    @field_validator('target_language')
+    @classmethod
+    def check_language_supported(cls, target_language: str):
+        if target_language.lower() not in LANGUAGE_CODES:
+            raise ValueError(f"Language '{target_language}' not supported.")
+        return target_language.lower()
 
 #defines the response when a new translation job is successfully submitted
 class JobResponse(BaseModel):
@@ -19,3 +39,67 @@ class Result(BaseModel):
     status: str
     result: str | None = None #string could be None if it is still proccessing
     from_cache: bool = Field(default=False, description="Indicates if the result was retrieved from the cache.")
+
+# --- Bulk models ---
+
+#defines one item of a POST request to /translate/batch
+#unlike TranslationRequest, an unsupported language does not reject the request,
+#only this item is reported as failed
+class BatchTranslationItem(BaseModel):
+    text: str = Field(..., min_length=1, description="The text to be translated")
+    target_language: str = Field(..., min_length=1, description="The full name of the target language")
+
+    @field_validator('target_language')
+    @classmethod
+    def normalize_language(cls, target_language: str):
+        return target_language.lower()
+
+#defines the structure for a POST request to /translate/batch
+class BatchTranslationRequest(BaseModel):
+    items: list[BatchTranslationItem] = Field(..., min_length=1, max_length=MAX_BATCH_ITEMS, description="The texts to be translated, in order")
+    #back-fills should send "bulk", so they queue behind interactive traffic
+    priority: Literal["interactive", "bulk"] = Field(
+        default="interactive", description="Queue lane of every item: 'interactive' jobs are served ahead of 'bulk' back-fills"
+    )
+    quality: Literal["fast", "balanced", "best"] = Field(
+        default="balanced", description="Quality tier of every item: 'fast' decodes greedily, 'best' searches more beams"
+    )
+
+#defines the outcome of one item in a bulk submit: a cache hit, a queued job, or a failed item
+class BatchItemResponse(BaseModel):
+    status: str
+    request_id: str | None = None #only set when a new job was queued
+    result: str | None = None #the cached translation, or the error for a failed item
+    from_cache: bool = False
+
+#defines the response for a bulk submit, items are in the same order as the request
+class BatchJobResponse(BaseModel):
+    items: list[BatchItemResponse]
+
+#defines the structure for a POST request to /results
+class BatchResultRequest(BaseModel):
+    request_ids: list[str] = Field(..., min_length=1, max_length=MAX_BATCH_ITEMS, description="The job IDs to look up")
+
+#defines the result of one job in a bulk result lookup
+class BatchResultItem(Result):
+    request_id: str
+
+#defines the response for a bulk result lookup, items are in the same order as the request
+class BatchResultResponse(BaseModel):
+    results: list[BatchResultItem]
+
+# --- Document models ---
+
+#defines the progress of a document job; items are counted once their result is in the results stream
+class DocumentProgress(BaseModel):
+    document_id: str
+    #'uploading' while the file is still being read, 'processing' until every item has a result, then 'completed'
+    status: Literal["uploading", "processing", "completed"]
+    target_language: str
+    priority: str
+    quality: str
+    total: int = Field(description="Items read from the file so far")
+    cached: int = Field(description="Items answered from the cache when they were read")
+    completed: int = Field(description="Items translated by the worker")
+    failed: int = Field(description="Items that could not be read or translated")
+    pending: int = Field(description="Items still waiting for a result")
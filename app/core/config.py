@@ -1,11 +1,9 @@
 import os
-import torch
 
 # --- Environment Setup ---
 #controls CPU usage
+#torch's own thread count is set by the worker, so importing this module never loads torch
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
-#sets the number of threads for PyTorch to use
-torch.set_num_threads(1)
 
 # --- Model and Language Configuration ---
 #template for constructing the names of the machine learning models
@@ -19,22 +17,182 @@ LANGUAGE_CODES = {
     "arabic": "ar"
 }
 
+# --- Inference Backend Configuration ---
+#runtime every model runs on unless its language is listed in INFERENCE_BACKENDS:
+#"transformers" (fp32 PyTorch, the reference), "ctranslate2" (int8 by default) or "onnx" (ONNX Runtime)
+INFERENCE_BACKEND = os.environ.get('INFERENCE_BACKEND', 'transformers')
+#per-language overrides, e.g. "french=ctranslate2,spanish=onnx"
+LANGUAGE_BACKENDS = dict(
+    (lang.strip().lower(), backend.strip())
+    for lang, backend in (pair.split('=', 1) for pair in os.environ.get('INFERENCE_BACKENDS', '').split(',') if '=' in pair)
+)
+#where converted CTranslate2 models are kept, and the quantization they are converted to
+CT2_MODEL_DIR = os.environ.get('CT2_MODEL_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'ctranslate2'))
+CT2_COMPUTE_TYPE = os.environ.get('CT2_COMPUTE_TYPE', 'int8')
+
+# --- Model Cache Configuration ---
+#memory the worker may spend on loaded models; least recently used languages are evicted beyond it
+MODEL_CACHE_MAX_BYTES = int(os.environ.get('MODEL_CACHE_MAX_BYTES', 4 * 1024**3))
+#languages whose models are loaded when the worker starts and never evicted, e.g. "french,spanish"
+#in process mode these are the models the worker processes share; the rest load in each process on first use
+MODEL_CACHE_PINNED = [lang.strip().lower() for lang in os.environ.get('MODEL_CACHE_PINNED', '').split(',') if lang.strip()]
+#size assumed for a model whose weights cannot be measured (an fp32 opus-mt model is about 300 MB)
+MODEL_SIZE_ESTIMATE_BYTES = int(os.environ.get('MODEL_SIZE_ESTIMATE_BYTES', 300 * 1024**2))
+
 # --- Redis Configuration ---
 REDIS_HOST = os.environ.get('REDIS_HOST', 'redis')
 REDIS_PORT = int(os.environ.get('REDIS_PORT', 6379))
-#name of the list in Redis that will be used as the job queue
+#max number of pooled connections each API worker process keeps open to Redis
+#requests beyond this wait for a free connection instead of opening new ones
+REDIS_POOL_SIZE = int(os.environ.get('REDIS_POOL_SIZE', 50))
+#seconds a request waits for a free pooled connection before failing
+REDIS_POOL_TIMEOUT = float(os.environ.get('REDIS_POOL_TIMEOUT', 5))
+#prefix of the lists in Redis used as job queues, one per language ("translation_request_queue:fr")
+#a list with exactly this name was the shared queue of older versions
 REQUEST_QUEUE_KEY = "translation_request_queue"
+#"list" queues jobs on the lists above, which the worker pops, so a batch is gone from Redis once taken
+#"stream" queues them on Redis Streams read through a consumer group: a job stays pending until
+#its result is saved, and jobs of a crashed worker are handed to another one
+#the API and the worker must use the same backend
+QUEUE_BACKEND = os.environ.get('QUEUE_BACKEND', 'list')
+#prefix of the streams used as job queues when QUEUE_BACKEND is "stream" ("translation_request_stream:fr")
+REQUEST_STREAM_KEY = "translation_request_stream"
+#consumer group every worker reads the streams through
+STREAM_GROUP = "translation_workers"
+#seconds a delivered job may stay unacknowledged before another worker takes it over
+#must be longer than the slowest batch, or a job still being translated is translated twice
+STREAM_CLAIM_IDLE = float(os.environ.get('STREAM_CLAIM_IDLE', 300))
+#seconds between a worker's checks for jobs left behind by crashed workers
+STREAM_CLAIM_INTERVAL = float(os.environ.get('STREAM_CLAIM_INTERVAL', 30))
+#deliveries after which a job is failed instead of handed out again, so a job that crashes
+#every worker that takes it cannot take the whole pool down
+STREAM_MAX_DELIVERIES = int(os.environ.get('STREAM_MAX_DELIVERIES', 3))
 #prefix for keys where job results are stored
 RESULTS_CACHE_PREFIX = "translation_result:"
+#seconds a job's status is kept while it waits in the queue, and once it has finished
+QUEUED_RESULT_TTL = 3600
+FINISHED_RESULT_TTL = 300
+#prefixes of a document job's progress hash and of the stream its item results are appended to
+DOCUMENT_PREFIX = "translation_document:"
+DOCUMENT_RESULTS_PREFIX = "translation_document_results:"
+#seconds a document's progress and results are kept after its last upload chunk or translated item
+DOCUMENT_TTL = int(os.environ.get('DOCUMENT_TTL', 86400))
+#items of an uploaded document that are looked up in the cache and queued together
+DOCUMENT_CHUNK_ITEMS = int(os.environ.get('DOCUMENT_CHUNK_ITEMS', 500))
+#prefixes for the in-flight marker of a pending translation and the request IDs attached to it
+INFLIGHT_PREFIX = "translation_inflight:"
+WAITERS_PREFIX = "translation_waiters:"
+#seconds an in-flight marker lives unless a worker renews it when it starts the job
+#kept short so a job lost to a crashed worker stops absorbing identical requests quickly
+INFLIGHT_TTL = int(os.environ.get('INFLIGHT_TTL', 60))
+#channel the worker publishes the request ID of every finished job on
+COMPLETIONS_CHANNEL = "translation_completed"
+#prefix of the per-language buckets of finished jobs and busy seconds the worker records for admission control
+#("translation_throughput:fr:<bucket>"), each covering THROUGHPUT_BUCKET_SECONDS
+THROUGHPUT_PREFIX = "translation_throughput:"
+THROUGHPUT_BUCKET_SECONDS = 10
 #prefix for keys where final, completed translations are cached for reuse
 TRANSLATION_CACHE_PREFIX = "translation_cache:"
+#seconds a completed translation stays in the Redis cache
+TRANSLATION_CACHE_TTL = 3600
+#part of every translation cache key together with the model that produced the translation
+#raise it to drop every cached translation at once, e.g. after a model was updated under the same name
+CACHE_KEY_VERSION = os.environ.get('CACHE_KEY_VERSION', '1')
+#SQLite file of the durable translation memory behind the Redis cache, empty to run without it
+#the API and the worker must open the same file, so it has to be on a volume they share on one host
+TRANSLATION_MEMORY_PATH = os.environ.get('TRANSLATION_MEMORY_PATH', '')
+#size the translation memory is compacted back under, least recently used translations first
+TRANSLATION_MEMORY_MAX_BYTES = int(os.environ.get('TRANSLATION_MEMORY_MAX_BYTES', 2 * 1024**3))
+#seconds between the worker's compactions of the translation memory
+TRANSLATION_MEMORY_COMPACT_INTERVAL = int(os.environ.get('TRANSLATION_MEMORY_COMPACT_INTERVAL', 600))
+#write queued jobs as msgpack and cached translations of CACHE_COMPRESS_MIN_BYTES or more zlib-compressed
+#both formats are always read, so turn this on once every API and worker process runs a version
+#that reads them, and run app/worker/migrate_storage.py to convert the translations already cached
+COMPACT_STORAGE = os.environ.get('COMPACT_STORAGE', 'false').lower() == 'true'
+#shorter translations are stored as plain text, zlib gains little on them
+CACHE_COMPRESS_MIN_BYTES = int(os.environ.get('CACHE_COMPRESS_MIN_BYTES', 200))
+
+# --- Priority Lanes ---
+#every language has one queue per lane, listed from the most to the least urgent
+#"interactive" is for clinician-facing requests and keeps the queue names of older versions,
+#"bulk" is for back-fills and gets a ":bulk" suffix ("translation_request_queue:fr:bulk")
+PRIORITY_LANES = ["interactive", "bulk"]
+DEFAULT_PRIORITY = "interactive"
+#share of batches each lane gets while both have jobs waiting, e.g. "interactive=4,bulk=1"
+#interactive jobs are served 4 batches out of 5, and bulk jobs still make progress
+LANE_WEIGHTS = {lane: 1 for lane in PRIORITY_LANES}
+LANE_WEIGHTS.update(
+    (lane.strip().lower(), int(weight))
+    for lane, weight in (pair.split('=', 1) for pair in os.environ.get('LANE_WEIGHTS', 'interactive=4,bulk=1').split(',') if '=' in pair)
+)
+
+# --- Quality Tiers ---
+#generation settings of each quality a request may ask for, passed to every generate call of its jobs
+#"fast" decodes greedily with a capped output, for short UI strings where latency matters more than polish;
+#"balanced" keeps the models' own settings (beam search, 4 beams for opus-mt) and the cache keys of older
+#versions; "best" searches more beams, for notes where quality matters more than latency
+#every other tier is part of the cache key, so after changing a tier's settings raise CACHE_KEY_VERSION
+QUALITY_TIERS = {
+    "fast": {"num_beams": 1, "max_new_tokens": 256},
+    "balanced": {},
+    "best": {"num_beams": 8},
+}
+DEFAULT_QUALITY = "balanced"
 
 # --- Worker Configuration ---
 #max number of jobs the worker will pull from the queue at one time
 BATCH_SIZE = 8
 #number of seconds the worker will wait for a new job before checking again
 BATCH_TIMEOUT = 1.0
-NUM_WORKER_THREADS = 3
+#seconds a job may wait before its language is served ahead of languages with fuller queues
+SCHEDULER_MAX_WAIT = float(os.environ.get('SCHEDULER_MAX_WAIT', 2.0))
+#"thread" runs NUM_WORKER_THREADS worker loops in one process sharing one set of models
+#"process" loads the models once, then forks NUM_WORKER_PROCESSES single-loop processes that
+#share the weights copy-on-write, each with TORCH_THREADS_PER_PROCESS intra-op threads on its own cores
+WORKER_MODE = os.environ.get('WORKER_MODE', 'thread')
+NUM_WORKER_THREADS = int(os.environ.get('NUM_WORKER_THREADS', 3))
+TORCH_THREADS_PER_PROCESS = int(os.environ.get('TORCH_THREADS_PER_PROCESS', 1))
+NUM_WORKER_PROCESSES = int(os.environ.get('NUM_WORKER_PROCESSES', max(1, (os.cpu_count() or 1) // TORCH_THREADS_PER_PROCESS)))
+#port the worker serves its Prometheus metrics on; in process mode worker process i uses WORKER_METRICS_PORT + i
+WORKER_METRICS_PORT = int(os.environ.get('WORKER_METRICS_PORT', 9100))
+#pin each worker process to its own group of TORCH_THREADS_PER_PROCESS cores (Linux only)
+WORKER_PIN_CORES = os.environ.get('WORKER_PIN_CORES', 'true').lower() == 'true'
+#longest text (in characters) sent to the model as one input
+#sentences longer than this are cut at word boundaries, which keeps every input well
+#below the 512 token limit of the opus-mt models instead of being silently truncated
+SEGMENT_MAX_CHARS = int(os.environ.get('SEGMENT_MAX_CHARS', 400))
+#padded tokens (longest input x number of inputs) a single generate call may hold
+#inputs are grouped by length under this budget, so short labels are not padded to a long note's length
+MAX_BATCH_TOKENS = int(os.environ.get('MAX_BATCH_TOKENS', 4096))
+
+# --- API Configuration ---
+#max number of items accepted by a single bulk submit or bulk result request
+MAX_BATCH_ITEMS = int(os.environ.get('MAX_BATCH_ITEMS', 256))
+#in-process (L1) cache of hot translations that sits in front of the Redis cache, one per API worker
+#max number of translations and total size in bytes each worker keeps in memory
+L1_CACHE_MAX_ENTRIES = int(os.environ.get('L1_CACHE_MAX_ENTRIES', 10000))
+L1_CACHE_MAX_BYTES = int(os.environ.get('L1_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+#seconds a translation is served from memory, capped so it never outlives the Redis TTL
+L1_CACHE_TTL = min(int(os.environ.get('L1_CACHE_TTL', 300)), TRANSLATION_CACHE_TTL)
+
+#longest a GET /result/{request_id}?wait= request may block, in seconds
+RESULT_WAIT_MAX = float(os.environ.get('RESULT_WAIT_MAX', 30))
+#longest a GET /results/stream connection stays open, and the seconds between keep-alive comments
+RESULT_STREAM_MAX = float(os.environ.get('RESULT_STREAM_MAX', 300))
+RESULT_STREAM_HEARTBEAT = 15
+
+#admission control: POST /translate answers 429 when a language's queue is estimated to take longer
+#than its SLO to drain, judged from the queue depth and the worker throughput of the last ADMISSION_WINDOW seconds
+#seconds a new job may be expected to wait in the queue; 0 turns admission control off
+ADMISSION_SLO = float(os.environ.get('ADMISSION_SLO', 60))
+#per-language overrides, e.g. "french=30,hindi=120"
+ADMISSION_SLOS = dict(
+    (lang.strip().lower(), float(slo))
+    for lang, slo in (pair.split('=', 1) for pair in os.environ.get('ADMISSION_SLOS', '').split(',') if '=' in pair)
+)
+ADMISSION_WINDOW = int(os.environ.get('ADMISSION_WINDOW', 60))
+#seconds each API process reuses a language's depth and throughput before reading them again
+ADMISSION_REFRESH = float(os.environ.get('ADMISSION_REFRESH', 1.0))
 
 # --- Auth Configuration ---
 #URL for the central auth service, which must be provided by an environment variable
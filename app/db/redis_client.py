@@ -1,7 +1,33 @@
 import redis
-from app.core.config import REDIS_HOST, REDIS_PORT
+import redis.asyncio as aioredis
+from app.core.config import REDIS_HOST, REDIS_PORT, REDIS_POOL_SIZE, REDIS_POOL_TIMEOUT
 
 # This creates the client object. The actual connection and verification
 # will happen in the main application's startup sequence.
 # This object is now a singleton that can be imported anywhere.
-redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=0, decode_responses=True)
+# The worker uses this blocking client; the web server uses the asyncio client below.
+#every client decodes replies with errors='surrogateescape', so binary values (compressed translations,
+#msgpack jobs) arrive as str and app.services.codec turns them back into their exact bytes
+redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=0, decode_responses=True, encoding_errors='surrogateescape')
+
+#creates a separate blocking client, for worker processes forked from the main worker process
+#so no socket opened before the fork is shared between processes
+def create_redis_client(host=REDIS_HOST, port=REDIS_PORT):
+    return redis.Redis(host=host, port=port, db=0, decode_responses=True, encoding_errors='surrogateescape')
+
+#creates the pooled asyncio client used by the FastAPI request path
+#this is called from the lifespan hook rather than at import time, so every gunicorn
+#worker process builds its own pool bound to its own event loop
+def create_async_redis_client(host=REDIS_HOST, port=REDIS_PORT):
+    #a blocking pool caps the open connections at REDIS_POOL_SIZE and makes extra
+    #requests wait up to REDIS_POOL_TIMEOUT seconds for a free one
+    pool = aioredis.BlockingConnectionPool(
+        host=host,
+        port=port,
+        db=0,
+        decode_responses=True,
+        encoding_errors='surrogateescape',
+        max_connections=REDIS_POOL_SIZE,
+        timeout=REDIS_POOL_TIMEOUT
+    )
+    return aioredis.Redis(connection_pool=pool)
@@ -1,11 +1,15 @@
 import logging
 import redis
-from threading import Thread
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 
 from app.api.endpoints import router as api_router
-from app.db.redis_client import redis_client
+from app.api.documents import router as documents_router
+from app.db.redis_client import create_async_redis_client
+from app.api.completions import CompletionListener
+from app.api.admission import AdmissionController
+from app.services.coalescing import SUBMIT_SCRIPT
+from app.services.translation_memory import open_translation_memory
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -15,15 +19,30 @@ logger = logging.getLogger(__name__)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Application startup...")
-    #verifies the connection for the client created in db.py
+    #create the pooled asyncio client for this worker process and share it with the endpoints
+    app.state.redis = create_async_redis_client()
+    #register the queue/coalesce script once per process instead of on every request
+    app.state.submit_script = app.state.redis.register_script(SUBMIT_SCRIPT)
+    #one subscription per process to the worker's completion notifications, for waiting requests
+    #it holds one of the pooled connections for the life of the process
+    app.state.completion_listener = CompletionListener(app.state.redis)
+    app.state.completion_listener.start()
+    #estimates each language's queue wait and turns away jobs that would miss their SLO
+    app.state.admission = AdmissionController(app.state.redis)
+    #the durable translation memory read on Redis misses, if TRANSLATION_MEMORY_PATH is set
+    app.state.translation_memory = open_translation_memory()
+    #verifies the connection for the new client
     try:
-        redis_client.ping()
+        await app.state.redis.ping()
         logger.info("Successfully connected to Redis!")
     except redis.exceptions.ConnectionError as e:
-        logger.error(f"Could not connect to Redis: {e}. The worker will not be started.")
+        logger.error(f"Could not connect to Redis: {e}. Requests will fail until it is reachable.")
 
     yield #application runs here
 
+    #close every pooled connection before the worker exits
+    await app.state.completion_listener.stop()
+    await app.state.redis.aclose(close_connection_pool=True)
     logger.info("Web server shutdown.")
 
 # --- FastAPI App Instance ---
@@ -39,4 +58,6 @@ app = FastAPI(
 # --- Router Inclusion ---
 #attach the router from 'api/views.py' to the main application
 #all routes defined in the router will be prepended with '/api'
-app.include_router(api_router, prefix="/api")
\ No newline at end of file
+app.include_router(api_router, prefix="/api")
+#document jobs: file uploads translated item by item, with NDJSON result streaming
+app.include_router(documents_router, prefix="/api")
\ No newline at end of file
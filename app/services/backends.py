@@ -0,0 +1,98 @@
+import os
+import logging
+from threading import Lock
+
+from app.core.config import CT2_MODEL_DIR, CT2_COMPUTE_TYPE, TORCH_THREADS_PER_PROCESS
+
+logger = logging.getLogger(__name__)
+
+# --- Inference Backends ---
+#every backend loads an opus-mt model and returns a translator that behaves like a Hugging Face
+#translation pipeline: it is called with a list of texts and a batch_size, returns one
+#{'translation_text': ...} dict per text, and exposes the model's tokenizer as .tokenizer
+#the generation settings of a quality tier (num_beams, max_new_tokens, see QUALITY_TIERS) are passed
+#as keyword arguments, and only when they differ from the model's own
+#"transformers" is the fp32 PyTorch pipeline and the reference the other backends are checked
+#against (see benchmarks/backend_parity.py). "ctranslate2" and "onnx" need optional packages,
+#imported only when a language is configured to use them
+
+#the fp32 PyTorch pipeline from Hugging Face
+def load_transformers(model_name: str):
+    from transformers import pipeline
+    return pipeline('translation', model=model_name)
+
+#a CTranslate2 conversion of the model, int8-quantized by default
+#the conversion runs once and is kept under CT2_MODEL_DIR for later loads
+#needs `pip install ctranslate2`
+class CTranslate2Translator:
+    def __init__(self, model_name: str):
+        import ctranslate2
+        from transformers import AutoTokenizer
+
+        self.model_dir = os.path.join(CT2_MODEL_DIR, model_name.replace('/', '--'))
+        if not os.path.isdir(self.model_dir):
+            logger.info(f"Converting {model_name} to CTranslate2 ({CT2_COMPUTE_TYPE}) in {self.model_dir}...")
+            ctranslate2.converters.TransformersConverter(model_name).convert(self.model_dir, quantization=CT2_COMPUTE_TYPE)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self._translator = None
+        self._pid = None
+        self._lock = Lock()
+
+    #the CTranslate2 translator starts its own thread pool, which does not survive a fork,
+    #so every worker process opens the converted model the first time it translates
+    @property
+    def translator(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                import ctranslate2
+                self._translator = ctranslate2.Translator(
+                    self.model_dir, device='cpu', compute_type=CT2_COMPUTE_TYPE, intra_threads=TORCH_THREADS_PER_PROCESS
+                )
+                self._pid = os.getpid()
+            return self._translator
+
+    #maps Hugging Face generation settings to their translate_batch options
+    @staticmethod
+    def generation_options(num_beams: int | None = None, max_new_tokens: int | None = None):
+        options = {}
+        if num_beams is not None:
+            options['beam_size'] = num_beams
+        if max_new_tokens is not None:
+            options['max_decoding_length'] = max_new_tokens
+        return options
+
+    def __call__(self, texts: list[str], batch_size: int = 32, **generate_kwargs):
+        #CTranslate2 takes the SentencePiece tokens rather than their IDs
+        source_tokens = [self.tokenizer.convert_ids_to_tokens(self.tokenizer.encode(text)) for text in texts]
+        results = self.translator.translate_batch(
+            source_tokens, max_batch_size=batch_size, **self.generation_options(**generate_kwargs)
+        )
+        return [
+            {'translation_text': self.tokenizer.decode(
+                self.tokenizer.convert_tokens_to_ids(result.hypotheses[0]), skip_special_tokens=True
+            )}
+            for result in results
+        ]
+
+#an ONNX Runtime export of the model run through the same Hugging Face pipeline
+#needs `pip install optimum[onnxruntime]`
+def load_onnx(model_name: str):
+    from optimum.onnxruntime import ORTModelForSeq2SeqLM
+    from transformers import AutoTokenizer, pipeline
+
+    model = ORTModelForSeq2SeqLM.from_pretrained(model_name, export=True)
+    return pipeline('translation', model=model, tokenizer=AutoTokenizer.from_pretrained(model_name))
+
+#backend name -> function that loads a model with it
+BACKENDS = {
+    'transformers': load_transformers,
+    'ctranslate2': CTranslate2Translator,
+    'onnx': load_onnx,
+}
+
+#loads a model with the named backend, raises ValueError for an unknown backend
+def load_translator(backend: str, model_name: str):
+    loader = BACKENDS.get(backend)
+    if loader is None:
+        raise ValueError(f"Unknown inference backend '{backend}', expected one of {sorted(BACKENDS)}.")
+    return loader(model_name)
@@ -0,0 +1,26 @@
+# --- Length-Bucketed Batching ---
+#a generate call pads every input to the longest one in the call, so a short label batched
+#with a long patient note costs as much as a second long note
+#inputs are sorted by token length and cut into buckets whose padded size (longest input
+#times number of inputs) stays within a token budget, so each call holds similar lengths
+
+#rough token count for when no tokenizer is at hand
+#the opus-mt SentencePiece vocabularies average about 4 characters per token, plus the end-of-sentence token
+def estimate_token_length(text: str):
+    return len(text) // 4 + 1
+
+#groups input positions into buckets of similar length
+#lengths[i] is the token length of input i, and max_tokens the padded tokens allowed per bucket
+#returns lists of input positions, shortest inputs first; an input longer than the budget gets a bucket of its own
+def bucket_by_length(lengths: list[int], max_tokens: int):
+    buckets = []
+    current = []
+    for i in sorted(range(len(lengths)), key=lambda i: lengths[i]):
+        #inputs arrive shortest first, so this one sets the padded length of the bucket
+        if current and (len(current) + 1) * lengths[i] > max_tokens:
+            buckets.append(current)
+            current = []
+        current.append(i)
+    if current:
+        buckets.append(current)
+    return buckets
@@ -0,0 +1,69 @@
+from app.core.config import TRANSLATION_CACHE_PREFIX, INFLIGHT_PREFIX, WAITERS_PREFIX, DEFAULT_PRIORITY
+from app.services.keys import get_lane_suffix
+
+# --- In-Flight Request Coalescing ---
+#when many clients submit the same text and language before the first job finishes, only the
+#first one is queued. Later identical submissions attach to that pending job and the worker
+#fans its result out to every attached request ID when it saves the result.
+#both steps are Lua scripts, so attaching and fanning out can never interleave.
+#the in-flight marker expires after INFLIGHT_TTL seconds and the worker renews it when it
+#starts the job. If a worker dies mid-batch, identical requests stop attaching to the lost
+#job within INFLIGHT_TTL and queue fresh work, as they did before coalescing existed.
+
+#returns the keys tracking the pending job for a translation cache key:
+#the in-flight marker (holds the leader's request ID) and the list of attached request IDs
+#requests only attach to pending jobs of their own priority lane, so an interactive request
+#never waits behind a bulk job
+def get_inflight_keys(cache_key: str, priority: str = DEFAULT_PRIORITY):
+    key_id = cache_key[len(TRANSLATION_CACHE_PREFIX):] + get_lane_suffix(priority)
+    return f"{INFLIGHT_PREFIX}{key_id}", f"{WAITERS_PREFIX}{key_id}"
+
+#run by the API on a cache miss
+#KEYS: cache key, in-flight key, waiters key, this request's result key, queue key
+#ARGV: request ID, initial result payload, task JSON, TTL for the result key and waiters list,
+#TTL for the in-flight marker, queue backend ('stream' to XADD the task to a stream, else RPUSH to a list)
+#returns {'cached', translation} if the translation appeared in the meantime,
+#{'attached', leader_id} if an identical job is pending, or {'queued', request_id}
+SUBMIT_SCRIPT = """
+local cached = redis.call('GET', KEYS[1])
+if cached then
+    return {'cached', cached}
+end
+redis.call('SET', KEYS[4], ARGV[2], 'EX', ARGV[4])
+local leader = redis.call('GET', KEYS[2])
+if leader then
+    redis.call('RPUSH', KEYS[3], ARGV[1])
+    redis.call('EXPIRE', KEYS[3], ARGV[4])
+    return {'attached', leader}
+end
+redis.call('SET', KEYS[2], ARGV[1], 'EX', ARGV[5])
+if ARGV[6] == 'stream' then
+    redis.call('XADD', KEYS[5], '*', 'task', ARGV[3])
+else
+    redis.call('RPUSH', KEYS[5], ARGV[3])
+end
+return {'queued', ARGV[1]}
+"""
+
+#run by the worker after it has saved a job's result
+#KEYS: in-flight key, waiters key
+#ARGV: job ID, final result payload, result TTL, result key prefix, completions channel
+#clears the in-flight marker (only if it still belongs to this job), copies the result to
+#every attached request, publishes the job's and every attached request's ID on the
+#completions channel and returns how many attached requests there were
+#the waiters' result keys are built inside the script rather than passed in KEYS, since
+#they are only known once the list is read. This needs a single Redis instance: it does
+#not work on Redis Cluster or with ACLs that restrict the keys a script may touch.
+FINISH_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('DEL', KEYS[1])
+end
+local waiters = redis.call('LRANGE', KEYS[2], 0, -1)
+redis.call('DEL', KEYS[2])
+redis.call('PUBLISH', ARGV[5], ARGV[1])
+for _, waiter_id in ipairs(waiters) do
+    redis.call('SET', ARGV[4] .. waiter_id, ARGV[2], 'EX', ARGV[3])
+    redis.call('PUBLISH', ARGV[5], waiter_id)
+end
+return #waiters
+"""
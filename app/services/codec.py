@@ -0,0 +1,66 @@
+import json
+import zlib
+
+import msgpack
+
+from app.core.config import COMPACT_STORAGE, CACHE_COMPRESS_MIN_BYTES
+
+# --- Storage Encoding ---
+#compact encodings of the queued jobs and cached translations kept in Redis, shared by the API and the worker
+#values are only written compact with COMPACT_STORAGE on, but both formats are always read, so
+#readers can be deployed before writers and keys written by older versions stay readable
+#the Redis clients decode replies with errors='surrogateescape' (see redis_client.py), so binary
+#values arrive as str and to_bytes() turns them back into their exact bytes
+
+#prefix of a msgpack job; JSON jobs start with '{'
+JOB_MARKER = b'\x00m'
+#prefix of a zlib-compressed translation; no translation starts with a NUL character
+COMPRESSED_MARKER = b'\x00z'
+#a msgpack job is the list of these values, followed by a dict of any other fields
+JOB_FIELDS = ('id', 'text', 'lang', 'queued_at', 'priority')
+ZLIB_LEVEL = 6
+
+#returns the exact bytes of a value read from Redis
+def to_bytes(value: str | bytes):
+    return value if isinstance(value, bytes) else value.encode('utf-8', 'surrogateescape')
+
+#encodes a job for its queue: JSON, or msgpack without the field names when compact
+def encode_job(job: dict, compact: bool = COMPACT_STORAGE):
+    if not compact:
+        return json.dumps(job)
+    extra = {field: value for field, value in job.items() if field not in JOB_FIELDS}
+    return JOB_MARKER + msgpack.packb([job.get(field) for field in JOB_FIELDS] + [extra], use_bin_type=True)
+
+#decodes a job read from a queue, in either format
+def decode_job(value: str | bytes):
+    raw = to_bytes(value)
+    if not raw.startswith(JOB_MARKER):
+        return json.loads(value)
+    *values, extra = msgpack.unpackb(raw[len(JOB_MARKER):], raw=False)
+    #fields the job did not have were packed as None
+    job = {field: value for field, value in zip(JOB_FIELDS, values) if value is not None}
+    job.update(extra)
+    return job
+
+#encodes a translation for the cache: compressed when compact and long enough for zlib to pay off
+def encode_translation(text: str, compact: bool = COMPACT_STORAGE, min_bytes: int = CACHE_COMPRESS_MIN_BYTES):
+    if not compact:
+        return text
+    raw = text.encode('utf-8')
+    if len(raw) < min_bytes:
+        return text
+    compressed = COMPRESSED_MARKER + zlib.compress(raw, ZLIB_LEVEL)
+    return compressed if len(compressed) < len(raw) else text
+
+#decodes a cached translation in either format; None (a cache miss) stays None
+def decode_translation(value: str | bytes | None):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        #plain translations, the common case, are returned without being re-encoded
+        if not value.startswith('\x00z'):
+            return value
+        value = to_bytes(value)
+    if value.startswith(COMPRESSED_MARKER):
+        return zlib.decompress(value[len(COMPRESSED_MARKER):]).decode('utf-8')
+    return value.decode('utf-8')
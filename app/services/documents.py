@@ -0,0 +1,23 @@
+from app.services.keys import get_document_key, get_document_results_key
+from app.core.config import DOCUMENT_TTL
+
+# --- Document Jobs ---
+#a document job is a file of texts uploaded in one request. Its items are queued as ordinary jobs
+#carrying 'document' and 'index' fields, and the worker batches them with every other job of their
+#lane. Their results are appended to the document's results stream and counted in its progress hash
+#instead of being stored under a request ID, so neither side keeps the document in memory.
+#the API adds the results of items answered from the cache or that could not be read, the worker
+#those of the items it translated
+
+#queues the result of one document item on a pipeline and counts it in the document's progress
+#counter is the progress field to increment: 'cached', 'completed' or 'failed'
+def add_document_result(pipe, document_id: str, index: int, status: str, result: str, counter: str):
+    pipe.xadd(get_document_results_key(document_id), {
+        'index': index, 'status': status, 'result': result, 'from_cache': int(counter == 'cached')
+    })
+    pipe.hincrby(get_document_key(document_id), counter, 1)
+
+#queues on a pipeline the renewal of a document's progress and results for another DOCUMENT_TTL seconds
+def touch_document(pipe, document_id: str):
+    pipe.expire(get_document_key(document_id), DOCUMENT_TTL)
+    pipe.expire(get_document_results_key(document_id), DOCUMENT_TTL)
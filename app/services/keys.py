@@ -0,0 +1,84 @@
+import re
+import hashlib
+import unicodedata
+
+from app.core.config import (
+    LANGUAGE_CODES, HELSINKI_NAME_TEMPLATE, INFERENCE_BACKEND, LANGUAGE_BACKENDS, REQUEST_QUEUE_KEY, REQUEST_STREAM_KEY,
+    TRANSLATION_CACHE_PREFIX, CACHE_KEY_VERSION, THROUGHPUT_PREFIX, DEFAULT_PRIORITY, DOCUMENT_PREFIX,
+    DOCUMENT_RESULTS_PREFIX, DEFAULT_QUALITY
+)
+
+# --- Redis Key Names ---
+#the key and queue names shared by the API and the worker
+#this module must not import torch, transformers or anything else from the worker, so the
+#API processes can build the same keys without loading the ML stack
+
+#any run of whitespace other than a line break
+HORIZONTAL_SPACE = re.compile(r'[^\S\n]+')
+
+#returns the two-letter code of a language given its full name ("French") or its code ("fr")
+def canonicalize_language(lang: str):
+    lang = lang.strip().lower()
+    return LANGUAGE_CODES.get(lang, lang)
+
+#returns the form a text is cached under: NFC-composed, with Windows line endings and runs of
+#spaces, tabs or no-break spaces made single, and no whitespace at the ends of lines or of the text
+#line breaks are kept, they shape the translated note; texts that only differ in the rest share a translation
+def canonicalize_text(text: str):
+    text = unicodedata.normalize('NFC', text).replace('\r\n', '\n').replace('\r', '\n')
+    return '\n'.join(HORIZONTAL_SPACE.sub(' ', line).strip() for line in text.split('\n')).strip()
+
+#returns the inference backend configured for a language
+def get_backend_name(lang: str):
+    lang = lang.strip().lower()
+    code_names = {code: name for name, code in LANGUAGE_CODES.items()}
+    return LANGUAGE_BACKENDS.get(code_names.get(lang, lang), INFERENCE_BACKEND)
+
+#returns the backend and model that translate a language, e.g. "ctranslate2:Helsinki-NLP/opus-mt-en-fr"
+def get_model_id(lang: str, backend: str | None = None):
+    model_name = HELSINKI_NAME_TEMPLATE.format(lang_code=canonicalize_language(lang))
+    return f"{backend or get_backend_name(lang)}:{model_name}"
+
+#generates a consistent, unique cache key for a translated text string
+#the text and language are canonicalized first, so "French" and "fr", or a note pasted with a
+#trailing space, reuse the same translation. The key also holds the model that translates the
+#language and CACHE_KEY_VERSION, so switching a language's backend or raising the version starts
+#it on fresh keys instead of serving translations of the previous model
+#a quality tier other than the default one is keyed too, so a fast translation never answers a request for the best one
+#the API and the worker must run with the same INFERENCE_BACKEND(S) and CACHE_KEY_VERSION
+def get_translation_cache_key(text: str, lang: str, quality: str = DEFAULT_QUALITY):
+    #the default tier keeps the keys of older versions, like the default lane keeps its queue names
+    model_id = get_model_id(lang) if quality == DEFAULT_QUALITY else f"{get_model_id(lang)}:{quality}"
+    key_string = "\x1f".join(
+        (CACHE_KEY_VERSION, model_id, canonicalize_language(lang), canonicalize_text(text))
+    ).encode('utf-8')
+    key_hash = hashlib.sha256(key_string).hexdigest()
+    return f"{TRANSLATION_CACHE_PREFIX}{key_hash}"
+
+#returns the suffix of a priority lane's queue names; the default lane keeps the names of older versions
+def get_lane_suffix(priority: str):
+    return "" if priority == DEFAULT_PRIORITY else f":{priority}"
+
+#returns the name of the Redis list holding queued jobs for one target language and priority lane
+#accepts either the full language name ("French") or its code ("fr")
+def get_request_queue_key(lang: str, priority: str = DEFAULT_PRIORITY):
+    lang_code = LANGUAGE_CODES.get(lang.lower(), lang.lower())
+    return f"{REQUEST_QUEUE_KEY}:{lang_code}{get_lane_suffix(priority)}"
+
+#returns the name of the Redis stream holding queued jobs for one target language and priority lane
+def get_request_stream_key(lang: str, priority: str = DEFAULT_PRIORITY):
+    lang_code = LANGUAGE_CODES.get(lang.lower(), lang.lower())
+    return f"{REQUEST_STREAM_KEY}:{lang_code}{get_lane_suffix(priority)}"
+
+#returns the name of the hash holding a document job's language, upload state and progress counters
+def get_document_key(document_id: str):
+    return f"{DOCUMENT_PREFIX}{document_id}"
+
+#returns the name of the stream a document job's item results are appended to, in completion order
+def get_document_results_key(document_id: str):
+    return f"{DOCUMENT_RESULTS_PREFIX}{document_id}"
+
+#returns the name of the hash counting the jobs and busy seconds of one language in one time bucket
+def get_throughput_key(lang: str, bucket: int):
+    lang_code = LANGUAGE_CODES.get(lang.lower(), lang.lower())
+    return f"{THROUGHPUT_PREFIX}{lang_code}:{bucket}"
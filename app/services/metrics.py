@@ -0,0 +1,77 @@
+import os
+
+from prometheus_client import Counter, Gauge, Histogram, CollectorRegistry, REGISTRY, generate_latest
+from prometheus_client import multiprocess
+
+# --- Prometheus Metrics ---
+#defined once here and shared by the API and the worker; each process exports the ones it updates
+#the API serves them at GET /metrics, the worker on its own port (WORKER_METRICS_PORT)
+#every update is an in-memory increment or bucket lookup, no I/O happens on the request or batch path
+
+#jobs waiting in each language queue and priority lane, refreshed from the depths the scheduler already reads
+QUEUE_DEPTH = Gauge(
+    'translation_queue_depth', "Jobs waiting in each language queue.", ['language', 'lane'],
+    multiprocess_mode='livemax'
+)
+#seconds between the API queueing a job and the worker picking it up
+QUEUE_WAIT = Histogram(
+    'translation_queue_wait_seconds', "Time jobs spend queued before a worker takes them.", ['language', 'lane'],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60, 300)
+)
+#seconds between the API queueing a job and the worker saving its result, per priority lane
+JOB_LATENCY = Histogram(
+    'translation_job_latency_seconds', "Time from queueing a job to saving its result.", ['language', 'lane'],
+    buckets=(0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60, 300, 1800, 3600)
+)
+BATCH_JOBS = Histogram(
+    'translation_batch_jobs', "Jobs per batch handed to the worker.", ['language'],
+    buckets=(1, 2, 4, 8, 16, 32, 64)
+)
+#padded tokens (longest input x inputs) of each generate call, see MAX_BATCH_TOKENS
+GENERATE_TOKENS = Histogram(
+    'translation_generate_padded_tokens', "Padded tokens per generate call.", ['language'],
+    buckets=(16, 64, 256, 512, 1024, 2048, 4096, 8192)
+)
+INFERENCE_SECONDS = Histogram(
+    'translation_inference_seconds', "Time to translate one batch, cache lookups included.", ['language'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60)
+)
+MODEL_LOAD_SECONDS = Histogram(
+    'translation_model_load_seconds', "Time to load a translation model.", ['backend'],
+    buckets=(0.5, 1, 2, 5, 10, 30, 60, 120, 300)
+)
+#lookups of translation_cache: keys; layer is 'l1' (API memory), 'redis' (API) or 'segment' (worker)
+#hit ratio = rate(hits) / rate(all lookups) per layer
+CACHE_LOOKUPS = Counter(
+    'translation_cache_lookups_total', "Translation cache lookups by layer and outcome.", ['layer', 'result']
+)
+REDIS_SECONDS = Histogram(
+    'translation_redis_round_trip_seconds', "Redis round-trip time by operation.", ['operation'],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+)
+
+#admission control in the API: the estimated queue wait of each language and the jobs turned away
+ESTIMATED_WAIT = Gauge(
+    'translation_estimated_wait_seconds', "Estimated queue wait of a new job, per language.", ['language'],
+    multiprocess_mode='livemax'
+)
+ADMISSION_REJECTIONS = Counter(
+    'translation_admission_rejections_total', "Jobs rejected with 429 because the queue exceeded its SLO.", ['language']
+)
+
+#counts cache lookups of one layer, e.g. count_cache_lookups('redis', hits=3, misses=1)
+def count_cache_lookups(layer: str, hits: int = 0, misses: int = 0):
+    if hits:
+        CACHE_LOOKUPS.labels(layer, 'hit').inc(hits)
+    if misses:
+        CACHE_LOOKUPS.labels(layer, 'miss').inc(misses)
+
+#returns the metrics of this process in the Prometheus text format
+#under gunicorn set PROMETHEUS_MULTIPROC_DIR, so every API worker process writes its metrics
+#there and a scrape of any of them reports the totals of all
+def render_metrics():
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
@@ -0,0 +1,130 @@
+import os
+import logging
+from threading import Lock
+from collections import OrderedDict
+
+from app.core.config import MODEL_SIZE_ESTIMATE_BYTES
+
+logger = logging.getLogger(__name__)
+
+#--- Translation Model Cache ---
+#an LRU of loaded translators, bounded by an estimate of the memory their weights take
+#models are loaded on first use, and the least recently used ones are evicted once the
+#budget is exceeded. Pinned models are never evicted.
+#the cache lock only guards the bookkeeping. Every model has its own load lock, so a slow
+#download or initialization only blocks the threads waiting for that same model
+class ModelCache:
+    def __init__(self, max_bytes: int, pinned: set[str] | None = None):
+        self.max_bytes = max_bytes
+        self.pinned = set(pinned or ())
+        #key -> (translator, size), ordered from least to most recently used
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = Lock()
+        self._load_locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.load_failures = 0
+        self.evictions = 0
+
+    #returns the cached translator for key, calling loader() to create it on a miss
+    #exceptions raised by loader are passed on to the caller, and nothing is cached
+    def get(self, key: str, loader):
+        with self._lock:
+            translator = self._lookup(key)
+            if translator is not None:
+                self.hits += 1
+                return translator
+            self.misses += 1
+            load_lock = self._load_locks.setdefault(key, Lock())
+
+        with load_lock:
+            #another thread may have loaded the same model while this one waited
+            with self._lock:
+                translator = self._lookup(key)
+            if translator is not None:
+                return translator
+
+            try:
+                translator = loader()
+            except Exception:
+                with self._lock:
+                    self.load_failures += 1
+                raise
+            size = estimate_model_bytes(translator)
+
+            with self._lock:
+                self._entries[key] = (translator, size)
+                self._size += size
+                self.loads += 1
+                self._evict(keep=key)
+        logger.info(f"Model cache: loaded {key} (~{size / 2**20:.0f} MB). {self.stats()}")
+        return translator
+
+    #returns the keys of the loaded models, least recently used first
+    def keys(self):
+        with self._lock:
+            return list(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    #returns the counters and current usage for monitoring
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "models": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "pinned": sorted(self.pinned),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "loads": self.loads,
+                "load_failures": self.load_failures,
+                "evictions": self.evictions,
+            }
+
+    #must be called with the lock held
+    def _lookup(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    #drops least recently used, unpinned models until the budget holds again
+    #the model that was just loaded (keep) stays even if it alone exceeds the budget
+    #must be called with the lock held
+    def _evict(self, keep: str):
+        for key in list(self._entries):
+            if self._size <= self.max_bytes:
+                break
+            if key == keep or key in self.pinned:
+                continue
+            _, size = self._entries.pop(key)
+            self._size -= size
+            self.evictions += 1
+            logger.info(f"Model cache: evicted {key} to stay within {self.max_bytes / 2**20:.0f} MB.")
+        if self._size > self.max_bytes:
+            logger.warning(f"Model cache holds {self._size / 2**20:.0f} MB of pinned or in-use models, "
+                           f"over its {self.max_bytes / 2**20:.0f} MB budget.")
+
+#returns the approximate memory taken by a translator's weights
+#PyTorch models are measured from their parameters, converted CTranslate2 models from their
+#files on disk, and anything else falls back to MODEL_SIZE_ESTIMATE_BYTES
+def estimate_model_bytes(translator):
+    model = getattr(translator, 'model', None)
+    if model is not None and hasattr(model, 'parameters'):
+        try:
+            return sum(parameter.numel() * parameter.element_size() for parameter in model.parameters())
+        except Exception:
+            pass
+    model_dir = getattr(translator, 'model_dir', None)
+    if model_dir and os.path.isdir(model_dir):
+        return sum(entry.stat().st_size for entry in os.scandir(model_dir) if entry.is_file())
+    return MODEL_SIZE_ESTIMATE_BYTES
@@ -0,0 +1,151 @@
+import json
+import time
+import logging
+
+from app.core.config import (
+    LANGUAGE_CODES, REQUEST_QUEUE_KEY, RESULTS_CACHE_PREFIX, FINISHED_RESULT_TTL, COMPLETIONS_CHANNEL,
+    BATCH_SIZE, BATCH_TIMEOUT, SCHEDULER_MAX_WAIT, PRIORITY_LANES, LANE_WEIGHTS
+)
+from app.services.keys import get_request_queue_key
+from app.services.metrics import QUEUE_DEPTH
+from app.services.codec import decode_job
+
+logger = logging.getLogger(__name__)
+
+# --- Lane Picker ---
+#weighted fair choice between the priority lanes that have jobs waiting (smooth weighted round-robin)
+#with weights interactive=4, bulk=1 and both lanes busy, the lanes are served i, i, b, i, i, i, i, b, ...
+#so bulk jobs get a fifth of the batches however many interactive jobs are waiting, and a lane
+#with nothing waiting leaves its share to the others
+class LanePicker:
+    def __init__(self, weights: dict[str, int] = LANE_WEIGHTS):
+        self.weights = weights
+        self._credit = {lane: 0 for lane in weights}
+
+    #returns the lane to serve next out of ready, a non-empty list of lanes in priority order
+    def pick(self, ready: list[str]):
+        for lane in ready:
+            self._credit[lane] += self.weights[lane]
+        #ties go to the first, most urgent lane
+        chosen = max(ready, key=lambda lane: self._credit[lane])
+        self._credit[chosen] -= sum(self.weights[lane] for lane in ready)
+        return chosen
+
+# --- Batch Scheduler ---
+#every language has its own queue per priority lane, so each batch holds jobs for a single model and lane
+#the lane to serve is chosen by weight among the lanes with waiting jobs (LanePicker), then the
+#language within it from the depth and age of each queue, and up to batch_size jobs are drained
+#from that queue with one LPOP (LPOP with a count needs Redis 6.2+)
+#the old shared queue (REQUEST_QUEUE_KEY) is watched too, so jobs pushed by API processes
+#still running an older version during a rolling deploy are routed to their language queue
+class BatchScheduler:
+    def __init__(self, redis_client, batch_size: int = BATCH_SIZE, max_wait: float = SCHEDULER_MAX_WAIT,
+                 block_timeout: float = BATCH_TIMEOUT, lane_weights: dict[str, int] = LANE_WEIGHTS):
+        self.redis_client = redis_client
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.block_timeout = block_timeout
+        self.lane_picker = LanePicker(lane_weights)
+        #(language name, lane) -> queue key, most urgent lane first, and the reverse for blocking pops
+        self.queue_keys = {
+            (lang, lane): get_request_queue_key(lang, lane) for lane in PRIORITY_LANES for lang in LANGUAGE_CODES
+        }
+        self.queues_by_key = {key: queue for queue, key in self.queue_keys.items()}
+
+    #returns (language, jobs) for the next batch, or (None, []) if nothing is ready yet
+    #all jobs of a batch come from the same lane
+    def next_batch(self):
+        queue = self._pick_queue()
+        if queue:
+            return queue[0], self._drain(self.queue_keys[queue], self.batch_size)
+
+        #all queues are empty: block on every queue at once until a job arrives
+        #BLPOP serves the first non-empty key, and interactive queues come first
+        #the timeout is passed as a float, since a BLPOP timeout of 0 would block forever
+        watched_keys = list(self.queue_keys.values()) + [REQUEST_QUEUE_KEY]
+        popped = self.redis_client.blpop(watched_keys, timeout=self.block_timeout)
+        if not popped:
+            return None, []
+        queue_key, task_json = popped
+        if queue_key == REQUEST_QUEUE_KEY:
+            #a job from the old shared queue is routed and picked up on the next call
+            route_legacy_tasks(self.redis_client, [task_json])
+            return None, []
+        #start right away with whatever else is already waiting in the same queue
+        jobs = [decode_job(task_json)] + self._drain(queue_key, self.batch_size - 1)
+        return self.queues_by_key[queue_key][0], jobs
+
+    #jobs popped from a list are already gone from Redis, so there is nothing to acknowledge
+    def ack(self, jobs: list[dict]):
+        pass
+
+    #inspects every queue in one round-trip and returns the (language, lane) to serve next
+    #within a lane, a queue that can fill a whole batch scores 1, and a queue whose oldest job has
+    #waited max_wait seconds also scores 1, so full batches are preferred but no job waits much longer
+    def _pick_queue(self):
+        with self.redis_client.pipeline(transaction=False) as pipe:
+            for queue_key in self.queue_keys.values():
+                pipe.llen(queue_key)
+                pipe.lindex(queue_key, 0)
+            pipe.llen(REQUEST_QUEUE_KEY)
+            replies = pipe.execute()
+
+        if replies[-1]:
+            migrate_legacy_queue(self.redis_client)
+
+        now = time.time()
+        #lane -> (best score, language)
+        best = {}
+        for i, (lang, lane) in enumerate(self.queue_keys):
+            depth, oldest_json = replies[2 * i], replies[2 * i + 1]
+            QUEUE_DEPTH.labels(lang, lane).set(depth)
+            if not depth or not oldest_json:
+                continue
+            score = min(depth, self.batch_size) / self.batch_size + self._age(oldest_json, now) / self.max_wait
+            if score > best.get(lane, (0.0, None))[0]:
+                best[lane] = (score, lang)
+        if not best:
+            return None
+        lane = self.lane_picker.pick([lane for lane in PRIORITY_LANES if lane in best])
+        return best[lane][1], lane
+
+    #returns how long a job has waited, from the 'queued_at' timestamp set by the API
+    #the API and worker clocks may differ, so the age is only as accurate as their clock sync
+    def _age(self, task_json: str, now: float):
+        queued_at = decode_job(task_json).get('queued_at')
+        if queued_at is None:
+            #jobs from older API versions carry no timestamp, treat them as due
+            return self.max_wait
+        #a job stamped "in the future" means the API clock runs ahead of this worker's
+        return max(now - queued_at, 0.0)
+
+    #pops up to count jobs from one queue in a single LPOP
+    def _drain(self, queue_key: str, count: int):
+        if count <= 0:
+            return []
+        tasks = self.redis_client.lpop(queue_key, count) or []
+        return [decode_job(task_json) for task_json in tasks]
+
+#pushes jobs taken from the old shared queue onto their language queue
+def route_legacy_tasks(redis_client, tasks: list[str]):
+    with redis_client.pipeline(transaction=False) as pipe:
+        for task_json in tasks:
+            task = decode_job(task_json)
+            if task['lang'].lower() in LANGUAGE_CODES:
+                pipe.rpush(get_request_queue_key(task['lang']), task_json)
+            else:
+                #no queue serves this language, so fail the job instead of leaving it queued forever
+                failed_payload = json.dumps({'status': 'failed', 'result': f"Language '{task['lang']}' not supported."})
+                pipe.set(f"{RESULTS_CACHE_PREFIX}{task['id']}", failed_payload, ex=FINISHED_RESULT_TTL)
+                pipe.publish(COMPLETIONS_CHANNEL, task['id'])
+        pipe.execute()
+
+#moves every job left in the old shared queue into the per-language queues
+def migrate_legacy_queue(redis_client):
+    moved = 0
+    while tasks := redis_client.lpop(REQUEST_QUEUE_KEY, BATCH_SIZE):
+        route_legacy_tasks(redis_client, tasks)
+        moved += len(tasks)
+    if moved:
+        logger.info(f"Moved {moved} jobs from {REQUEST_QUEUE_KEY} to the per-language queues.")
+    return moved
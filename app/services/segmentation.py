@@ -0,0 +1,62 @@
+import re
+
+from app.core.config import SEGMENT_MAX_CHARS, LANGUAGE_CODES
+
+# --- Sentence Segmentation ---
+#long notes are translated sentence by sentence, so identical sentences shared between
+#patients are cached and translated once, and no input reaches the model's token limit
+
+#end of a sentence: terminal punctuation, optional closing quotes/brackets, then whitespace
+SENTENCE_END = re.compile(r'[.!?]+["\')\]]*(\s+)')
+#short words that end with a period without ending the sentence
+ABBREVIATIONS = {"dr", "mr", "mrs", "ms", "vs", "etc", "e.g", "i.e", "approx", "no", "st", "fig"}
+#target languages that do not put spaces between sentences
+NO_SPACE_LANGUAGE_CODES = {"zh"}
+
+#splits text into segments and the whitespace that followed each one
+#joining them back with join_segments gives the original text
+def split_into_segments(text: str, max_chars: int = SEGMENT_MAX_CHARS):
+    segments = []
+    separators = []
+    start = 0
+    for match in SENTENCE_END.finditer(text):
+        sentence = text[start:match.start(1)]
+        last_word = sentence.rstrip('.!?"\')]').rsplit(None, 1)[-1].lower() if sentence.strip() else ""
+        if last_word in ABBREVIATIONS:
+            continue
+        _append_segment(sentence, match.group(1), max_chars, segments, separators)
+        start = match.end()
+
+    if start < len(text):
+        _append_segment(text[start:], "", max_chars, segments, separators)
+    return segments, separators
+
+#reassembles translated segments using the separators returned by split_into_segments
+def join_segments(translated_segments, separators, target_language: str = ""):
+    no_space = LANGUAGE_CODES.get(target_language.lower()) in NO_SPACE_LANGUAGE_CODES
+    parts = []
+    for segment, separator in zip(translated_segments, separators):
+        parts.append(segment)
+        #keep line breaks, but drop plain spaces for languages written without them
+        parts.append("" if no_space and separator.strip(" ") == "" else separator)
+    return "".join(parts)
+
+#adds one sentence, cutting it at word boundaries if it is longer than max_chars
+def _append_segment(sentence, separator, max_chars, segments, separators):
+    while len(sentence) > max_chars:
+        cut = sentence.rfind(" ", 0, max_chars + 1)
+        if cut <= 0:
+            #a single word longer than the limit is cut hard
+            cut = max_chars
+        segments.append(sentence[:cut])
+        rest = sentence[cut:]
+        remainder = rest.lstrip(" ")
+        separators.append(rest[:len(rest) - len(remainder)])
+        sentence = remainder
+
+    if sentence:
+        segments.append(sentence)
+        separators.append(separator)
+    elif separators:
+        #nothing left of this sentence, keep its whitespace on the previous segment
+        separators[-1] += separator
@@ -0,0 +1,247 @@
+import os
+import json
+import time
+import socket
+import logging
+import threading
+
+import redis
+
+from app.core.config import (
+    LANGUAGE_CODES, RESULTS_CACHE_PREFIX, FINISHED_RESULT_TTL, COMPLETIONS_CHANNEL, BATCH_SIZE, BATCH_TIMEOUT,
+    SCHEDULER_MAX_WAIT, STREAM_GROUP, STREAM_CLAIM_IDLE, STREAM_CLAIM_INTERVAL, STREAM_MAX_DELIVERIES,
+    PRIORITY_LANES, LANE_WEIGHTS, DEFAULT_PRIORITY, DEFAULT_QUALITY
+)
+from app.services.keys import get_translation_cache_key, get_request_queue_key, get_request_stream_key
+from app.services.coalescing import get_inflight_keys, FINISH_SCRIPT
+from app.services.metrics import QUEUE_DEPTH
+from app.services.scheduler import LanePicker
+from app.services.codec import decode_job
+from app.services.documents import add_document_result, touch_document
+
+logger = logging.getLogger(__name__)
+
+FINISHED_STATUSES = ('completed', 'failed')
+
+# --- Stream Scheduler ---
+#the QUEUE_BACKEND="stream" counterpart of BatchScheduler, with the same next_batch() and ack()
+#every language has its own stream per priority lane, read by all workers through one consumer group
+#a job read from a stream stays in the group's pending entries until the worker acknowledges it
+#after saving its result, so a worker that dies mid-batch loses nothing: once its jobs have been
+#pending for claim_idle seconds, the next worker to check claims and translates them again
+#acknowledged jobs are deleted from the stream, so a stream only holds queued and pending jobs
+class StreamScheduler:
+    def __init__(self, redis_client, consumer: str | None = None, batch_size: int = BATCH_SIZE,
+                 max_wait: float = SCHEDULER_MAX_WAIT, block_timeout: float = BATCH_TIMEOUT,
+                 claim_idle: float = STREAM_CLAIM_IDLE, claim_interval: float = STREAM_CLAIM_INTERVAL,
+                 max_deliveries: int = STREAM_MAX_DELIVERIES, lane_weights: dict[str, int] = LANE_WEIGHTS):
+        self.redis_client = redis_client
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.block_timeout = block_timeout
+        self.claim_idle = claim_idle
+        self.claim_interval = claim_interval
+        self.max_deliveries = max_deliveries
+        self.lane_picker = LanePicker(lane_weights)
+        #(language name, lane) -> stream key, and the reverse for the streams' replies
+        self.stream_keys = {
+            (lang, lane): get_request_stream_key(lang, lane) for lane in PRIORITY_LANES for lang in LANGUAGE_CODES
+        }
+        self.queues_by_key = {key: queue for queue, key in self.stream_keys.items()}
+        #one consumer per worker loop, so the pending jobs of a dead thread or process can be told apart
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}-{threading.get_ident()}"
+        #jobs delivered to this consumer that are not handed out yet, per language and lane
+        #they are pending in Redis too, so they are recovered if this worker dies holding them
+        self._backlog = {queue: [] for queue in self.stream_keys}
+        self._next_claim = 0.0
+        #fails the jobs that were delivered too often, and their attached requests
+        self.finish_script = redis_client.register_script(FINISH_SCRIPT)
+        ensure_stream_groups(redis_client)
+
+    #returns (language, jobs) for the next batch, or (None, []) if nothing is ready yet
+    def next_batch(self):
+        if time.time() >= self._next_claim:
+            self._next_claim = time.time() + self.claim_interval
+            self._claim_stale()
+        if not any(self._backlog.values()):
+            self._read()
+        return self._pick_batch()
+
+    #acknowledges jobs and deletes them from their streams; call it once their results are saved
+    #jobs that are never acknowledged are claimed by a worker again after claim_idle seconds
+    def ack(self, jobs: list[dict]):
+        entry_ids = {}
+        for job in jobs:
+            if '_stream' in job:
+                stream_key, entry_id = job['_stream']
+                entry_ids.setdefault(stream_key, []).append(entry_id)
+        if not entry_ids:
+            return
+        with self.redis_client.pipeline(transaction=False) as pipe:
+            for stream_key, ids in entry_ids.items():
+                pipe.xack(stream_key, STREAM_GROUP, *ids)
+                pipe.xdel(stream_key, *ids)
+            pipe.execute()
+
+    #blocks on every stream at once until jobs arrive, taking up to batch_size new jobs from each
+    def _read(self):
+        try:
+            replies = self.redis_client.xreadgroup(
+                STREAM_GROUP, self.consumer, {stream_key: '>' for stream_key in self.stream_keys.values()},
+                count=self.batch_size, block=max(1, int(self.block_timeout * 1000))
+            )
+        except redis.exceptions.ResponseError as e:
+            #the streams were deleted (e.g. by a FLUSHDB), recreate them and their group
+            if 'NOGROUP' not in str(e):
+                raise
+            ensure_stream_groups(self.redis_client)
+            return
+        for stream_key, entries in replies or []:
+            self._backlog[self.queues_by_key[stream_key]].extend(self._to_jobs(stream_key, entries))
+
+    #hands out up to batch_size jobs, choosing the lane and the language in it like BatchScheduler
+    def _pick_batch(self):
+        now = time.time()
+        #lane -> (best score, language)
+        best = {}
+        for (lang, lane), jobs in self._backlog.items():
+            if not jobs:
+                continue
+            score = min(len(jobs), self.batch_size) / self.batch_size + self._age(jobs[0], now) / self.max_wait
+            if score > best.get(lane, (0.0, None))[0]:
+                best[lane] = (score, lang)
+        if not best:
+            return None, []
+        lane = self.lane_picker.pick([lane for lane in PRIORITY_LANES if lane in best])
+        queue = (best[lane][1], lane)
+        jobs = self._backlog[queue][:self.batch_size]
+        del self._backlog[queue][:self.batch_size]
+        return queue[0], jobs
+
+    #returns how long a job has waited, from the 'queued_at' timestamp set by the API,
+    #or else from its stream entry ID, which starts with the Redis server time in milliseconds
+    def _age(self, job: dict, now: float):
+        queued_at = job.get('queued_at')
+        if queued_at is None:
+            queued_at = int(job['_stream'][1].split('-')[0]) / 1000
+        return max(now - queued_at, 0.0)
+
+    #claims the jobs that have been pending for claim_idle seconds, whichever consumer holds them
+    #jobs whose result is already saved (the worker died between saving and acknowledging) are only
+    #acknowledged, and jobs delivered max_deliveries times are failed instead of translated again
+    def _claim_stale(self):
+        idle_ms = int(self.claim_idle * 1000)
+        try:
+            with self.redis_client.pipeline(transaction=False) as pipe:
+                for stream_key in self.stream_keys.values():
+                    pipe.xpending_range(stream_key, STREAM_GROUP, min='-', max='+', count=self.batch_size, idle=idle_ms)
+                    pipe.xlen(stream_key)
+                replies = pipe.execute()
+        except redis.exceptions.ResponseError as e:
+            if 'NOGROUP' not in str(e):
+                raise
+            ensure_stream_groups(self.redis_client)
+            return
+
+        for i, ((lang, lane), stream_key) in enumerate(self.stream_keys.items()):
+            pending, depth = replies[2 * i], replies[2 * i + 1]
+            #queued and pending jobs, refreshed every claim_interval
+            QUEUE_DEPTH.labels(lang, lane).set(depth)
+            if not pending:
+                continue
+            deliveries = {entry['message_id']: entry['times_delivered'] for entry in pending}
+            #min_idle_time makes the claim fail for jobs another worker claimed in the meantime
+            claimed = self.redis_client.xclaim(
+                stream_key, STREAM_GROUP, self.consumer, min_idle_time=idle_ms, message_ids=list(deliveries)
+            )
+            jobs = self._to_jobs(stream_key, claimed)
+            exhausted = [job for job in jobs if deliveries[job['_stream'][1]] >= self.max_deliveries]
+            retry = [job for job in jobs if deliveries[job['_stream'][1]] < self.max_deliveries]
+            if exhausted:
+                self._fail(lang, exhausted)
+            if retry:
+                retry = self._skip_finished(retry)
+                logger.warning(f"Claimed {len(retry)} {lang} jobs left pending by a stopped worker.")
+                self._backlog[(lang, lane)][:0] = retry
+
+    #acknowledges the jobs whose result was already saved and returns the others
+    def _skip_finished(self, jobs: list[dict]):
+        results = self.redis_client.mget([f"{RESULTS_CACHE_PREFIX}{job['id']}" for job in jobs])
+        finished = [job for job, result in zip(jobs, results) if result and json.loads(result)['status'] in FINISHED_STATUSES]
+        if finished:
+            self.ack(finished)
+            logger.info(f"Acknowledged {len(finished)} redelivered jobs whose results were already saved.")
+        return [job for job in jobs if job not in finished]
+
+    #saves a failed result for jobs that keep getting lost, and acknowledges them
+    def _fail(self, lang: str, jobs: list[dict]):
+        error = f"Translation failed after {self.max_deliveries} attempts."
+        payload = json.dumps({'status': 'failed', 'result': error})
+        with self.redis_client.pipeline() as pipe:
+            for job in jobs:
+                if 'document' in job:
+                    add_document_result(pipe, job['document'], job['index'], 'failed', error, 'failed')
+                    touch_document(pipe, job['document'])
+                    continue
+                pipe.set(f"{RESULTS_CACHE_PREFIX}{job['id']}", payload, ex=FINISHED_RESULT_TTL)
+                self.finish_script(
+                    keys=list(get_inflight_keys(
+                        get_translation_cache_key(job['text'], lang, job.get('quality', DEFAULT_QUALITY)),
+                        job.get('priority', DEFAULT_PRIORITY)
+                    )),
+                    args=[job['id'], payload, FINISHED_RESULT_TTL, RESULTS_CACHE_PREFIX, COMPLETIONS_CHANNEL],
+                    client=pipe
+                )
+            pipe.execute()
+        self.ack(jobs)
+        logger.error(f"Failed {len(jobs)} {lang} jobs that were delivered {self.max_deliveries} times without finishing.")
+
+    #turns stream entries into jobs that remember where they came from, for ack()
+    @staticmethod
+    def _to_jobs(stream_key: str, entries):
+        jobs = []
+        for entry_id, fields in entries:
+            #an entry deleted while it was pending has no fields left
+            if not fields:
+                continue
+            job = decode_job(fields['task'])
+            job['_stream'] = (stream_key, entry_id)
+            jobs.append(job)
+        return jobs
+
+#creates the consumer group on every language stream, and the streams themselves if needed
+#the group starts at ID 0, so it also delivers the jobs queued before it existed
+def ensure_stream_groups(redis_client):
+    for lang in LANGUAGE_CODES:
+        for lane in PRIORITY_LANES:
+            try:
+                redis_client.xgroup_create(get_request_stream_key(lang, lane), STREAM_GROUP, id='0', mkstream=True)
+            except redis.exceptions.ResponseError as e:
+                if 'BUSYGROUP' not in str(e):
+                    raise
+
+#pops a batch from a list queue and appends it to a stream in one step, so no job is lost in between
+#KEYS: list key, stream key; ARGV: max jobs to move
+MOVE_TO_STREAM_SCRIPT = """
+local tasks = redis.call('LPOP', KEYS[1], ARGV[1])
+if not tasks then
+    return 0
+end
+for _, task in ipairs(tasks) do
+    redis.call('XADD', KEYS[2], '*', 'task', task)
+end
+return #tasks
+"""
+
+#moves every job left in the per-language lists into the streams, after switching QUEUE_BACKEND
+def migrate_lists_to_streams(redis_client):
+    move = redis_client.register_script(MOVE_TO_STREAM_SCRIPT)
+    moved = 0
+    for lang in LANGUAGE_CODES:
+        for lane in PRIORITY_LANES:
+            queue_keys = [get_request_queue_key(lang, lane), get_request_stream_key(lang, lane)]
+            while count := move(keys=queue_keys, args=[BATCH_SIZE]):
+                moved += count
+    if moved:
+        logger.info(f"Moved {moved} jobs from the per-language lists to the streams.")
+    return moved
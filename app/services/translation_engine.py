@@ -1,76 +1,316 @@
 import json
 import time
-import hashlib
 import logging
-from threading import Lock
-from transformers import pipeline
 
+from app.services.keys import get_translation_cache_key, get_throughput_key, get_backend_name, get_model_id
+from app.services.segmentation import split_into_segments, join_segments
+from app.services.bucketing import bucket_by_length, estimate_token_length
+from app.services.backends import load_translator
+from app.services.model_cache import ModelCache
+from app.services.codec import encode_translation, decode_translation
+from app.services.translation_memory import open_translation_memory
+from app.services.metrics import (
+    QUEUE_WAIT, JOB_LATENCY, BATCH_JOBS, GENERATE_TOKENS, INFERENCE_SECONDS, MODEL_LOAD_SECONDS, REDIS_SECONDS, count_cache_lookups
+)
+from app.services.coalescing import get_inflight_keys, FINISH_SCRIPT
+from app.services.documents import add_document_result, touch_document
+from app.services.scheduler import BatchScheduler
+from app.services.streams import StreamScheduler
 from app.core.config import (
-    LANGUAGE_CODES, HELSINKI_NAME_TEMPLATE, BATCH_SIZE, BATCH_TIMEOUT,
-    TRANSLATION_CACHE_PREFIX, RESULTS_CACHE_PREFIX, REQUEST_QUEUE_KEY
+    LANGUAGE_CODES, HELSINKI_NAME_TEMPLATE, BATCH_TIMEOUT, MAX_BATCH_TOKENS,
+    MODEL_CACHE_MAX_BYTES, MODEL_CACHE_PINNED,
+    TRANSLATION_CACHE_TTL, RESULTS_CACHE_PREFIX, FINISHED_RESULT_TTL, INFLIGHT_TTL, COMPLETIONS_CHANNEL, QUEUE_BACKEND,
+    THROUGHPUT_BUCKET_SECONDS, ADMISSION_WINDOW, DEFAULT_PRIORITY, QUALITY_TIERS, DEFAULT_QUALITY
 )
 
 logger = logging.getLogger(__name__)
 
+#returns the model cache key of a language's model on a backend, or None for an unsupported language
+def get_model_key(target_language: str, backend: str | None = None):
+    if target_language.lower() not in LANGUAGE_CODES:
+        return None
+    return get_model_id(target_language, backend)
+
 # --- In-Memory Caching for ML Models ---
-#store the loaded models to avoid reloading them on every request
-model_cache = {}
-#prevent race conditions where two threads might try to load the same model simultaneously
-model_cache_lock = Lock()
-
-#generates a consistent, unique cache key for a translated text string
-def get_translation_cache_key(text: str, lang: str):
-    key_string = f"{text}:{lang}".encode('utf-8')
-    key_hash = hashlib.sha256(key_string).hexdigest()
-    return f"{TRANSLATION_CACHE_PREFIX}{key_hash}"
-
-#loads a specific translation model from Hugging Face
+#store the loaded models to avoid reloading them on every request, within a memory budget
+model_cache = ModelCache(
+    MODEL_CACHE_MAX_BYTES,
+    pinned={get_model_key(lang) for lang in MODEL_CACHE_PINNED if lang in LANGUAGE_CODES}
+)
+
+#the durable translation memory behind the Redis cache, None when TRANSLATION_MEMORY_PATH is not set
+translation_memory = open_translation_memory()
+
+#loads a specific translation model with the backend configured for its language
 #if the model is already loaded, it returns the cached instance
-def get_translation_pipeline(target_language: str):
+#backend overrides the configured backend, e.g. to compare two backends on the same model
+def get_translation_pipeline(target_language: str, backend: str | None = None):
     lang_code = LANGUAGE_CODES.get(target_language.lower())
     if not lang_code:
         return None, f"Language '{target_language}' not supported."
 
     model_name = HELSINKI_NAME_TEMPLATE.format(lang_code=lang_code)
-    
-    #use a lock to ensure thread-safe access to the model_cache dictionary
-    with model_cache_lock:
-        #if the model is already in our cache, return it
-        if model_name in model_cache:
-            return model_cache[model_name], None
-        
-        logger.info(f"Loading model: {model_name}...")
+    backend = backend or get_backend_name(target_language)
+
+    def load():
+        logger.info(f"Loading model: {model_name} ({backend})...")
+        #download and initialize the translator with the chosen backend
+        with MODEL_LOAD_SECONDS.labels(backend).time():
+            return load_translator(backend, model_name)
+
+    try:
+        #the cache only calls load on a miss, and only one thread loads a given model at a time
+        return model_cache.get(get_model_key(target_language, backend), load), None
+    except Exception as e:
+        error_message = f"Failed to load model {model_name}: {e}"
+        logger.error(error_message)
+        return None, error_message
+
+#returns the token length of every text, from the pipeline's tokenizer when it has one
+def get_token_lengths(translator_pipeline, texts: list[str]):
+    tokenizer = getattr(translator_pipeline, 'tokenizer', None)
+    if tokenizer is None:
+        return [estimate_token_length(text) for text in texts]
+    return [len(input_ids) for input_ids in tokenizer(texts, truncation=True)['input_ids']]
+
+#runs the pipeline over texts in length buckets, one generate call per bucket
+#every call uses the generation settings of the quality tier
+#returns the translated strings in the same order as texts
+def run_bucketed(translator_pipeline, texts: list[str], max_tokens: int = MAX_BATCH_TOKENS, lang: str = "",
+                 quality: str = DEFAULT_QUALITY):
+    generate_kwargs = QUALITY_TIERS[quality]
+    translations = [None] * len(texts)
+    lengths = get_token_lengths(translator_pipeline, texts)
+    buckets = bucket_by_length(lengths, max_tokens)
+    for bucket in buckets:
+        GENERATE_TOKENS.labels(lang).observe(len(bucket) * max(lengths[i] for i in bucket))
+        #batch_size makes the pipeline run the whole bucket as one generate call instead of one per input
+        outputs = translator_pipeline([texts[i] for i in bucket], batch_size=len(bucket), **generate_kwargs)
+        for i, output in zip(bucket, outputs):
+            translations[i] = output['translation_text']
+    logger.info(f"Translated {len(texts)} segments in {len(buckets)} length-bucketed generate calls.")
+    return translations
+
+#translates a list of texts for one language, sentence by sentence
+#every text is split into segments, each unique segment is looked up in the translation cache
+#with a single MGET, and only the missing ones are sent to the model, grouped by length
+#segments are cached per quality tier, like the texts they come from
+#returns the translations in input order and the new segment translations to cache
+def translate_texts(redis_client, translator_pipeline, lang: str, texts: list[str], max_tokens: int = MAX_BATCH_TOKENS,
+                    quality: str = DEFAULT_QUALITY):
+    split_texts = [split_into_segments(text) for text in texts]
+
+    #dict keeps the first-seen order and removes duplicates across the whole batch
+    unique_segments = list(dict.fromkeys(segment for segments, _ in split_texts for segment in segments))
+    segment_keys = [get_translation_cache_key(segment, lang, quality) for segment in unique_segments]
+    with REDIS_SECONDS.labels('segment_lookup').time():
+        cached_segments = redis_client.mget(segment_keys) if segment_keys else []
+
+    translations = {}
+    missing_segments = []
+    for segment, cached in zip(unique_segments, cached_segments):
+        if cached is None:
+            missing_segments.append(segment)
+        else:
+            translations[segment] = decode_translation(cached)
+
+    new_cache_entries = {}
+    #segments Redis no longer holds may still be in the translation memory
+    #they are returned with the new entries, so the save pipeline copies them back into Redis
+    if missing_segments and translation_memory is not None:
+        missing_keys = {segment: get_translation_cache_key(segment, lang, quality) for segment in missing_segments}
+        remembered = read_translation_memory(list(missing_keys.values()))
+        for segment, segment_key in missing_keys.items():
+            if segment_key in remembered:
+                translations[segment] = new_cache_entries[segment_key] = remembered[segment_key]
+        missing_segments = [segment for segment in missing_segments if segment not in translations]
+
+    if missing_segments:
+        translated_results = run_bucketed(translator_pipeline, missing_segments, max_tokens, lang=lang, quality=quality)
+        for segment, translated in zip(missing_segments, translated_results):
+            translations[segment] = translated
+            new_cache_entries[get_translation_cache_key(segment, lang, quality)] = translated
+
+    count_cache_lookups('segment', hits=len(unique_segments) - len(missing_segments), misses=len(missing_segments))
+    logger.info(
+        f"Segmented {len(texts)} texts for {lang} into {len(unique_segments)} unique segments: "
+        f"{len(unique_segments) - len(missing_segments)} cached, {len(missing_segments)} translated."
+    )
+    results = [
+        join_segments([translations[segment] for segment in segments], separators, lang)
+        for segments, separators in split_texts
+    ]
+    return results, new_cache_entries
+
+#returns {cache key: translation} of the keys found in the translation memory
+#the memory only saves work, so errors reading it are logged and count as misses
+def read_translation_memory(cache_keys: list[str]):
+    try:
+        remembered = translation_memory.get_many(cache_keys)
+    except Exception as e:
+        logger.error(f"Error reading the translation memory: {e}")
+        remembered = {}
+    count_cache_lookups('memory', hits=len(remembered), misses=len(cache_keys) - len(remembered))
+    return remembered
+
+#adds translations to the translation memory, after they were saved to Redis
+def write_translation_memory(translations: dict[str, str]):
+    if translation_memory is None or not translations:
+        return
+    try:
+        translation_memory.put_many(translations)
+    except Exception as e:
+        #not fatal, the translations stay in Redis for TRANSLATION_CACHE_TTL
+        logger.error(f"Error writing {len(translations)} translations to the translation memory: {e}")
+
+#extends the in-flight markers of the jobs this worker is about to translate by INFLIGHT_TTL
+#so identical requests keep attaching to them, while markers of jobs lost to a crash expire
+def renew_inflight_markers(redis_client, lang: str, jobs_to_process: list[dict]):
+    try:
+        with redis_client.pipeline(transaction=False) as pipe:
+            for job in jobs_to_process:
+                cache_key = get_translation_cache_key(job['text'], lang, job.get('quality', DEFAULT_QUALITY))
+                inflight_key, _ = get_inflight_keys(cache_key, job.get('priority', DEFAULT_PRIORITY))
+                pipe.expire(inflight_key, INFLIGHT_TTL)
+            pipe.execute()
+    except Exception as e:
+        #not fatal, the markers only expire earlier and identical requests queue their own job
+        logger.error(f"Error renewing in-flight markers: {e}")
+
+#records the size of a batch and how long each of its jobs waited in the queue, per lane
+#with saved=True, records instead how long each job took from queueing to its saved result
+def observe_batch(lang: str, jobs_to_process: list[dict], saved: bool = False):
+    if not saved:
+        BATCH_JOBS.labels(lang).observe(len(jobs_to_process))
+    histogram = JOB_LATENCY if saved else QUEUE_WAIT
+    now = time.time()
+    for job in jobs_to_process:
+        #jobs queued by older API versions carry no timestamp
+        if 'queued_at' in job:
+            histogram.labels(lang, job.get('priority', DEFAULT_PRIORITY)).observe(max(now - job['queued_at'], 0.0))
+
+#adds a translated batch to its language's current throughput bucket, queued on the save pipeline
+#the API's admission control divides the jobs of recent buckets by their busy seconds
+def record_throughput(pipe, lang: str, jobs: int, seconds: float):
+    throughput_key = get_throughput_key(lang, int(time.time() // THROUGHPUT_BUCKET_SECONDS))
+    pipe.hincrby(throughput_key, 'jobs', jobs)
+    pipe.hincrbyfloat(throughput_key, 'busy', seconds)
+    pipe.expire(throughput_key, ADMISSION_WINDOW + THROUGHPUT_BUCKET_SECONDS)
+
+#translates one batch of jobs for a single language and quality tier and saves the results to Redis
+#returns True once the results are saved, so the jobs may be acknowledged
+def process_batch(redis_client, lang: str, jobs_to_process: list[dict], finish_script):
+    #split_by_quality gives every batch a single tier; jobs without one were queued at the default
+    quality = jobs_to_process[0].get('quality', DEFAULT_QUALITY)
+    logger.info(f"Processing a batch of {len(jobs_to_process)} {quality} jobs for {lang}.")
+    observe_batch(lang, jobs_to_process)
+    renew_inflight_markers(redis_client, lang, jobs_to_process)
+    #segment translations produced while processing this batch, saved with the results
+    cache_entries = {}
+    #seconds spent translating, None unless the batch was translated
+    duration = None
+    translator_pipeline, error = get_translation_pipeline(lang)
+
+    #if model failed to load, mark all jobs for this language as failed
+    if not translator_pipeline:
+        for job in jobs_to_process:
+            job['status'] = 'failed'
+            job['result'] = error
+    else:
         try:
-            #download and initialize the translation pipeline from Hugging Face
-            translator = pipeline('translation', model=model_name)
-            model_cache[model_name] = translator
-            logger.info(f"Model {model_name} loaded and cached.")
-            return translator, None
+            #create a list of just the texts to be translated
+            texts = [job['text'] for job in jobs_to_process]
+
+            start_time = time.time()
+
+            #split into sentences and only send uncached ones to the pipeline, in one batch
+            translated_texts, cache_entries = translate_texts(redis_client, translator_pipeline, lang, texts, quality=quality)
+
+            duration = time.time() - start_time
+            INFERENCE_SECONDS.labels(lang).observe(duration)
+            logger.info(f"Translated batch for {lang} ({len(jobs_to_process)} jobs) in {duration:.2f} seconds.")
+
+            #map the results back to their original jobs
+            for job, translated_text in zip(jobs_to_process, translated_texts):
+                job['status'] = 'completed'
+                job['result'] = translated_text
         except Exception as e:
-            error_message = f"Failed to load model {model_name}: {e}"
-            logger.error(error_message)
-            return None, error_message
+            logger.error(f"Error during batch translation for language {lang}: {e}")
+            for job in jobs_to_process:
+                job['status'] = 'failed'
+                job['result'] = "Error during batch processing."
+
+    # --- Save all results back to Redis ---
+    try:
+        #use a Redis pipeline to execute multiple commands in a single network round-trip for efficiency
+        with redis_client.pipeline() as pipe:
+            #cache every newly translated sentence so later texts can reuse it
+            for segment_cache_key, translated_segment in cache_entries.items():
+                pipe.set(segment_cache_key, encode_translation(translated_segment), ex=TRANSLATION_CACHE_TTL)
+            if duration is not None:
+                record_throughput(pipe, lang, len(jobs_to_process), duration)
+
+            for job in jobs_to_process:
+                #canonicalized like the API's key, whether the scheduler names the language or its code
+                final_cache_key = get_translation_cache_key(job['text'], lang, quality)
+                #if the job was successful, cache the translation
+                if job.get('status') == 'completed':
+                    pipe.set(final_cache_key, encode_translation(job['result']), ex=TRANSLATION_CACHE_TTL) #cache for 1 hour
+                    cache_entries[final_cache_key] = job['result']
+
+                #items of a document job report to the document instead of a request ID
+                if 'document' in job:
+                    add_document_result(pipe, job['document'], job['index'], job['status'], job['result'], job['status'])
+                    continue
+
+                #store the final job status and result for user pickup
+                result_key = f"{RESULTS_CACHE_PREFIX}{job['id']}"
+                final_payload = json.dumps({'status': job['status'], 'result': job['result']})
+                pipe.set(result_key, final_payload, ex=FINISHED_RESULT_TTL) # result available for 5 mins
+
+                #hand the same result to every identical request that attached to this job,
+                #then tell the API processes waiting on any of them that the result is ready
+                finish_script(
+                    keys=list(get_inflight_keys(final_cache_key, job.get('priority', DEFAULT_PRIORITY))),
+                    args=[job['id'], final_payload, FINISHED_RESULT_TTL, RESULTS_CACHE_PREFIX, COMPLETIONS_CHANNEL],
+                    client=pipe
+                )
+
+            for document_id in {job['document'] for job in jobs_to_process if 'document' in job}:
+                touch_document(pipe, document_id)
+
+            with REDIS_SECONDS.labels('save_results').time():
+                pipe.execute()
+        logger.info(f"Successfully saved results for {len(jobs_to_process)} jobs to Redis.")
+        observe_batch(lang, jobs_to_process, saved=True)
+        #the sentences and full texts outlive their Redis TTL in the translation memory
+        #written after the results, so waiting clients do not wait for the disk
+        write_translation_memory(cache_entries)
+        return True
+    except Exception as e:
+        logger.error(f"Error saving results to Redis: {e}")
+        return False
+
+#splits a batch into batches of jobs with the same quality tier, in the order their tiers first appear
+#a generate call runs with one set of generation settings, so jobs of different tiers cannot share one
+def split_by_quality(jobs: list[dict]):
+    batches = {}
+    for job in jobs:
+        batches.setdefault(job.get('quality', DEFAULT_QUALITY), []).append(job)
+    return list(batches.values())
 
 #runs continuously in a background thread to process jobs
-#fetches jobs from the Redis queue and processes them in batches
+#the scheduler hands out batches that hold jobs for a single language, translated one quality tier at a time
 def translation_worker(redis_client):
     if not redis_client: return
+    #copies each finished result to the requests that were attached to the job while it was pending
+    finish_script = redis_client.register_script(FINISH_SCRIPT)
+    scheduler = StreamScheduler(redis_client) if QUEUE_BACKEND == 'stream' else BatchScheduler(redis_client)
 
     while True:
-        jobs_to_process = []
         try:
-            #loop attempts to pull a batch of jobs from the queue
-            for _ in range(BATCH_SIZE):
-                #blpop is a "blocking pop". It waits for an item to appear or until the timeout
-                #this is highly efficient as it doesn't constantly poll Redis
-                task_json_tuple = redis_client.blpop(REQUEST_QUEUE_KEY, timeout=int(BATCH_TIMEOUT))
-
-                #timeout reached, process the jobs we have so far
-                if not task_json_tuple:
-                    break
-
-                #the item from Redis is a JSON string, so we parse it into a Python dict
-                jobs_to_process.append(json.loads(task_json_tuple[1]))
+            #blocks for up to BATCH_TIMEOUT when every queue is empty
+            lang, jobs_to_process = scheduler.next_batch()
         except Exception as e:
             logger.error(f"Error popping job from Redis: {e}")
             time.sleep(BATCH_TIMEOUT)
@@ -80,62 +320,11 @@ def translation_worker(redis_client):
         if not jobs_to_process:
             continue
 
-        logger.info(f"Processing a batch of {len(jobs_to_process)} jobs.")
-        #group jobs by target language so we can process them with the same model
-        grouped_by_lang = {}
-        for job in jobs_to_process:
-            lang = job['lang']
-            grouped_by_lang.setdefault(lang, []).append(job)
-
-        #process each language group as a separate batch.
-        for lang, jobs in grouped_by_lang.items():
-            translator_pipeline, error = get_translation_pipeline(lang)
-
-            #if model failed to load, mark all jobs for this language as failed
-            if not translator_pipeline:
-                for job in jobs:
-                    job['status'] = 'failed'
-                    job['result'] = error
-                continue
-
-            try:
-                #create a list of just the texts to be translated
-                texts = [job['text'] for job in jobs]
-
-                start_time = time.time()
-
-                #pass the entire list to the pipeline for efficient, batched translation
-                translated_results = translator_pipeline(texts)
-
-                duration = time.time() - start_time
-                logger.info(f"Translated batch for {lang} ({len(jobs)} jobs) in {duration:.2f} seconds.")
-
-                #map the results back to their original jobs
-                for i, job in enumerate(jobs):
-                    job['status'] = 'completed'
-                    job['result'] = translated_results[i]['translation_text']
-            except Exception as e:
-                logger.error(f"Error during batch translation for language {lang}: {e}")
-                for job in jobs:
-                    job['status'] = 'failed'
-                    job['result'] = "Error during batch processing."
-        
-        # --- Save all results back to Redis ---
-        try:
-            #use a Redis pipeline to execute multiple commands in a single network round-trip for efficiency
-            with redis_client.pipeline() as pipe:
-                for job in jobs_to_process:
-                    #if the job was successful, cache the translation
-                    if job.get('status') == 'completed':
-                        final_cache_key = get_translation_cache_key(job['text'], job['lang'])
-                        pipe.set(final_cache_key, job['result'], ex=3600) #cache for 1 hour
-                    
-                    #store the final job status and result for user pickup
-                    result_key = f"{RESULTS_CACHE_PREFIX}{job['id']}"
-                    final_payload = json.dumps({'status': job['status'], 'result': job['result']})
-                    pipe.set(result_key, final_payload, ex=300) # result available for 5 mins
-
-                pipe.execute()
-            logger.info(f"Successfully saved results for {len(jobs_to_process)} jobs to Redis.")
-        except Exception as e:
-            logger.error(f"Error saving results to Redis: {e}")
+        for quality_batch in split_by_quality(jobs_to_process):
+            #unsaved results leave stream jobs pending, so another worker retries them after STREAM_CLAIM_IDLE
+            if process_batch(redis_client, lang, quality_batch, finish_script):
+                try:
+                    scheduler.ack(quality_batch)
+                except Exception as e:
+                    #the jobs are claimed again later and skipped, since their results are saved
+                    logger.error(f"Error acknowledging jobs: {e}")
@@ -0,0 +1,126 @@
+import os
+import math
+import time
+import sqlite3
+import logging
+import threading
+
+from app.services.codec import encode_translation, decode_translation, to_bytes
+from app.core.config import TRANSLATION_MEMORY_PATH, TRANSLATION_MEMORY_MAX_BYTES
+
+logger = logging.getLogger(__name__)
+
+#--- Translation Memory ---
+#a durable SQLite store of the translations the worker produced, behind the Redis cache
+#Redis forgets a translation after TRANSLATION_CACHE_TTL, a restart or an eviction; the memory keeps
+#it until compaction, so those misses cost a local read instead of a model call. The API and the
+#worker read it on a Redis miss and copy the hits back into Redis.
+#rows are keyed by the translation cache key, which holds the model and CACHE_KEY_VERSION, so a
+#changed model never serves the translations of its predecessor. Values are stored compressed.
+#the database runs in WAL mode, so the API and worker processes of the host read while one of them
+#writes. Every thread of every process opens its own connection on first use.
+#a read hit refreshes the row's last_used. Since the hit is copied to Redis, a row is read about
+#once per Redis TTL at most, so the refresh writes little. compact() deletes the least recently
+#used rows once the data outgrows max_bytes.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS translations (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    last_used REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS translations_last_used ON translations (last_used);
+"""
+#keys per statement, below SQLite's limit on bound variables (999 before 3.32)
+MAX_VARIABLES = 500
+#compaction deletes down to this share of max_bytes, so the next writes do not trigger another one right away
+COMPACT_TARGET = 0.9
+#most delete rounds of one compaction; the next compaction finishes the job if they were not enough
+COMPACT_ROUNDS = 5
+
+class TranslationMemory:
+    def __init__(self, path: str, max_bytes: int = TRANSLATION_MEMORY_MAX_BYTES, busy_timeout: float = 5.0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+
+    #returns this thread's connection, opening it and creating the schema on first use
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        #a forked worker process must not share its parent's connection
+        if connection is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=self.busy_timeout)
+            #auto_vacuum only takes effect if it is set before the first table is created
+            connection.execute('PRAGMA auto_vacuum=INCREMENTAL')
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(SCHEMA)
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return connection
+
+    #returns {key: translation} for the keys found, and marks them as used
+    def get_many(self, keys: list[str]):
+        connection = self._connect()
+        found = {}
+        for start in range(0, len(keys), MAX_VARIABLES):
+            chunk = keys[start:start + MAX_VARIABLES]
+            rows = connection.execute(
+                f"SELECT key, value FROM translations WHERE key IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchall()
+            found.update((key, decode_translation(value)) for key, value in rows)
+        if found:
+            try:
+                with connection:
+                    connection.executemany('UPDATE translations SET last_used = ? WHERE key = ?',
+                                           [(time.time(), key) for key in found])
+            except sqlite3.OperationalError as e:
+                #the database stayed locked past busy_timeout; the rows only look older to compaction
+                logger.warning(f"Could not mark {len(found)} translation memory hits as used: {e}")
+        return found
+
+    #stores translations by cache key, replacing older ones under the same key
+    def put_many(self, translations: dict[str, str]):
+        if not translations:
+            return
+        now = time.time()
+        rows = [(key, to_bytes(encode_translation(text, compact=True)), now) for key, text in translations.items()]
+        connection = self._connect()
+        with connection:
+            connection.executemany('INSERT OR REPLACE INTO translations (key, value, last_used) VALUES (?, ?, ?)', rows)
+
+    #returns the bytes of the database pages in use
+    def size(self):
+        connection = self._connect()
+        page_size = connection.execute('PRAGMA page_size').fetchone()[0]
+        page_count = connection.execute('PRAGMA page_count').fetchone()[0]
+        free_pages = connection.execute('PRAGMA freelist_count').fetchone()[0]
+        return (page_count - free_pages) * page_size
+
+    #deletes the least recently used translations once the data outgrows max_bytes, then returns
+    #the freed pages to the file system and folds the write-ahead log back into the database
+    #deleted rows leave part-filled pages behind, so it deletes in a few rounds until the pages in use fit
+    def compact(self):
+        connection = self._connect()
+        size_before = size = self.size()
+        target = COMPACT_TARGET * self.max_bytes
+        deleted = 0
+        for _ in range(COMPACT_ROUNDS if size_before > self.max_bytes else 0):
+            rows = connection.execute('SELECT COUNT(*) FROM translations').fetchone()[0]
+            if size <= target or not rows:
+                break
+            #rows are about the same size, so delete the same share of rows as of bytes
+            excess = math.ceil(rows * (1 - target / size))
+            with connection:
+                deleted += connection.execute(
+                    'DELETE FROM translations WHERE key IN (SELECT key FROM translations ORDER BY last_used LIMIT ?)',
+                    (excess,)
+                ).rowcount
+            size = self.size()
+        connection.execute('PRAGMA incremental_vacuum')
+        connection.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        return {"deleted": deleted, "bytes_before": size_before, "bytes_after": self.size()}
+
+#returns the translation memory at path, or None when it is not configured
+def open_translation_memory(path: str = TRANSLATION_MEMORY_PATH):
+    return TranslationMemory(path) if path else None
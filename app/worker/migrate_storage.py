@@ -0,0 +1,84 @@
+"""
+re-encodes the translations already in the Redis cache to the configured storage format
+
+with --compact, translations of CACHE_COMPRESS_MIN_BYTES or more are compressed, as the worker
+writes them with COMPACT_STORAGE=true. With --plain they are written back as plain text, which
+is needed before rolling back to a version that cannot read compressed values.
+keys are scanned in batches; each one is only rewritten if it still holds the value that was
+read, and keeps its remaining TTL, so the migration is safe to run against a live service
+and can be stopped and run again at any time.
+queued jobs need no migration: the worker reads JSON and msgpack jobs alike, and the results
+of finished jobs keep their JSON format.
+
+usage:
+    REDIS_HOST=localhost python app/worker/migrate_storage.py --compact
+    REDIS_HOST=localhost python app/worker/migrate_storage.py --plain --dry-run
+"""
+
+import sys
+import json
+import argparse
+import logging
+
+sys.path.append('.')
+
+from app.services.codec import encode_translation, decode_translation, to_bytes
+from app.core.config import TRANSLATION_CACHE_PREFIX, CACHE_COMPRESS_MIN_BYTES
+from app.db.redis_client import create_redis_client
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+#replaces a key's value only if it is unchanged, keeping its TTL (SET KEEPTTL needs Redis 6+)
+#a key that expired or was rewritten since it was read is left alone
+#KEYS: cache key; ARGV: value that was read, new value
+REPLACE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[2], 'KEEPTTL')
+    return 1
+end
+return 0
+"""
+
+#re-encodes every cached translation and returns counts of the keys seen, rewritten and their sizes
+def migrate(redis_client, compact: bool, batch_size: int = 500, min_bytes: int = CACHE_COMPRESS_MIN_BYTES,
+            dry_run: bool = False):
+    replace = redis_client.register_script(REPLACE_SCRIPT)
+    stats = {"keys": 0, "rewritten": 0, "bytes_before": 0, "bytes_after": 0}
+    cursor = 0
+    while True:
+        cursor, keys = redis_client.scan(cursor, match=f"{TRANSLATION_CACHE_PREFIX}*", count=batch_size)
+        if keys:
+            values = redis_client.mget(keys)
+            with redis_client.pipeline(transaction=False) as pipe:
+                for key, value in zip(keys, values):
+                    if value is None:
+                        continue
+                    current = to_bytes(value)
+                    target = to_bytes(encode_translation(decode_translation(value), compact=compact, min_bytes=min_bytes))
+                    stats["keys"] += 1
+                    stats["bytes_before"] += len(current)
+                    stats["bytes_after"] += len(target)
+                    if target != current:
+                        stats["rewritten"] += 1
+                        if not dry_run:
+                            replace(keys=[key], args=[current, target], client=pipe)
+                pipe.execute()
+        if cursor == 0:
+            break
+    return stats
+
+def main(args):
+    redis_client = create_redis_client()
+    stats = migrate(redis_client, compact=args.compact, batch_size=args.batch_size, dry_run=args.dry_run)
+    logger.info(f"{'Would rewrite' if args.dry_run else 'Rewrote'} {stats['rewritten']} of {stats['keys']} cached translations.")
+    print(json.dumps(stats, indent=4))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert cached translations between plain and compressed storage.")
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--compact", action="store_true", help="compress translations of CACHE_COMPRESS_MIN_BYTES or more")
+    mode.add_argument("--plain", action="store_true", help="store every translation as plain text again")
+    parser.add_argument("--batch-size", type=int, default=500, help="keys per SCAN and MGET")
+    parser.add_argument("--dry-run", action="store_true", help="only count the keys that would change")
+    main(parser.parse_args())
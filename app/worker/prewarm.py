@@ -0,0 +1,189 @@
+"""
+pre-warms the translation cache from a corpus of known phrases, without the API or the job queues
+
+the corpus is a text file with one phrase per line, or a JSONL file of {"text": ...} objects
+that may name their own "target_language". Phrases without one are translated to every language
+given with --languages (all supported languages by default). The corpus is streamed in chunks of
+--chunk-size lines. In each chunk, phrases are deduplicated by cache key and looked up in Redis,
+then in the translation memory if one is configured. Only the misses are translated, with the
+worker's models and sentence cache, in length-sorted generate calls of up to --max-batch-tokens
+padded tokens. The translations and their sentences are written to Redis in one pipelined
+round-trip per chunk with a TTL of --ttl seconds, and to the translation memory.
+--quality picks the quality tier that is translated and cached (the default tier by default).
+with --checkpoint, the byte offset of the first unprocessed line is saved after every chunk, and a
+run started again with the same checkpoint resumes from there. A chunk that was cut short is
+translated again on resume, but its already cached phrases are only looked up.
+progress and throughput are logged after every chunk and reported as JSON at the end.
+run it where the worker runs, it loads the same models.
+
+usage:
+    REDIS_HOST=localhost python app/worker/prewarm.py phrases.txt --languages french spanish
+    REDIS_HOST=localhost python app/worker/prewarm.py corpus.jsonl --checkpoint prewarm.json --ttl 86400
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+
+sys.path.append('.')
+
+from app.services import translation_engine
+from app.services.translation_engine import get_translation_pipeline, translate_texts, write_translation_memory
+from app.services.keys import get_translation_cache_key
+from app.services.codec import encode_translation
+from app.core.config import LANGUAGE_CODES, TRANSLATION_CACHE_TTL, MAX_BATCH_TOKENS, QUALITY_TIERS, DEFAULT_QUALITY
+from app.db.redis_client import create_redis_client
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+#counters of a run; they are saved in the checkpoint, so a resumed run reports the totals of all its runs
+STAT_NAMES = ("phrases", "requests", "unique", "cached", "remembered", "translated", "failed", "segments_written",
+              "translate_seconds", "elapsed_seconds")
+
+#yields (offset after the line, text, target language or None) for every phrase from byte offset on
+def read_corpus(path: str, offset: int = 0):
+    is_jsonl = path.endswith('.jsonl')
+    with open(path, 'rb') as corpus:
+        corpus.seek(offset)
+        for line in corpus:
+            offset += len(line)
+            line = line.decode('utf-8').strip()
+            if not line:
+                continue
+            if is_jsonl:
+                phrase = json.loads(line)
+                yield offset, phrase['text'], phrase.get('target_language')
+            else:
+                yield offset, line, None
+
+#yields lists of up to size items
+def chunked(items, size: int):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+#returns the stats and the byte offset saved in a checkpoint, or fresh ones if it does not exist
+#a checkpoint of another corpus is refused, resuming from its offset would skip the wrong lines
+def load_checkpoint(path: str | None, corpus: str):
+    if not path or not os.path.exists(path):
+        return dict.fromkeys(STAT_NAMES, 0), 0
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint['corpus'] != os.path.abspath(corpus):
+        sys.exit(f"Checkpoint {path} belongs to {checkpoint['corpus']}, not {corpus}. Pass another --checkpoint.")
+    logger.info(f"Resuming {corpus} at byte {checkpoint['offset']}, {checkpoint['stats']['phrases']} phrases done.")
+    return checkpoint['stats'], checkpoint['offset']
+
+#replaces the checkpoint in one rename, so a run killed while saving leaves the previous one intact
+def save_checkpoint(path: str | None, corpus: str, offset: int, stats: dict):
+    if not path:
+        return
+    with open(f"{path}.tmp", 'w') as f:
+        json.dump({'corpus': os.path.abspath(corpus), 'offset': offset, 'stats': stats}, f)
+    os.replace(f"{path}.tmp", path)
+
+#translates the phrases of one chunk that are not cached yet, and caches them
+#phrases: (text, target language or None); returns nothing, the counts are added to stats
+def prewarm_chunk(redis_client, phrases, languages: list[str], stats: dict, ttl: int = TRANSLATION_CACHE_TTL,
+                  max_tokens: int = MAX_BATCH_TOKENS, quality: str = DEFAULT_QUALITY):
+    #cache key -> (language, text), deduplicated across the chunk
+    requests = {}
+    for text, lang in phrases:
+        for target in ([lang.lower()] if lang else languages):
+            if target not in LANGUAGE_CODES:
+                stats['failed'] += 1
+                continue
+            stats['requests'] += 1
+            requests.setdefault(get_translation_cache_key(text, target, quality), (target, text))
+    stats['unique'] += len(requests)
+    if not requests:
+        return
+
+    keys = list(requests)
+    cached = redis_client.mget(keys)
+    missing = [key for key, value in zip(keys, cached) if value is None]
+    stats['cached'] += len(keys) - len(missing)
+    #cache key -> translation, everything this chunk writes to Redis
+    entries = {}
+    if missing and translation_engine.translation_memory is not None:
+        remembered = translation_engine.read_translation_memory(missing)
+        entries.update(remembered)
+        stats['remembered'] += len(remembered)
+        missing = [key for key in missing if key not in remembered]
+
+    by_language = {}
+    for key in missing:
+        lang, text = requests[key]
+        by_language.setdefault(lang, []).append((key, text))
+    for lang, items in by_language.items():
+        translator_pipeline, error = get_translation_pipeline(lang)
+        if not translator_pipeline:
+            logger.error(f"Skipping {len(items)} {lang} phrases: {error}")
+            stats['failed'] += len(items)
+            continue
+        start_time = time.time()
+        translations, segment_entries = translate_texts(redis_client, translator_pipeline, lang,
+                                                        [text for _, text in items], max_tokens, quality)
+        stats['translate_seconds'] += time.time() - start_time
+        stats['translated'] += len(items)
+        stats['segments_written'] += len(segment_entries)
+        entries.update(segment_entries)
+        entries.update((key, translation) for (key, _), translation in zip(items, translations))
+
+    if entries:
+        with redis_client.pipeline(transaction=False) as pipe:
+            for key, translation in entries.items():
+                pipe.set(key, encode_translation(translation), ex=ttl)
+            pipe.execute()
+        write_translation_memory(entries)
+
+#streams the corpus through prewarm_chunk, saving the checkpoint after every chunk, and returns the stats
+def prewarm(redis_client, corpus: str, languages: list[str], chunk_size: int = 2000, checkpoint: str | None = None,
+            ttl: int = TRANSLATION_CACHE_TTL, max_tokens: int = MAX_BATCH_TOKENS, quality: str = DEFAULT_QUALITY):
+    stats, offset = load_checkpoint(checkpoint, corpus)
+    for chunk in chunked(read_corpus(corpus, offset), chunk_size):
+        start_time = time.time()
+        prewarm_chunk(redis_client, [(text, lang) for _, text, lang in chunk], languages, stats, ttl, max_tokens, quality)
+        stats['phrases'] += len(chunk)
+        stats['elapsed_seconds'] += time.time() - start_time
+        save_checkpoint(checkpoint, corpus, chunk[-1][0], stats)
+        logger.info(
+            f"{stats['phrases']} phrases: {stats['cached'] + stats['remembered']} already cached, "
+            f"{stats['translated']} translated at {stats['translated'] / max(stats['translate_seconds'], 1e-9):.1f}/s."
+        )
+    return stats
+
+def main(args):
+    languages = [lang.lower() for lang in args.languages] if args.languages else list(LANGUAGE_CODES)
+    unknown = [lang for lang in languages if lang not in LANGUAGE_CODES]
+    if unknown:
+        sys.exit(f"Unsupported languages: {', '.join(unknown)}. Choose from {', '.join(LANGUAGE_CODES)}.")
+    redis_client = create_redis_client()
+    if not redis_client:
+        sys.exit("Could not connect to Redis.")
+    stats = prewarm(redis_client, args.corpus, languages, args.chunk_size, args.checkpoint, args.ttl, args.max_batch_tokens,
+                    args.quality)
+    elapsed = max(stats['elapsed_seconds'], 1e-9)
+    report = dict(stats, requests_per_second=round(stats['requests'] / elapsed, 1),
+                  translations_per_second=round(stats['translated'] / max(stats['translate_seconds'], 1e-9), 1))
+    print(json.dumps({name: round(value, 3) if isinstance(value, float) else value for name, value in report.items()}, indent=4))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Translate a corpus of known phrases straight into the translation cache.")
+    parser.add_argument("corpus", help="text file with one phrase per line, or .jsonl of {\"text\", \"target_language\"}")
+    parser.add_argument("--languages", nargs="+", help="languages of phrases without their own (default: all)")
+    parser.add_argument("--chunk-size", type=int, default=2000, help="corpus lines per lookup, translation and write round")
+    parser.add_argument("--max-batch-tokens", type=int, default=MAX_BATCH_TOKENS, help="padded tokens per generate call")
+    parser.add_argument("--ttl", type=int, default=TRANSLATION_CACHE_TTL, help="seconds the translations stay in Redis")
+    parser.add_argument("--quality", default=DEFAULT_QUALITY, choices=list(QUALITY_TIERS), help="quality tier to translate and cache")
+    parser.add_argument("--checkpoint", help="file recording progress, to resume an interrupted run")
+    main(parser.parse_args())
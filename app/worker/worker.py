@@ -1,34 +1,55 @@
-import logging
+import gc
+import os
 import sys
+import time
+import logging
+import multiprocessing
 from threading import Thread
 
+import torch
+from prometheus_client import start_http_server
+
 sys.path.append('.')
 
-from app.services.translation_engine import translation_worker, get_translation_pipeline
-from app.core.config import LANGUAGE_CODES, NUM_WORKER_THREADS
-from app.db.redis_client import redis_client
+from app.services.translation_engine import translation_worker, get_translation_pipeline, translation_memory
+from app.services.scheduler import migrate_legacy_queue
+from app.services.streams import ensure_stream_groups, migrate_lists_to_streams
+from app.core.config import (
+    LANGUAGE_CODES, WORKER_MODE, NUM_WORKER_THREADS, NUM_WORKER_PROCESSES,
+    TORCH_THREADS_PER_PROCESS, WORKER_PIN_CORES, MODEL_CACHE_PINNED, WORKER_METRICS_PORT, QUEUE_BACKEND,
+    TRANSLATION_MEMORY_COMPACT_INTERVAL
+)
+from app.db.redis_client import redis_client, create_redis_client
 
 #setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-#pre-loads all the ML models into the shared memory for this process
-#spawns multiple worker threads to process jobs concurrently
-def main():
-    logger.info("--- Starting Multi-Threaded Translation Worker Process ---")
+#seconds between checks that every worker process is still alive
+PROCESS_CHECK_INTERVAL = 5
 
-    if not redis_client:
-        logger.error("Could not connect to Redis. Worker cannot start.")
+#deletes the least recently used translations once the translation memory outgrows its budget
+def compact_translation_memory():
+    try:
+        stats = translation_memory.compact()
+    except Exception as e:
+        logger.error(f"Error compacting the translation memory: {e}")
         return
+    if stats['deleted']:
+        logger.info(f"Compacted the translation memory from {stats['bytes_before']} to {stats['bytes_after']} bytes, "
+                    f"deleting {stats['deleted']} least recently used translations.")
 
-    #pre-load model once into main thread
-    #this model cache will be shared by all threads spawned in this process
-    logger.info(f"Main process ({__name__}): Pre-loading all supported translation models...")
-    for lang_name in LANGUAGE_CODES.keys():
-        get_translation_pipeline(lang_name)
-    logger.info(f"Main Process ({__name__}): All models loaded and ready to be shared.")
+#compacts the translation memory every TRANSLATION_MEMORY_COMPACT_INTERVAL seconds, in thread mode
+def run_compaction():
+    while True:
+        time.sleep(TRANSLATION_MEMORY_COMPACT_INTERVAL)
+        compact_translation_memory()
 
-    #create and start worker threads
+#spawns multiple worker threads that share the models loaded in this process
+def run_threads():
+    #the threads share one set of metrics, served from this process
+    start_http_server(WORKER_METRICS_PORT)
+    logger.info(f"Serving worker metrics on port {WORKER_METRICS_PORT}.")
     threads = []
     for i in range(NUM_WORKER_THREADS):
         logger.info(f"Starting worker thread {i+1}/{NUM_WORKER_THREADS}...")
@@ -36,10 +57,104 @@ def main():
         thread.daemon = True
         threads.append(thread)
         thread.start()
+    if translation_memory is not None:
+        Thread(target=run_compaction, daemon=True).start()
 
     #keep the main process alive
     for thread in threads:
         thread.join()
 
+#splits the cores this process may use into one group per worker process
+#returns None for every process when pinning is off, unsupported, or there are too few cores
+def get_core_groups(num_processes: int, threads_per_process: int):
+    if not WORKER_PIN_CORES or not hasattr(os, 'sched_getaffinity'):
+        return [None] * num_processes
+    available = sorted(os.sched_getaffinity(0))
+    if len(available) < num_processes * threads_per_process:
+        logger.warning(
+            f"{num_processes} processes x {threads_per_process} threads need more than the "
+            f"{len(available)} available cores, worker processes will not be pinned."
+        )
+        return [None] * num_processes
+    return [available[i * threads_per_process:(i + 1) * threads_per_process] for i in range(num_processes)]
+
+#entry point of a forked worker process
+#the models are inherited from the parent, so the process only sets up its cores and Redis connection
+def run_worker_process(index: int, cores):
+    if cores:
+        os.sched_setaffinity(0, cores)
+    torch.set_num_threads(TORCH_THREADS_PER_PROCESS)
+    #every process keeps its own metrics, so each one serves them on its own port
+    start_http_server(WORKER_METRICS_PORT + index)
+    logger.info(f"Worker process {index} (pid {os.getpid()}) running on cores {cores or 'any'} "
+                f"with {TORCH_THREADS_PER_PROCESS} torch threads, metrics on port {WORKER_METRICS_PORT + index}.")
+    translation_worker(create_redis_client())
+
+#forks one worker process per core group and restarts any that exits
+def run_processes():
+    #move every object loaded so far out of the garbage collector's reach, so collections in the
+    #children do not write to (and so copy) the pages holding the parent's model objects
+    gc.freeze()
+    #fork, not spawn, so the children share the loaded weights instead of loading their own copy
+    #the parent has not run any inference, so torch's thread pools have not been started yet
+    context = multiprocessing.get_context('fork')
+    core_groups = get_core_groups(NUM_WORKER_PROCESSES, TORCH_THREADS_PER_PROCESS)
+
+    def start(index):
+        process = context.Process(target=run_worker_process, args=(index, core_groups[index]), daemon=True)
+        process.start()
+        return process
+
+    processes = [start(i) for i in range(NUM_WORKER_PROCESSES)]
+    next_compaction = time.monotonic() + TRANSLATION_MEMORY_COMPACT_INTERVAL
+    while True:
+        time.sleep(PROCESS_CHECK_INTERVAL)
+        for i, process in enumerate(processes):
+            if not process.is_alive():
+                logger.error(f"Worker process {i} (pid {process.pid}) exited with code {process.exitcode}, restarting it.")
+                processes[i] = start(i)
+        #compacted from this loop rather than a thread, so no thread can hold a lock while a process is forked
+        if translation_memory is not None and time.monotonic() >= next_compaction:
+            compact_translation_memory()
+            next_compaction = time.monotonic() + TRANSLATION_MEMORY_COMPACT_INTERVAL
+
+#pre-loads the pinned ML models into the memory of this process, then starts the workers
+#in thread mode the threads share the models, in process mode the forked processes inherit them
+def main():
+    logger.info(f"--- Starting Translation Worker ({WORKER_MODE} mode) ---")
+
+    if not redis_client:
+        logger.error("Could not connect to Redis. Worker cannot start.")
+        return
+    if WORKER_MODE not in ('thread', 'process'):
+        logger.error(f"Unknown WORKER_MODE '{WORKER_MODE}', expected 'thread' or 'process'. Worker cannot start.")
+        return
+    if QUEUE_BACKEND not in ('list', 'stream'):
+        logger.error(f"Unknown QUEUE_BACKEND '{QUEUE_BACKEND}', expected 'list' or 'stream'. Worker cannot start.")
+        return
+    #one intra-op thread while loading; forked worker processes raise it to TORCH_THREADS_PER_PROCESS
+    torch.set_num_threads(1)
+
+    #pre-load the pinned models once into main thread
+    #they will be shared by all threads, or inherited by all processes; other languages load on first use
+    logger.info(f"Main process ({__name__}): Pre-loading pinned translation models: {MODEL_CACHE_PINNED or 'none'}...")
+    for lang_name in MODEL_CACHE_PINNED:
+        if lang_name in LANGUAGE_CODES:
+            get_translation_pipeline(lang_name)
+    logger.info(f"Main Process ({__name__}): Pinned models loaded and ready to be shared.")
+
+    #jobs queued by an older version sit in the old shared queue
+    #move them now; the scheduler keeps routing any that older API processes push later
+    migrate_legacy_queue(redis_client)
+    if QUEUE_BACKEND == 'stream':
+        #jobs queued on the lists before the switch to streams move over, in order
+        ensure_stream_groups(redis_client)
+        migrate_lists_to_streams(redis_client)
+
+    if WORKER_MODE == 'process':
+        run_processes()
+    else:
+        run_threads()
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
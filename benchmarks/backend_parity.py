@@ -0,0 +1,89 @@
+"""
+checks an optimized inference backend against the fp32 PyTorch reference
+
+every sample sentence is translated by the reference ("transformers") backend and by the
+candidate backend for each language. The report gives, per language, the share of identical
+outputs, the mean character similarity of the rest (difflib ratio, 1.0 = identical) and
+the sentences per second of each backend, plus the pairs that differ the most for review.
+
+usage (needs the models, plus `pip install ctranslate2` or `pip install optimum[onnxruntime]`):
+    python benchmarks/backend_parity.py --backend ctranslate2 --languages french spanish
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from difflib import SequenceMatcher
+
+sys.path.append('.')
+os.environ.setdefault('SERVICE_TOKEN_SECRET', 'benchmark-secret')
+
+from app.services.translation_engine import get_translation_pipeline, run_bucketed
+from app.services.segmentation import split_into_segments
+from app.core.config import LANGUAGE_CODES
+
+SAMPLES = [
+    "recommended_treatment: Observation",
+    "recommended_treatment: Observation or vaginal brachytherapy",
+    "recommended_treatment: Systemic therapy with or without external beam radiation therapy and/or vaginal brachytherapy",
+    "patient_notes: Your report shows a low-grade endometrial cancer confined to the uterine lining with no spread to lymph nodes. "
+    "No further treatment beyond your surgery is typically necessary. We recommend close monitoring with regular follow-up appointments.",
+    "patient_notes: Your pathology shows a high-grade uterine cancer that has reached the outer lining of the uterus but has not "
+    "spread to lymph nodes. We recommend a combination of chemotherapy and pelvic radiation, which may include internal vaginal "
+    "radiation, to reduce the risk of the cancer returning.",
+    "patient_notes: Your surgery removed the uterine cancer, which was limited to the inner half of the uterine muscle and did not "
+    "spread to your lymph nodes. This is considered an early stage (IA) cancer. We will work together to plan the next steps for your care.",
+]
+
+#translates the sentences with one backend and returns the translations and sentences per second
+def translate_with(lang, backend, sentences):
+    translator, error = get_translation_pipeline(lang, backend=backend)
+    if not translator:
+        raise RuntimeError(error)
+    #one warm-up call, so lazy initialization is not timed
+    run_bucketed(translator, sentences[:1])
+    start = time.perf_counter()
+    translations = run_bucketed(translator, sentences)
+    return translations, len(sentences) / (time.perf_counter() - start)
+
+def compare(lang, backend, sentences, worst):
+    reference, reference_speed = translate_with(lang, 'transformers', sentences)
+    candidate, candidate_speed = translate_with(lang, backend, sentences)
+    similarities = [SequenceMatcher(None, a, b).ratio() for a, b in zip(reference, candidate)]
+    ranked = sorted(zip(similarities, sentences, reference, candidate))
+    return {
+        "sentences": len(sentences),
+        "exact_match": round(sum(a == b for a, b in zip(reference, candidate)) / len(sentences), 3),
+        "mean_similarity": round(sum(similarities) / len(similarities), 4),
+        "min_similarity": round(ranked[0][0], 4),
+        "reference_sentences_per_second": round(reference_speed, 2),
+        "candidate_sentences_per_second": round(candidate_speed, 2),
+        "speedup": round(candidate_speed / reference_speed, 2),
+        "most_different": [
+            {"similarity": round(similarity, 4), "source": source, "reference": ref, "candidate": cand}
+            for similarity, source, ref, cand in ranked[:worst] if similarity < 1.0
+        ],
+    }
+
+def main(args):
+    #the models translate segments, so compare them segment by segment
+    sentences = list(dict.fromkeys(segment for text in SAMPLES for segment in split_into_segments(text)[0]))
+    report = {"backend": args.backend, "languages": {}}
+    for lang in args.languages:
+        report["languages"][lang] = compare(lang, args.backend, sentences, args.worst)
+    print(json.dumps(report, indent=4, ensure_ascii=False))
+
+    #a non-zero exit lets CI gate a backend switch on parity
+    lowest = min(result["mean_similarity"] for result in report["languages"].values())
+    if lowest < args.min_similarity:
+        sys.exit(f"Mean similarity {lowest} is below {args.min_similarity}.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare an inference backend with the PyTorch reference.")
+    parser.add_argument("--backend", default="ctranslate2", choices=["ctranslate2", "onnx", "transformers"])
+    parser.add_argument("--languages", nargs="+", default=list(LANGUAGE_CODES))
+    parser.add_argument("--worst", type=int, default=3, help="differing pairs to show per language")
+    parser.add_argument("--min-similarity", type=float, default=0.9, help="fail below this mean similarity")
+    main(parser.parse_args())
@@ -0,0 +1,59 @@
+"""
+measures what each API worker process pays to import app.main: wall time and resident memory
+
+every sample runs in a fresh interpreter, the way each gunicorn worker imports the app.
+--with-ml also imports torch and transformers after the app, which is what every API worker
+paid before the web tier stopped importing the worker's ML code. Compare the two runs.
+
+usage:
+    python benchmarks/bench_api_startup.py --samples 5
+    python benchmarks/bench_api_startup.py --samples 5 --with-ml
+"""
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+#runs in the child interpreter and prints the import time and resident memory as JSON
+CHILD = """
+import os, sys, time, json
+sys.path.append('.')
+os.environ.setdefault('SERVICE_TOKEN_SECRET', 'benchmark-secret')
+start = time.perf_counter()
+import app.main
+if {with_ml}:
+    import torch
+    from transformers import pipeline
+elapsed = time.perf_counter() - start
+rss_kb = next(int(line.split()[1]) for line in open('/proc/self/status') if line.startswith('VmRSS:'))
+print(json.dumps({{"import_seconds": elapsed, "rss_mb": rss_kb / 1024,
+                  "ml_loaded": [m for m in ('torch', 'transformers') if m in sys.modules]}}))
+"""
+
+def sample(with_ml):
+    output = subprocess.run([sys.executable, "-c", CHILD.format(with_ml=with_ml)],
+                            capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+def main(args):
+    samples = [sample(args.with_ml) for _ in range(args.samples)]
+    report = {
+        "with_ml": args.with_ml,
+        "samples": args.samples,
+        "ml_modules_loaded": samples[0]["ml_loaded"],
+        "import_seconds_median": round(statistics.median(s["import_seconds"] for s in samples), 3),
+        "rss_mb_median": round(statistics.median(s["rss_mb"] for s in samples), 1),
+        "rss_mb_for_workers": round(statistics.median(s["rss_mb"] for s in samples) * args.workers, 1),
+        "workers": args.workers,
+    }
+    print(json.dumps(report, indent=4))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import time and RSS of one API worker process.")
+    parser.add_argument("--samples", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=3, help="gunicorn workers, to total the RSS")
+    parser.add_argument("--with-ml", action="store_true", help="also import torch and transformers")
+    main(parser.parse_args())
@@ -0,0 +1,145 @@
+"""
+measures the translation cache hit ratio of a request trace under the old and the canonical cache keys
+
+every request of the trace is looked up in an unbounded cache and stored on a miss, once per key scheme:
+raw: the old key, sha256 of "{text}:{target_language}" exactly as received
+lowercased: the old key with the language lowercased, as the API's request validation does
+canonical: get_translation_cache_key, which also maps the language to its code and keys the text
+in NFC with its whitespace normalized
+the key schemes only differ in which requests they consider identical, so the difference in hit
+ratio is the share of requests the canonical key saves from being translated again.
+
+--trace replays a JSONL file with one {"text": ..., "target_language": ...} object per request,
+e.g. exported from the API access logs. Without it, a trace is generated from the source texts of
+tests/analysis: --unique logical texts are requested with Zipf-distributed popularity, and each
+request is sent in one of the variants pasted or typed text commonly arrives in (language
+casing, a trailing space or newline, a doubled space, a no-break space, Windows line endings,
+decomposed accents) with the rates in VARIANT_RATES. The generated trace shows how the key schemes compare, the
+hit ratio to plan with is the one of a real trace.
+
+usage:
+    python benchmarks/bench_cache_keys.py
+    python benchmarks/bench_cache_keys.py --requests 200000 --unique 20000
+    python benchmarks/bench_cache_keys.py --trace requests.jsonl
+"""
+
+import os
+import sys
+import json
+import random
+import hashlib
+import argparse
+import unicodedata
+
+sys.path.append('.')
+os.environ.setdefault('SERVICE_TOKEN_SECRET', 'benchmark-secret')
+
+from app.services.keys import get_translation_cache_key
+
+ANALYSIS_FILE = "tests/analysis/analysis0.json"
+
+#share of generated requests sent in each variant; the rest are sent as the canonical text
+VARIANT_RATES = {
+    "trailing_space": 0.06,
+    "trailing_newline": 0.04,
+    "double_space": 0.03,
+    "no_break_space": 0.02,
+    "crlf": 0.03,
+    "nfd": 0.02,
+}
+#how the language name is written, the API lowercases it before it reaches the cache
+LANGUAGE_FORMS = (str.title, str.lower, str.upper)
+
+def legacy_key(text: str, lang: str):
+    return hashlib.sha256(f"{text}:{lang}".encode('utf-8')).hexdigest()
+
+KEY_SCHEMES = {
+    "raw": legacy_key,
+    "lowercased": lambda text, lang: legacy_key(text, lang.lower()),
+    "canonical": get_translation_cache_key,
+}
+
+#returns the English source texts and the language names of the analysis file
+def load_sources():
+    with open(ANALYSIS_FILE) as f:
+        analysis = json.load(f)
+    sources = list(dict.fromkeys(row["Original Term"] for rows in analysis.values() for row in rows))
+    return sources, list(analysis)
+
+#returns n logical texts: single sources, and two-line notes built from pairs of them
+#accented words are mixed in so the NFD variant changes some texts, as it does with real names
+def make_texts(sources, n, rng):
+    accented = ["Café", "Müller", "José", "Zoë", "Łódź", "São Paulo"]
+    texts = []
+    for i in range(n):
+        text = f"{rng.choice(sources)} {rng.choice(accented)} ({i})"
+        if i % 3 == 0:
+            text = f"{text}\nSee {rng.choice(sources)}"
+        texts.append(text)
+    return texts
+
+#returns one request's text in the given variant
+def apply_variant(text: str, variant: str | None):
+    if variant == "trailing_space":
+        return text + " "
+    if variant == "trailing_newline":
+        return text + "\n"
+    if variant == "double_space":
+        return text.replace(" ", "  ", 1)
+    if variant == "no_break_space":
+        return text.replace(" ", "\u00a0", 1)
+    if variant == "crlf":
+        return text.replace("\n", "\r\n") + "\r\n"
+    if variant == "nfd":
+        return unicodedata.normalize('NFD', text)
+    return text
+
+#generates a trace of (text, target_language) requests
+def generate_trace(n_requests, n_unique, seed):
+    rng = random.Random(seed)
+    sources, languages = load_sources()
+    texts = make_texts(sources, n_unique, rng)
+    #Zipf popularity: the i-th most requested text is asked for about 1/i as often as the first
+    weights = [1 / (rank + 1) for rank in range(n_unique)]
+    variants, variant_weights = list(VARIANT_RATES) + [None], list(VARIANT_RATES.values()) + [1 - sum(VARIANT_RATES.values())]
+    trace = []
+    for text in rng.choices(texts, weights=weights, k=n_requests):
+        lang = rng.choice(LANGUAGE_FORMS)(rng.choice(languages))
+        trace.append((apply_variant(text, rng.choices(variants, weights=variant_weights)[0]), lang))
+    return trace
+
+def load_trace(path):
+    with open(path) as f:
+        return [(request["text"], request["target_language"]) for request in map(json.loads, f) if request]
+
+#returns the hit ratio and the number of distinct keys of a trace under one key scheme
+def replay(trace, key_fn):
+    cache = set()
+    hits = 0
+    for text, lang in trace:
+        key = key_fn(text, lang)
+        if key in cache:
+            hits += 1
+        else:
+            cache.add(key)
+    return {"hit_ratio": round(hits / len(trace), 4), "keys": len(cache)}
+
+def main(args):
+    trace = load_trace(args.trace) if args.trace else generate_trace(args.requests, args.unique, args.seed)
+    results = {name: replay(trace, key_fn) for name, key_fn in KEY_SCHEMES.items()}
+    report = {
+        "trace": args.trace or "generated",
+        "requests": len(trace),
+        "schemes": results,
+        #extra hits of the canonical key over the key the service used before it
+        "hit_ratio_gain": round(results["canonical"]["hit_ratio"] - results["lowercased"]["hit_ratio"], 4),
+    }
+    print(json.dumps(report, indent=4))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cache hit ratio of the old and the canonical translation cache keys.")
+    parser.add_argument("--trace", help="JSONL file of requests to replay instead of a generated trace")
+    parser.add_argument("--requests", type=int, default=100_000, help="requests in the generated trace")
+    parser.add_argument("--unique", type=int, default=10_000, help="distinct texts in the generated trace")
+    parser.add_argument("--seed", type=int, default=0)
+    main(parser.parse_args())
@@ -0,0 +1,274 @@
+"""
+measures raw translation throughput of the inference hot path across a grid of its knobs
+
+the translator of every --backends x --languages pair is loaded once, then every combination of
+--torch-threads (torch.set_num_threads, or the CTranslate2 intra-op threads, as
+TORCH_THREADS_PER_PROCESS sets them in the worker), --concurrency (threads calling the shared
+translator at once, as NUM_WORKER_THREADS worker loops do), --tokens (input length) and
+--batch-sizes (inputs per generate call, the knob behind BATCH_SIZE and MAX_BATCH_TOKENS) and
+--qualities (the quality tiers of QUALITY_TIERS, whose generation settings every generate call
+takes) is run --warmup times untimed and --repeat times timed.
+
+every call is split into the translator's own stages and each is timed: tokenize (text to input
+IDs), generate (the model) and decode (output IDs to text). The stages run exactly as the
+backend's __call__ runs them, so the sum is what one generate call of the worker costs. The
+inputs are built from the source texts of tests/analysis, cut or extended to about --tokens
+tokens, and every input of a batch is different.
+
+every grid point reports sentences/sec, source tokens/sec, generated tokens/sec, the batch
+latency and the per-stage ms (medians over the repetitions), and the peak resident memory of
+the process while it ran (sampled every few ms). With --output the report is saved with the
+commit it ran on; --baseline adds each point's sentences/sec change against a saved report.
+
+runs offline: models are read from the Hugging Face cache (HF_HUB_OFFLINE is set unless already
+given), or from --model-dir, a directory of opus-mt-en-{code} model folders saved with
+save_pretrained or `huggingface-cli download --local-dir`.
+
+usage:
+    python benchmarks/bench_inference.py --languages french --batch-sizes 1 8 32 --tokens 16 64 --torch-threads 1 4
+    python benchmarks/bench_inference.py --model-dir /models --backends transformers ctranslate2 --output inference.json
+    python benchmarks/bench_inference.py --model-dir /models --baseline inference.json
+    python benchmarks/bench_inference.py --qualities fast best --batch-sizes 8 --tokens 64
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import threading
+import subprocess
+from statistics import median
+
+sys.path.append('.')
+os.environ.setdefault('SERVICE_TOKEN_SECRET', 'benchmark-secret')
+os.environ.setdefault('HF_HUB_OFFLINE', '1')
+
+import torch
+
+from app.services import backends
+from app.services.backends import load_translator, CTranslate2Translator
+from app.services.translation_engine import get_translation_pipeline
+from app.services.bucketing import estimate_token_length
+from app.core.config import LANGUAGE_CODES, BATCH_SIZE, NUM_WORKER_THREADS, TORCH_THREADS_PER_PROCESS, QUALITY_TIERS
+
+ANALYSIS_FILE = "tests/analysis/analysis0.json"
+STAGES = ("tokenize", "generate", "decode")
+#fields that identify a grid point, to match it with the same point of a --baseline report
+POINT_FIELDS = ("backend", "language", "quality", "torch_threads", "concurrency", "tokens", "batch_size")
+
+#--- Inputs ---
+#returns the English source texts of the analysis file
+def load_sources():
+    with open(ANALYSIS_FILE) as f:
+        analysis = json.load(f)
+    return list(dict.fromkeys(row["Original Term"] for rows in analysis.values() for row in rows))
+
+#returns batch_size different texts of about tokens estimated tokens each
+#input i starts with source text i and continues with the following ones until it is long enough
+def make_batch(sources: list[str], tokens: int, batch_size: int):
+    batch = []
+    for i in range(batch_size):
+        words = []
+        position = i
+        while estimate_token_length(" ".join(words)) < tokens:
+            words.extend(sources[position % len(sources)].split())
+            position += 1
+        text = ""
+        for word in words:
+            if estimate_token_length(f"{text} {word}") > tokens:
+                break
+            text = f"{text} {word}".strip()
+        batch.append(text or words[0])
+    return batch
+
+#--- Staged Translation ---
+#translates one batch stage by stage, the way the backend's __call__ does
+#settings are the generation settings of a quality tier
+#returns {stage: seconds}, source tokens and generated tokens (padding excluded)
+def run_stages(translator, texts: list[str], settings: dict):
+    tokenizer = translator.tokenizer
+    timings = {}
+    start = time.perf_counter()
+    if isinstance(translator, CTranslate2Translator):
+        source_tokens = [tokenizer.convert_ids_to_tokens(tokenizer.encode(text)) for text in texts]
+        timings['tokenize'] = time.perf_counter() - start
+        start = time.perf_counter()
+        results = translator.translator.translate_batch(source_tokens, max_batch_size=len(texts),
+                                                        **CTranslate2Translator.generation_options(**settings))
+        timings['generate'] = time.perf_counter() - start
+        start = time.perf_counter()
+        [tokenizer.decode(tokenizer.convert_tokens_to_ids(result.hypotheses[0]), skip_special_tokens=True)
+         for result in results]
+        timings['decode'] = time.perf_counter() - start
+        return timings, sum(map(len, source_tokens)), sum(len(result.hypotheses[0]) for result in results)
+
+    #a Hugging Face translation pipeline, with a PyTorch or an ONNX Runtime model
+    inputs = tokenizer(texts, padding=True, truncation=True, return_tensors='pt')
+    timings['tokenize'] = time.perf_counter() - start
+    start = time.perf_counter()
+    with torch.inference_mode():
+        output_ids = translator.model.generate(**inputs, **settings)
+    timings['generate'] = time.perf_counter() - start
+    start = time.perf_counter()
+    tokenizer.batch_decode(output_ids, skip_special_tokens=True)
+    timings['decode'] = time.perf_counter() - start
+    return timings, int(inputs['attention_mask'].sum()), int((output_ids != tokenizer.pad_token_id).sum())
+
+#sets the intra-op threads of the next calls
+#a CTranslate2 model takes its thread count when it is opened, so it is opened again
+def set_threads(translator, threads: int):
+    torch.set_num_threads(threads)
+    if isinstance(translator, CTranslate2Translator):
+        backends.TORCH_THREADS_PER_PROCESS = threads
+        translator._pid = None
+
+#--- Memory ---
+#records the highest resident memory of this process while it is entered, sampled every interval seconds
+#ru_maxrss only ever grows over the whole process, so it cannot tell the grid points apart
+class PeakRss:
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._page_size = os.sysconf('SC_PAGE_SIZE')
+
+    def _sample(self):
+        with open('/proc/self/statm') as statm:
+            self.peak = max(self.peak, int(statm.read().split()[1]) * self._page_size)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self._sample()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+#--- Grid ---
+#runs one grid point and returns its medians
+#every repetition starts concurrency threads that each translate the batch once
+def measure(translator, texts: list[str], settings: dict, concurrency: int, warmup: int, repeat: int):
+    for _ in range(warmup):
+        run_stages(translator, texts, settings)
+
+    repetitions = []
+    with PeakRss() as rss:
+        for _ in range(repeat):
+            calls = [None] * concurrency
+
+            def call(i):
+                calls[i] = run_stages(translator, texts, settings)
+            threads = [threading.Thread(target=call, args=(i,)) for i in range(concurrency)]
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            repetitions.append((time.perf_counter() - start, calls))
+
+    def median_of(value):
+        return median(value(wall, calls) for wall, calls in repetitions)
+    return {
+        "sentences_per_second": round(median_of(lambda wall, calls: len(texts) * len(calls) / wall), 2),
+        "source_tokens_per_second": round(median_of(lambda wall, calls: sum(c[1] for c in calls) / wall), 1),
+        "generated_tokens_per_second": round(median_of(lambda wall, calls: sum(c[2] for c in calls) / wall), 1),
+        "batch_ms": round(median_of(lambda wall, calls: wall) * 1000, 2),
+        "stage_ms": {
+            stage: round(median_of(lambda wall, calls: median(c[0][stage] for c in calls)) * 1000, 2) for stage in STAGES
+        },
+        "peak_rss_mb": round(rss.peak / 2**20, 1),
+    }
+
+#loads the translator of one language, from --model-dir if given, otherwise like the worker does
+def load(lang: str, backend: str, model_dir: str | None):
+    if model_dir:
+        return load_translator(backend, os.path.join(model_dir, f"opus-mt-en-{LANGUAGE_CODES[lang]}"))
+    translator, error = get_translation_pipeline(lang, backend=backend)
+    if not translator:
+        raise RuntimeError(error)
+    return translator
+
+#returns the commit the benchmark runs on, with "-dirty" if the tree has uncommitted changes
+def get_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f"{commit}-dirty" if dirty else commit
+
+#adds each point's sentences/sec change against the same point of a baseline report
+def compare_with(results: list[dict], baseline: dict):
+    previous = {tuple(point[field] for field in POINT_FIELDS): point for point in baseline['results']}
+    for point in results:
+        before = previous.get(tuple(point[field] for field in POINT_FIELDS))
+        if before and before['sentences_per_second']:
+            point['sentences_per_second_change'] = round(point['sentences_per_second'] / before['sentences_per_second'] - 1, 3)
+
+def main(args):
+    languages = [lang.lower() for lang in args.languages]
+    unknown = [lang for lang in languages if lang not in LANGUAGE_CODES]
+    if unknown:
+        sys.exit(f"Unsupported languages: {', '.join(unknown)}. Choose from {', '.join(LANGUAGE_CODES)}.")
+    sources = load_sources()
+
+    results = []
+    for backend in args.backends:
+        for lang in languages:
+            translator = load(lang, backend, args.model_dir)
+            for quality in args.qualities:
+                for threads in args.torch_threads:
+                    set_threads(translator, threads)
+                    for concurrency in args.concurrency:
+                        for tokens in args.tokens:
+                            for batch_size in args.batch_sizes:
+                                point = dict(zip(POINT_FIELDS, (backend, lang, quality, threads, concurrency, tokens, batch_size)))
+                                point.update(measure(translator, make_batch(sources, tokens, batch_size), QUALITY_TIERS[quality],
+                                                     concurrency, args.warmup, args.repeat))
+                                print(json.dumps(point), file=sys.stderr)
+                                results.append(point)
+            del translator
+
+    report = {
+        "commit": get_commit(),
+        "environment": {
+            "python": platform.python_version(), "torch": torch.__version__, "cpus": os.cpu_count(),
+            "machine": platform.machine(),
+        },
+        "settings": {"warmup": args.warmup, "repeat": args.repeat, "model_dir": args.model_dir},
+        "results": results,
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare_with(results, json.load(f))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
+    print(json.dumps(report, indent=4))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Translation throughput across batch size, input length, threads and backend.")
+    parser.add_argument("--backends", nargs="+", default=["transformers"], choices=sorted(backends.BACKENDS))
+    parser.add_argument("--languages", nargs="+", default=["french"])
+    parser.add_argument("--qualities", nargs="+", default=list(QUALITY_TIERS), choices=list(QUALITY_TIERS),
+                        help="quality tiers, each with its own generation settings")
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=sorted({1, BATCH_SIZE, 32}))
+    parser.add_argument("--tokens", nargs="+", type=int, default=[16, 64, 192], help="estimated tokens per input")
+    parser.add_argument("--torch-threads", nargs="+", type=int, default=sorted({1, TORCH_THREADS_PER_PROCESS, os.cpu_count() or 1}))
+    parser.add_argument("--concurrency", nargs="+", type=int, default=sorted({1, NUM_WORKER_THREADS}),
+                        help="threads translating with the shared model at once")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed calls per grid point")
+    parser.add_argument("--repeat", type=int, default=3, help="timed repetitions per grid point")
+    parser.add_argument("--model-dir", help="directory of opus-mt-en-{code} model folders, instead of the Hugging Face cache")
+    parser.add_argument("--output", help="file to save the JSON report to")
+    parser.add_argument("--baseline", help="saved report to compare sentences/sec with")
+    main(parser.parse_args())
@@ -0,0 +1,233 @@
+"""
+scores translation quality offline against stored reference translations, with no network calls
+
+the reference file is in the format tests/test_translation.py writes (tests/analysis/analysis0.json
+by default): {language: [{"Original Term", "Service Translation", "OpenAI Translation",
+"Similarity Score"}, ...]}. Its "OpenAI Translation" of every term is the reference. The candidates
+are, with
+    (default)            the file's own "Service Translation", to re-score stored runs
+    --candidates FILE    the "Service Translation" of another file in the same format, matched by
+                         language and term, e.g. a new tests/analysis/analysis1.json
+    --translate          the translations of the models this tree loads, made here sentence by
+                         sentence as the worker makes them, with no API or Redis
+the score of a pair is the cosine similarity of the candidate's and the reference's embeddings,
+from the same sentence-transformers model tests/test_translation.py uses. Every text of every
+language is encoded in one batched call, the pairs are scored in one row-wise product of the
+normalized embedding matrices, and embeddings are cached on disk by a hash of model name and text,
+so a run whose texts were all seen before loads no model and takes a fraction of a second.
+
+the report gives per language the mean, median and lowest score, the share of pairs below
+--threshold, the change against the file's stored scores, and the worst pairs. The run exits
+non-zero if a language's mean fell by more than --max-drop below its stored mean, or is below
+--min-similarity.
+
+usage (the embedding model must be in the Hugging Face cache, or --embedding-model a local path):
+    python benchmarks/bench_quality.py
+    python benchmarks/bench_quality.py --translate --languages french spanish --max-drop 0.02
+    python benchmarks/bench_quality.py --candidates tests/analysis/analysis1.json
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+from statistics import mean, median
+
+sys.path.append('.')
+os.environ.setdefault('SERVICE_TOKEN_SECRET', 'benchmark-secret')
+os.environ.setdefault('HF_HUB_OFFLINE', '1')
+
+import numpy as np
+
+from app.core.config import LANGUAGE_CODES
+
+ANALYSIS_FILE = "tests/analysis/analysis0.json"
+#the model and pass mark of tests/test_translation.py
+EMBEDDING_MODEL = 'paraphrase-multilingual-MiniLM-L12-v2'
+SIMILARITY_THRESHOLD = 0.85
+EMBEDDING_CACHE = os.path.join(os.path.expanduser('~'), '.cache', 'translation-quality', 'embeddings.npz')
+
+#--- Embedding Cache ---
+#unit-length embeddings of texts, keyed by the sha256 of the model name and the text
+#kept in one .npz file of hex keys and a float32 matrix, rewritten in one rename when new texts were encoded
+class EmbeddingCache:
+    def __init__(self, path: str, model_name: str):
+        self.path = path
+        self.model_name = model_name
+        self.vectors = {}
+        self.encoded = 0
+        self.reused = 0
+        if os.path.exists(path):
+            with np.load(path) as cached:
+                self.vectors = dict(zip(cached['keys'].tolist(), cached['vectors']))
+
+    def key(self, text: str):
+        return hashlib.sha256(f"{self.model_name}\x1f{text}".encode('utf-8')).hexdigest()
+
+    #returns a matrix with the embedding of every text, in order
+    #the texts missing from the cache are encoded in one batched call, loading the model only then
+    def encode(self, texts: list[str], batch_size: int = 64):
+        keys = [self.key(text) for text in texts]
+        missing = {key: text for key, text in zip(keys, texts) if key not in self.vectors}
+        self.reused += len(set(keys)) - len(missing)
+        if missing:
+            vectors = load_encoder(self.model_name).encode(
+                list(missing.values()), batch_size=batch_size, convert_to_numpy=True, normalize_embeddings=True
+            )
+            self.vectors.update(zip(missing, vectors.astype(np.float32)))
+            self.encoded += len(missing)
+        return np.stack([self.vectors[key] for key in keys])
+
+    def save(self):
+        if not self.encoded:
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        #np.savez adds .npz to a name without it
+        temporary = f"{self.path}.tmp.npz"
+        np.savez(temporary, keys=np.array(list(self.vectors)), vectors=np.stack(list(self.vectors.values())))
+        os.replace(temporary, self.path)
+
+#loads the sentence-transformers model, imported here so a fully cached run never imports it
+def load_encoder(model_name: str):
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name)
+
+#--- Candidates ---
+#translates texts with this tree's model for a language, segment by segment as the worker does
+def translate_offline(lang: str, texts: list[str]):
+    from app.services.translation_engine import get_translation_pipeline, run_bucketed
+    from app.services.segmentation import split_into_segments, join_segments
+
+    translator, error = get_translation_pipeline(lang)
+    if not translator:
+        raise RuntimeError(error)
+    split_texts = [split_into_segments(text) for text in texts]
+    unique_segments = list(dict.fromkeys(segment for segments, _ in split_texts for segment in segments))
+    translations = dict(zip(unique_segments, run_bucketed(translator, unique_segments, lang=lang)))
+    return [join_segments([translations[segment] for segment in segments], separators, lang) for segments, separators in split_texts]
+
+#returns {language: {term: service translation}} of a file in the analysis format
+def read_candidates(path: str):
+    with open(path, encoding='utf-8') as f:
+        analysis = json.load(f)
+    return {lang: {row["Original Term"]: row.get("Service Translation") for row in rows} for lang, rows in analysis.items()}
+
+#returns (language, term, candidate, reference, stored score or None) for every scorable row
+#rows without a reference or a candidate are counted in skipped
+def collect_pairs(analysis: dict, args, skipped: dict):
+    candidates = read_candidates(args.candidates) if args.candidates else None
+    pairs = []
+    for lang, rows in analysis.items():
+        if args.languages and lang.lower() not in args.languages:
+            continue
+        rows = [row for row in rows if row.get("OpenAI Translation") not in (None, "", "N/A")]
+        skipped[lang] = len(analysis[lang]) - len(rows)
+        terms = [row["Original Term"] for row in rows]
+        if args.translate:
+            translated = translate_offline(lang.lower(), terms)
+        elif candidates is not None:
+            translated = [candidates.get(lang, {}).get(term) for term in terms]
+        else:
+            translated = [row.get("Service Translation") for row in rows]
+        for row, candidate in zip(rows, translated):
+            if not candidate or candidate == "SERVICE FAILED":
+                skipped[lang] += 1
+                continue
+            stored = row.get("Similarity Score")
+            pairs.append((lang, row["Original Term"], candidate, row["OpenAI Translation"],
+                          float(stored) if stored not in (None, "N/A") else None))
+    return pairs
+
+#--- Report ---
+def summarize(scores: list[float], stored: list[float], worst: list[tuple], args):
+    summary = {
+        "pairs": len(scores),
+        "mean_similarity": round(mean(scores), 4),
+        "median_similarity": round(median(scores), 4),
+        "min_similarity": round(min(scores), 4),
+        "below_threshold": round(sum(score < args.threshold for score in scores) / len(scores), 3),
+    }
+    if stored:
+        summary["stored_mean_similarity"] = round(mean(stored), 4)
+        summary["change"] = round(mean(scores) - mean(stored), 4)
+    summary["worst"] = [
+        {"similarity": round(score, 4), "term": term, "candidate": candidate, "reference": reference}
+        for score, term, candidate, reference in sorted(worst)[:args.worst]
+    ]
+    return summary
+
+def main(args):
+    args.languages = [lang.lower() for lang in args.languages] if args.languages else None
+    if args.languages:
+        unknown = [lang for lang in args.languages if lang not in LANGUAGE_CODES]
+        if unknown:
+            sys.exit(f"Unsupported languages: {', '.join(unknown)}. Choose from {', '.join(LANGUAGE_CODES)}.")
+    with open(args.references, encoding='utf-8') as f:
+        analysis = json.load(f)
+
+    start = time.perf_counter()
+    skipped = {}
+    pairs = collect_pairs(analysis, args, skipped)
+    if not pairs:
+        sys.exit("No pairs to score.")
+    translate_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cache = EmbeddingCache(args.embedding_cache, args.embedding_model)
+    #candidates and references in one call, so each distinct text is encoded once
+    embeddings = cache.encode([pair[2] for pair in pairs] + [pair[3] for pair in pairs], args.batch_size)
+    candidate_embeddings, reference_embeddings = embeddings[:len(pairs)], embeddings[len(pairs):]
+    #the embeddings have unit length, so the row-wise dot product is the cosine similarity of every pair
+    scores = np.einsum('ij,ij->i', candidate_embeddings, reference_embeddings).tolist()
+    cache.save()
+    score_seconds = time.perf_counter() - start
+
+    by_language = {}
+    for (lang, term, candidate, reference, stored), score in zip(pairs, scores):
+        entry = by_language.setdefault(lang, {"scores": [], "stored": [], "worst": []})
+        entry["scores"].append(score)
+        if stored is not None:
+            entry["stored"].append(stored)
+        entry["worst"].append((score, term, candidate, reference))
+
+    report = {
+        "references": args.references,
+        "candidates": "translate" if args.translate else (args.candidates or "stored"),
+        "embedding_model": args.embedding_model,
+        "mean_similarity": round(mean(scores), 4),
+        "embeddings": {"encoded": cache.encoded, "cached": cache.reused},
+        "seconds": {"translate": round(translate_seconds, 3), "score": round(score_seconds, 3)},
+        "languages": {
+            lang: dict(summarize(entry["scores"], entry["stored"], entry["worst"], args), skipped=skipped[lang])
+            for lang, entry in by_language.items()
+        },
+    }
+    print(json.dumps(report, indent=4, ensure_ascii=False))
+
+    #a non-zero exit lets CI gate a model, backend or segmentation change on quality
+    failures = []
+    for lang, summary in report["languages"].items():
+        if summary.get("change", 0) < -args.max_drop:
+            failures.append(f"{lang}: mean similarity fell from {summary['stored_mean_similarity']} to {summary['mean_similarity']}")
+        if args.min_similarity is not None and summary["mean_similarity"] < args.min_similarity:
+            failures.append(f"{lang}: mean similarity {summary['mean_similarity']} is below {args.min_similarity}")
+    if failures:
+        sys.exit("\n".join(failures))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score translations against stored references with cached embeddings.")
+    parser.add_argument("--references", default=ANALYSIS_FILE, help="analysis file holding the reference translations")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--candidates", help="analysis file whose service translations are scored")
+    source.add_argument("--translate", action="store_true", help="score translations made now with the local models")
+    parser.add_argument("--languages", nargs="+", help="languages of the file to score (default: all)")
+    parser.add_argument("--embedding-model", default=EMBEDDING_MODEL, help="sentence-transformers model name or path")
+    parser.add_argument("--embedding-cache", default=EMBEDDING_CACHE, help=".npz file of cached embeddings")
+    parser.add_argument("--batch-size", type=int, default=64, help="texts per encode batch")
+    parser.add_argument("--threshold", type=float, default=SIMILARITY_THRESHOLD, help="similarity counted as a pass")
+    parser.add_argument("--max-drop", type=float, default=0.02, help="fail if a language's mean falls this far below the stored one")
+    parser.add_argument("--min-similarity", type=float, help="fail if a language's mean is below this")
+    parser.add_argument("--worst", type=int, default=3, help="lowest scoring pairs to show per language")
+    main(parser.parse_args())
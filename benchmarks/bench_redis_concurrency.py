@@ -0,0 +1,166 @@
+"""
+compares how many concurrent requests a single API worker can serve when Redis is slow,
+using the old blocking client versus the pooled asyncio client
+
+both variants talk to Redis through a small TCP proxy that adds a fixed delay to every
+reply, so the only difference between the two runs is whether the endpoint blocks the
+event loop while it waits
+
+the in-process L1 cache is disabled for the asyncio run so both variants hit Redis on every request
+
+usage (needs a reachable Redis, e.g. `docker compose up redis`):
+    REDIS_HOST=localhost python benchmarks/bench_redis_concurrency.py --latency-ms 5
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import threading
+
+sys.path.append('.')
+os.environ.setdefault('SERVICE_TOKEN_SECRET', 'benchmark-secret')
+
+import httpx
+import redis
+from fastapi import FastAPI, Response
+
+from app.main import app as async_app
+from app.db.redis_client import create_async_redis_client
+from app.api.l1_cache import translation_l1_cache
+from app.services.coalescing import SUBMIT_SCRIPT
+from app.services.keys import get_translation_cache_key
+from app.core import config
+
+CACHED_TEXT = "recommended_treatment: Observation"
+CACHED_LANGUAGE = "french"
+
+#--- Latency Proxy ---
+#forwards every byte between the client and Redis, delaying each reply chunk by `latency` seconds
+#runs on its own event loop in a background thread so a blocked API loop cannot slow it down
+class LatencyProxy:
+    def __init__(self, upstream_host, upstream_port, latency):
+        self.upstream_host = upstream_host
+        self.upstream_port = upstream_port
+        self.latency = latency
+        self.port = None
+        self._ready = threading.Event()
+        self._loop = asyncio.new_event_loop()
+
+    async def _pipe(self, reader, writer, delay):
+        try:
+            while data := await reader.read(65536):
+                if delay:
+                    await asyncio.sleep(delay)
+                writer.write(data)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _handle(self, client_reader, client_writer):
+        upstream_reader, upstream_writer = await asyncio.open_connection(self.upstream_host, self.upstream_port)
+        await asyncio.gather(
+            self._pipe(client_reader, upstream_writer, 0),
+            self._pipe(upstream_reader, client_writer, self.latency)
+        )
+
+    async def _serve(self):
+        server = await asyncio.start_server(self._handle, '127.0.0.1', 0)
+        self.port = server.sockets[0].getsockname()[1]
+        self._ready.set()
+        async with server:
+            await server.serve_forever()
+
+    def start(self):
+        thread = threading.Thread(target=self._loop.run_until_complete, args=(self._serve(),), daemon=True)
+        thread.start()
+        self._ready.wait()
+        return self
+
+#--- Blocking Baseline ---
+#the request path as it was before the asyncio client: an async endpoint calling the synchronous client
+def build_blocking_app(sync_client):
+    app = FastAPI()
+
+    @app.post('/api/translate')
+    async def submit_translation(body: dict, response: Response):
+        cached_result = sync_client.get(get_translation_cache_key(body['text'], body['target_language']))
+        response.status_code = 200
+        return {"status": "completed", "result": cached_result, "from_cache": True}
+
+    return app
+
+#--- Load Generator ---
+#sends `total` cache-hit requests with `concurrency` in flight and reports throughput
+#`avg_in_flight` is the total request time divided by wall time, i.e. how many requests overlapped
+async def drive(app, total, concurrency):
+    transport = httpx.ASGITransport(app=app)
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+    payload = {"text": CACHED_TEXT, "target_language": CACHED_LANGUAGE}
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one_request():
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post("/api/translate", json=payload)
+                latencies.append(time.perf_counter() - start)
+                assert response.status_code == 200, response.text
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one_request() for _ in range(total)))
+        wall = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "wall_seconds": round(wall, 3),
+        "requests_per_second": round(total / wall, 1),
+        "avg_in_flight": round(sum(latencies) / wall, 2),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2),
+    }
+
+async def run(args):
+    #per-request log lines would dominate the timings
+    logging.disable(logging.INFO)
+    proxy = LatencyProxy(config.REDIS_HOST, config.REDIS_PORT, args.latency_ms / 1000).start()
+    #seed the cache entry every request will hit
+    redis.Redis(host=config.REDIS_HOST, port=config.REDIS_PORT, decode_responses=True).set(
+        get_translation_cache_key(CACHED_TEXT, CACHED_LANGUAGE), "recommended_treatment: Observation", ex=3600
+    )
+
+    #point both clients at the proxy
+    sync_client = redis.Redis(host='127.0.0.1', port=proxy.port, decode_responses=True)
+    before = await drive(build_blocking_app(sync_client), args.requests, args.concurrency)
+
+    #the transport does not run the lifespan hook, so set up what it would
+    async_app.state.redis = create_async_redis_client(host='127.0.0.1', port=proxy.port)
+    async_app.state.submit_script = async_app.state.redis.register_script(SUBMIT_SCRIPT)
+    #disable the in-process cache, so every request makes the same Redis round-trip as the baseline
+    translation_l1_cache.max_entries = 0
+    translation_l1_cache.clear()
+    after = await drive(async_app, args.requests, args.concurrency)
+    await async_app.state.redis.aclose(close_connection_pool=True)
+
+    report = {
+        "redis_latency_ms": args.latency_ms,
+        "redis_pool_size": config.REDIS_POOL_SIZE,
+        "blocking_client": before,
+        "asyncio_client": after,
+        "speedup": round(after["requests_per_second"] / before["requests_per_second"], 2),
+    }
+    print(json.dumps(report, indent=4))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent requests per API worker, blocking vs asyncio Redis client.")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="delay added to every Redis reply")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    asyncio.run(run(parser.parse_args()))
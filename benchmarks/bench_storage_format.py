@@ -0,0 +1,136 @@
+"""
+measures what the compact storage format (COMPACT_STORAGE=true) saves and what it costs
+
+memory: the sample translations from tests/analysis are cached as --keys unique keys, once as
+plain text and once compact (zlib above CACHE_COMPRESS_MIN_BYTES), and the same number of
+queued jobs as JSON and as msgpack. Job results are stored both as the JSON string the service
+uses and as a two-field hash. With --redis, every variant is written to a scratch database and
+its memory is read from INFO (used_memory delta, key overhead included). Without it, only the
+encoded value bytes are reported.
+cpu: the per-call time of encoding and decoding jobs and translations, the work added to the
+API's submit and cache-hit paths and to the worker's pop and save paths.
+
+usage:
+    python benchmarks/bench_storage_format.py
+    REDIS_HOST=localhost python benchmarks/bench_storage_format.py --redis --db 15 --keys 100000
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.append('.')
+os.environ.setdefault('SERVICE_TOKEN_SECRET', 'benchmark-secret')
+
+from app.services.codec import encode_job, decode_job, encode_translation, decode_translation
+from app.core import config
+
+ANALYSIS_FILE = "tests/analysis/analysis0.json"
+
+#returns the translated texts and the English source texts of the analysis file
+#both hold sentence-sized labels and full notes alike
+def load_samples():
+    with open(ANALYSIS_FILE) as f:
+        analysis = json.load(f)
+    rows = [row for rows in analysis.values() for row in rows]
+    translations = [row[column] for row in rows for column in ("Service Translation", "OpenAI Translation") if row.get(column)]
+    sources = list(dict.fromkeys(row["Original Term"] for row in rows))
+    return translations, sources
+
+#returns n unique (key, text) pairs cycling through the samples
+def make_translations(samples, n):
+    return [(f"{config.TRANSLATION_CACHE_PREFIX}bench:{i}", f"{samples[i % len(samples)]} ({i})") for i in range(n)]
+
+def make_job(i, text):
+    return {'id': f"00000000-0000-4000-8000-{i:012d}", 'text': text, 'lang': "spanish",
+            'queued_at': 1700000000.0 + i, 'priority': "interactive"}
+
+#returns the mean microseconds of one call of fn over values
+def time_per_call(fn, values, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for value in values:
+            fn(value)
+        best = min(best, time.perf_counter() - start)
+    return round(best / len(values) * 1e6, 2)
+
+#writes every (key, value) with fn(pipe, key, value) and returns the growth of used_memory
+def measure_redis(redis_client, items, write):
+    redis_client.flushdb()
+    before = redis_client.info('memory')['used_memory']
+    for start in range(0, len(items), 1000):
+        with redis_client.pipeline(transaction=False) as pipe:
+            for key, value in items[start:start + 1000]:
+                write(pipe, key, value)
+            pipe.execute()
+    used = redis_client.info('memory')['used_memory'] - before
+    redis_client.flushdb()
+    return used
+
+def main(args):
+    samples, sources = load_samples()
+    translations = make_translations(samples, args.keys)
+    texts = [text for _, text in translations]
+    plain = [encode_translation(text, compact=False) for text in texts]
+    compact = [encode_translation(text, compact=True) for text in texts]
+    #jobs carry the English source text
+    jobs = [make_job(i, f"{sources[i % len(sources)]} ({i})") for i in range(args.keys)]
+    json_jobs = [encode_job(job, compact=False) for job in jobs]
+    msgpack_jobs = [encode_job(job, compact=True) for job in jobs]
+
+    size = lambda values: sum(len(value.encode('utf-8') if isinstance(value, str) else value) for value in values)
+    per_100k = lambda total: round(total * 100_000 / args.keys / 2**20, 2)
+    report = {
+        "keys": args.keys,
+        "sample_texts": len(samples),
+        "compress_min_bytes": config.CACHE_COMPRESS_MIN_BYTES,
+        "compressed_share": round(sum(isinstance(value, bytes) for value in compact) / args.keys, 3),
+        "value_mb_per_100k": {
+            "translation_plain": per_100k(size(plain)),
+            "translation_compact": per_100k(size(compact)),
+            "job_json": per_100k(size(json_jobs)),
+            "job_msgpack": per_100k(size(msgpack_jobs)),
+        },
+        #sampled over at most 10k values, the cost of one call in each hot path
+        "microseconds_per_call": {
+            "encode_job_json": time_per_call(lambda job: encode_job(job, compact=False), jobs[:10000]),
+            "encode_job_msgpack": time_per_call(lambda job: encode_job(job, compact=True), jobs[:10000]),
+            "decode_job_json": time_per_call(decode_job, json_jobs[:10000]),
+            "decode_job_msgpack": time_per_call(decode_job, msgpack_jobs[:10000]),
+            "encode_translation_compact": time_per_call(lambda text: encode_translation(text, compact=True), texts[:10000]),
+            "decode_translation_plain": time_per_call(decode_translation, plain[:10000]),
+            "decode_translation_compact": time_per_call(decode_translation, compact[:10000]),
+        },
+    }
+
+    if args.redis:
+        import redis
+        redis_client = redis.Redis(host=config.REDIS_HOST, port=config.REDIS_PORT, db=args.db)
+        if redis_client.dbsize() and not args.force:
+            sys.exit(f"Database {args.db} is not empty, pick an empty one or pass --force to flush it.")
+        result_json = lambda text: json.dumps({'status': 'completed', 'result': text})
+        variants = {
+            "translation_plain": (list(zip([key for key, _ in translations], plain)), lambda p, k, v: p.set(k, v)),
+            "translation_compact": (list(zip([key for key, _ in translations], compact)), lambda p, k, v: p.set(k, v)),
+            "job_json": ([("queue", value) for value in json_jobs], lambda p, k, v: p.rpush(k, v)),
+            "job_msgpack": ([("queue", value) for value in msgpack_jobs], lambda p, k, v: p.rpush(k, v)),
+            "result_json_string": ([(f"r:{i}", result_json(text)) for i, text in enumerate(texts)], lambda p, k, v: p.set(k, v)),
+            "result_hash": ([(f"r:{i}", text) for i, text in enumerate(texts)],
+                            lambda p, k, v: p.hset(k, mapping={'status': 'completed', 'result': v})),
+        }
+        report["redis_mb_per_100k"] = {
+            name: per_100k(measure_redis(redis_client, items, write)) for name, (items, write) in variants.items()
+        }
+
+    print(json.dumps(report, indent=4))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Redis memory and CPU cost of the compact storage format.")
+    parser.add_argument("--keys", type=int, default=100_000, help="cached translations and jobs per variant")
+    parser.add_argument("--redis", action="store_true", help="also measure used_memory on a real Redis")
+    parser.add_argument("--db", type=int, default=15, help="scratch database, flushed between variants")
+    parser.add_argument("--force", action="store_true", help="flush the scratch database even if it holds keys")
+    main(parser.parse_args())
@@ -0,0 +1,105 @@
+"""
+compares the throughput of the worker in thread mode and in process mode
+
+for each mode the worker is started as a subprocess, warmed up with one job per language
+(so model loading is not timed), then sent a burst of unique jobs through the per-language
+queues. The time until every result is completed gives the jobs per second for that mode.
+Every run uses fresh texts, so no job is answered from the translation cache.
+
+usage (needs a reachable Redis and the models, e.g. `docker compose up redis`):
+    REDIS_HOST=localhost python benchmarks/bench_worker_modes.py --jobs 400 --processes 8 --torch-threads 4
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+import subprocess
+
+sys.path.append('.')
+os.environ.setdefault('SERVICE_TOKEN_SECRET', 'benchmark-secret')
+
+import redis
+
+from app.services.keys import get_request_queue_key
+from app.core import config
+
+SENTENCES = [
+    "Take {n} tablets by mouth twice daily with food.",
+    "recommended_treatment: Observation {n}",
+    "Your report shows a low-grade tumor confined to the uterine lining, and no further treatment "
+    "is typically necessary beyond close monitoring and follow-up visit number {n}.",
+    "Please call the clinic if your fever is above {n} degrees.",
+]
+
+#pushes one job per text onto its language queue, the same way the API does
+def enqueue(redis_client, jobs):
+    with redis_client.pipeline(transaction=False) as pipe:
+        for job_id, text, lang in jobs:
+            task = {'id': job_id, 'text': text, 'lang': lang, 'queued_at': time.time()}
+            pipe.rpush(get_request_queue_key(lang), json.dumps(task))
+        pipe.execute()
+
+#polls the result keys until every job has finished, or the timeout passes
+def wait_for(redis_client, job_ids, timeout):
+    result_keys = [f"{config.RESULTS_CACHE_PREFIX}{job_id}" for job_id in job_ids]
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        results = redis_client.mget(result_keys)
+        if all(result and json.loads(result)['status'] in ('completed', 'failed') for result in results):
+            return
+        time.sleep(0.05)
+    raise TimeoutError(f"{len(job_ids)} jobs did not finish within {timeout}s")
+
+#builds unique jobs spread evenly over the languages
+def make_jobs(count, languages):
+    run_id = uuid.uuid4().hex[:8]
+    return [
+        (str(uuid.uuid4()), f"{SENTENCES[i % len(SENTENCES)].format(n=i)} ({run_id})", languages[i % len(languages)])
+        for i in range(count)
+    ]
+
+def run_mode(redis_client, mode, args):
+    env = dict(os.environ, WORKER_MODE=mode, NUM_WORKER_THREADS=str(args.threads),
+               NUM_WORKER_PROCESSES=str(args.processes), TORCH_THREADS_PER_PROCESS=str(args.torch_threads))
+    worker = subprocess.Popen([sys.executable, "app/worker/worker.py"], env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        #the first job of every language waits for the models to load
+        warmup = make_jobs(len(args.languages), args.languages)
+        enqueue(redis_client, warmup)
+        wait_for(redis_client, [job_id for job_id, _, _ in warmup], args.timeout)
+
+        jobs = make_jobs(args.jobs, args.languages)
+        start = time.perf_counter()
+        enqueue(redis_client, jobs)
+        wait_for(redis_client, [job_id for job_id, _, _ in jobs], args.timeout)
+        wall = time.perf_counter() - start
+    finally:
+        worker.terminate()
+        worker.wait()
+
+    return {"jobs": args.jobs, "wall_seconds": round(wall, 2), "jobs_per_second": round(args.jobs / wall, 2)}
+
+def main(args):
+    redis_client = redis.Redis(host=config.REDIS_HOST, port=config.REDIS_PORT, decode_responses=True)
+    report = {
+        "cpu_count": os.cpu_count(),
+        "thread_mode": {"threads": args.threads, **run_mode(redis_client, 'thread', args)},
+        "process_mode": {"processes": args.processes, "torch_threads_per_process": args.torch_threads,
+                         **run_mode(redis_client, 'process', args)},
+    }
+    report["speedup"] = round(report["process_mode"]["jobs_per_second"] / report["thread_mode"]["jobs_per_second"], 2)
+    print(json.dumps(report, indent=4))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Worker throughput, thread mode vs process mode.")
+    parser.add_argument("--jobs", type=int, default=200)
+    parser.add_argument("--languages", nargs="+", default=list(config.LANGUAGE_CODES))
+    parser.add_argument("--threads", type=int, default=config.NUM_WORKER_THREADS, help="worker threads in thread mode")
+    parser.add_argument("--processes", type=int, default=config.NUM_WORKER_PROCESSES, help="worker processes in process mode")
+    parser.add_argument("--torch-threads", type=int, default=config.TORCH_THREADS_PER_PROCESS, help="intra-op threads per process")
+    parser.add_argument("--timeout", type=float, default=600, help="seconds to wait for a mode to finish")
+    main(parser.parse_args())
@@ -0,0 +1,350 @@
+"""
+load-tests the whole service offline: the API of app.main and translation_worker threads against a
+Redis stand-in, with a stub translator in place of the models
+
+everything runs in this process. Redis is a fakeredis TCP server, so the API's pooled asyncio client
+and the workers' blocking clients connect to it as they would to Redis. The API runs with its
+lifespan (completion listener, admission control) behind an in-process ASGI transport, and
+--workers translation_worker threads take the jobs from the queues. The stub translator returns
+"[code] text" for every input and sleeps --per-call-ms plus --per-token-ms for every padded token
+of the generate call (the longest input's estimated tokens x inputs), so batching, segment caching
+and length bucketing change its cost as they change the model's. A call with num_beams costs that
+many beams over the model's default of STUB_DEFAULT_BEAMS, as beam search does.
+
+traffic is open-loop: requests arrive as a Poisson process at --rate per second for --duration
+seconds, whether or not the earlier ones were answered, so a service that falls behind builds a
+queue instead of slowing the client down. Each request is a POST /api/translate; a 202 is followed
+by long-polling GET /api/result/{id}?wait=... until the job finishes. The latency of a request is
+measured from its scheduled arrival to its result, so the time a late client spends catching up
+counts too (client_lag_ms reports how late requests were sent; if its p99 grows, the client is
+saturated and the run should be shorter or slower). A --repeat-ratio share of the requests asks for
+one of the source texts of tests/analysis, the rest for texts never requested before. Every request
+asks for one of the --qualities tiers, picked at random (the default tier only, by default).
+
+the report is JSON: request outcomes, throughput, latency quantiles overall and per outcome, the
+queue wait quantiles from the worker's translation_queue_wait_seconds histogram, and the cache
+lookups per layer, and the latency quantiles of every quality tier when more than one was asked for. --output saves it, and --baseline compares the run with a saved report and exits
+non-zero if a latency quantile rose or the throughput fell by more than --max-regression.
+the absolute numbers are those of this machine and stub, compare runs of the same settings.
+
+usage:
+    python benchmarks/load_test.py --rate 50 --duration 30
+    python benchmarks/load_test.py --rate 200 --per-token-ms 0.2 --workers 4 --output load.json
+    python benchmarks/load_test.py --rate 200 --per-token-ms 0.2 --workers 4 --baseline load.json
+    python benchmarks/load_test.py --rate 50 --qualities fast balanced best
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import threading
+from functools import partial
+from unittest.mock import patch
+
+sys.path.append('.')
+os.environ.setdefault('SERVICE_TOKEN_SECRET', 'benchmark-secret')
+
+import httpx
+import fakeredis
+from prometheus_client import REGISTRY
+
+from app import main as api_main
+from app.services import translation_engine
+from app.services.translation_engine import translation_worker
+from app.services.bucketing import estimate_token_length
+from app.services.coalescing import SUBMIT_SCRIPT, FINISH_SCRIPT
+from app.db.redis_client import create_redis_client, create_async_redis_client
+from app.core.config import LANGUAGE_CODES, RESULT_WAIT_MAX, QUALITY_TIERS, DEFAULT_QUALITY
+
+ANALYSIS_FILE = "tests/analysis/analysis0.json"
+QUANTILES = {"p50": 0.5, "p95": 0.95, "p99": 0.99}
+#the beams of the opus-mt models' generation config, which the default tier keeps
+STUB_DEFAULT_BEAMS = 4
+#report fields compared with --baseline, and whether a higher value is worse
+REGRESSION_CHECKS = {
+    ("latency_ms", "all", "p50"): True,
+    ("latency_ms", "all", "p95"): True,
+    ("latency_ms", "all", "p99"): True,
+    ("throughput", "completed_per_second"): False,
+}
+
+#--- Stub Translator ---
+#stands in for a model pipeline: deterministic output, and a cost that grows with the padded tokens of the call
+class StubTranslator:
+    tokenizer = None
+
+    def __init__(self, lang_code: str, per_token_ms: float, per_call_ms: float):
+        self.lang_code = lang_code
+        self.per_token = per_token_ms / 1000
+        self.per_call = per_call_ms / 1000
+
+    def __call__(self, texts, batch_size, **generate_kwargs):
+        padded_tokens = len(texts) * max(estimate_token_length(text) for text in texts)
+        beams = generate_kwargs.get('num_beams', STUB_DEFAULT_BEAMS) / STUB_DEFAULT_BEAMS
+        time.sleep(self.per_call + self.per_token * padded_tokens * beams)
+        return [{'translation_text': f"[{self.lang_code}] {text}"} for text in texts]
+
+#returns a get_translation_pipeline that hands out one stub per language
+def stub_pipelines(per_token_ms: float, per_call_ms: float):
+    translators = {lang: StubTranslator(code, per_token_ms, per_call_ms) for lang, code in LANGUAGE_CODES.items()}
+
+    def get_translation_pipeline(target_language: str, backend: str | None = None):
+        translator = translators.get(target_language.lower())
+        return (translator, None) if translator else (None, f"Language '{target_language}' not supported.")
+    return get_translation_pipeline
+
+#--- Redis Stand-In ---
+#serves an in-memory Redis on a free local port until the process exits
+#the stand-in closes a connection after any error reply, so the service's scripts are loaded up
+#front: the first EVALSHA of a script would otherwise fail with NOSCRIPT and lose its connection
+def start_redis():
+    server = fakeredis.TcpFakeServer(("127.0.0.1", 0), server_type="redis")
+    #connection threads must not keep the process alive at exit
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    redis_client = create_redis_client(host=host, port=port)
+    for script in (SUBMIT_SCRIPT, FINISH_SCRIPT):
+        redis_client.script_load(script)
+    redis_client.close()
+    return host, port
+
+#--- Metrics ---
+#returns {(sample name, labels as a sorted tuple): value} for every sample of the in-process registry
+def snapshot_metrics():
+    return {
+        (sample.name, tuple(sorted(sample.labels.items()))): sample.value
+        for metric in REGISTRY.collect() for sample in metric.samples
+    }
+
+#returns the increase of every sample since an earlier snapshot
+def metrics_delta(before: dict, after: dict):
+    return {key: value - before.get(key, 0) for key, value in after.items()}
+
+#interpolates quantiles in ms from the delta of a histogram's cumulative buckets, summed over its labels
+def histogram_quantiles(delta: dict, name: str):
+    buckets = {}
+    for (sample_name, labels), value in delta.items():
+        if sample_name == f"{name}_bucket":
+            bound = float(dict(labels)['le'])
+            buckets[bound] = buckets.get(bound, 0) + value
+    bounds = sorted(buckets)
+    count = buckets.get(float('inf'), 0)
+    report = {"count": int(count)}
+    for label, q in QUANTILES.items():
+        if not count:
+            report[label] = None
+            continue
+        rank = q * count
+        lower, below = 0.0, 0
+        for bound in bounds:
+            if buckets[bound] >= rank:
+                #the overflow bucket has no upper bound, report its lower one
+                upper = bound if bound != float('inf') else lower
+                share = (rank - below) / max(buckets[bound] - below, 1e-9)
+                report[label] = round((lower + (upper - lower) * share) * 1000, 2)
+                break
+            lower, below = bound, buckets[bound]
+    return report
+
+#returns hits, misses and hit ratio of every cache layer from the delta of translation_cache_lookups_total
+def cache_lookups(delta: dict):
+    layers = {}
+    for (sample_name, labels), value in delta.items():
+        if sample_name == "translation_cache_lookups_total":
+            labels = dict(labels)
+            layer = layers.setdefault(labels['layer'], {"hits": 0, "misses": 0})
+            layer["hits" if labels['result'] == 'hit' else "misses"] += int(value)
+    for layer in layers.values():
+        lookups = layer["hits"] + layer["misses"]
+        layer["hit_ratio"] = round(layer["hits"] / lookups, 3) if lookups else None
+    return layers
+
+#returns p50/p95/p99/max and mean of a list of seconds, in ms
+def latency_summary(samples: list[float]):
+    if not samples:
+        return {"count": 0}
+    samples = sorted(samples)
+    report = {"count": len(samples)}
+    for label, q in QUANTILES.items():
+        report[label] = round(samples[min(int(q * len(samples)), len(samples) - 1)] * 1000, 2)
+    report["max"] = round(samples[-1] * 1000, 2)
+    report["mean"] = round(sum(samples) / len(samples) * 1000, 2)
+    return report
+
+#--- Load Generator ---
+#yields (scheduled send time in seconds from the start, text, language, quality) of an open-loop Poisson arrival process
+def arrivals(rate: float, duration: float, sources: list[str], languages: list[str], repeat_ratio: float, seed: int,
+             qualities: list[str] = (DEFAULT_QUALITY,)):
+    rng = random.Random(seed)
+    scheduled = rng.expovariate(rate)
+    unique = 0
+    while scheduled < duration:
+        if rng.random() < repeat_ratio:
+            text = rng.choice(sources)
+        else:
+            #a sentence of its own, so its segments are not cached either
+            unique += 1
+            text = f"{rng.choice(sources)} Follow-up note {seed}-{unique}."
+        #a single tier draws nothing, so runs of the default tier keep the arrivals of earlier reports
+        quality = rng.choice(qualities) if len(qualities) > 1 else qualities[0]
+        yield scheduled, text, rng.choice(languages), quality
+        scheduled += rng.expovariate(rate)
+
+#sends one request at its scheduled time and waits for its result
+#returns (outcome, latency from the scheduled time, how late it was sent)
+async def one_request(client, start: float, scheduled: float, text: str, lang: str, quality: str, timeout: float):
+    await asyncio.sleep(max(start + scheduled - time.perf_counter(), 0))
+    lag = time.perf_counter() - start - scheduled
+    try:
+        response = await client.post("/api/translate", json={"text": text, "target_language": lang, "quality": quality})
+        if response.status_code == 200:
+            return "cached", time.perf_counter() - start - scheduled, lag
+        if response.status_code == 429:
+            return "rejected", time.perf_counter() - start - scheduled, lag
+        if response.status_code != 202:
+            return "failed", time.perf_counter() - start - scheduled, lag
+        request_id = response.json()["request_id"]
+        deadline = start + scheduled + timeout
+        while (remaining := deadline - time.perf_counter()) > 0:
+            result = await client.get(f"/api/result/{request_id}", params={"wait": min(remaining, RESULT_WAIT_MAX)})
+            status = result.json().get("status") if result.status_code == 200 else "failed"
+            if status == "completed":
+                return "queued", time.perf_counter() - start - scheduled, lag
+            if status != "pending" and status != "processing":
+                return "failed", time.perf_counter() - start - scheduled, lag
+        return "timed_out", time.perf_counter() - start - scheduled, lag
+    except httpx.HTTPError:
+        return "failed", time.perf_counter() - start - scheduled, lag
+
+#drives the API with the arrival process and returns the outcome, latency and lag of every request, with its quality
+async def drive(app, args, sources: list[str], languages: list[str]):
+    #an endpoint error is a failed request, not the end of the run
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(transport=transport, base_url="http://load-test", limits=limits, timeout=None) as client:
+        start = time.perf_counter()
+        requests = list(arrivals(args.rate, args.duration, sources, languages, args.repeat_ratio, args.seed, args.qualities))
+        results = await asyncio.gather(*(
+            one_request(client, start, scheduled, text, lang, quality, args.timeout)
+            for scheduled, text, lang, quality in requests
+        ))
+        wall = time.perf_counter() - start
+    results = [(*result, quality) for result, (_, _, _, quality) in zip(results, requests)]
+    return results, wall
+
+#returns the English source texts of the analysis file
+def load_sources():
+    with open(ANALYSIS_FILE) as f:
+        analysis = json.load(f)
+    return list(dict.fromkeys(row["Original Term"] for rows in analysis.values() for row in rows))
+
+#--- Report ---
+def build_report(args, results, wall: float, delta: dict):
+    outcomes = {}
+    by_quality = {}
+    for outcome, latency, _, quality in results:
+        outcomes.setdefault(outcome, []).append(latency)
+        if outcome in ("cached", "queued"):
+            by_quality.setdefault(quality, []).append(latency)
+    answered = outcomes.get("cached", []) + outcomes.get("queued", [])
+    report = {
+        "settings": {name: getattr(args, name) for name in (
+            "rate", "duration", "workers", "per_token_ms", "per_call_ms", "repeat_ratio", "languages", "qualities", "seed"
+        )},
+        "requests": {
+            "sent": len(results),
+            **{outcome: len(outcomes.get(outcome, [])) for outcome in ("cached", "queued", "rejected", "failed", "timed_out")},
+        },
+        "throughput": {
+            "offered_per_second": round(len(results) / args.duration, 1),
+            "completed_per_second": round(len(answered) / wall, 1),
+            "wall_seconds": round(wall, 3),
+        },
+        "latency_ms": {
+            "all": latency_summary(answered),
+            "cached": latency_summary(outcomes.get("cached", [])),
+            "queued": latency_summary(outcomes.get("queued", [])),
+        },
+        "queue_wait_ms": histogram_quantiles(delta, "translation_queue_wait_seconds"),
+        "job_latency_ms": histogram_quantiles(delta, "translation_job_latency_seconds"),
+        "cache_lookups": cache_lookups(delta),
+        "client_lag_ms": latency_summary([lag for _, _, lag, _ in results]),
+    }
+    if len(args.qualities) > 1:
+        report["quality"] = {
+            quality: {
+                "completed_per_second": round(len(by_quality.get(quality, [])) / wall, 1),
+                "latency_ms": latency_summary(by_quality.get(quality, [])),
+            }
+            for quality in args.qualities
+        }
+    return report
+
+#returns a message for every checked field that is worse than the baseline's by more than max_regression
+def find_regressions(report: dict, baseline: dict, max_regression: float):
+    regressions = []
+    for path, higher_is_worse in REGRESSION_CHECKS.items():
+        current, previous = report, baseline
+        for key in path:
+            current, previous = (current or {}).get(key), (previous or {}).get(key)
+        if not current or not previous:
+            continue
+        change = (current - previous) / previous if higher_is_worse else (previous - current) / previous
+        if change > max_regression:
+            regressions.append(f"{'.'.join(path)}: {previous} -> {current} ({change:+.0%} worse)")
+    return regressions
+
+async def run(args):
+    #per-request and per-batch log lines would dominate the timings
+    logging.disable(logging.INFO)
+    languages = [lang.lower() for lang in args.languages]
+    unknown = [lang for lang in languages if lang not in LANGUAGE_CODES]
+    if unknown:
+        sys.exit(f"Unsupported languages: {', '.join(unknown)}. Choose from {', '.join(LANGUAGE_CODES)}.")
+    host, port = start_redis()
+
+    with patch.object(translation_engine, 'get_translation_pipeline', stub_pipelines(args.per_token_ms, args.per_call_ms)), \
+         patch.object(api_main, 'create_async_redis_client', partial(create_async_redis_client, host=host, port=port)):
+        for _ in range(args.workers):
+            threading.Thread(target=translation_worker, args=(create_redis_client(host=host, port=port),), daemon=True).start()
+        #the transport does not run the lifespan hook, so run it around the load
+        async with api_main.app.router.lifespan_context(api_main.app):
+            before = snapshot_metrics()
+            results, wall = await drive(api_main.app, args, load_sources(), languages)
+            delta = metrics_delta(before, snapshot_metrics())
+
+    report = build_report(args, results, wall, delta)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
+    print(json.dumps(report, indent=4))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(report, json.load(f), args.max_regression)
+        if regressions:
+            sys.exit("Regressed against " + args.baseline + ":\n" + "\n".join(regressions))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Open-loop load test of the API and workers with a stub translator.")
+    parser.add_argument("--rate", type=float, default=50, help="requests per second, Poisson arrivals")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of arrivals")
+    parser.add_argument("--workers", type=int, default=2, help="translation_worker threads")
+    parser.add_argument("--per-token-ms", type=float, default=0.1, help="stub cost per padded token of a generate call")
+    parser.add_argument("--per-call-ms", type=float, default=20, help="stub cost of every generate call")
+    parser.add_argument("--repeat-ratio", type=float, default=0.5, help="share of requests for already known texts")
+    parser.add_argument("--languages", nargs="+", default=["french", "spanish"])
+    parser.add_argument("--qualities", nargs="+", default=[DEFAULT_QUALITY], choices=list(QUALITY_TIERS),
+                        help="quality tiers the requests ask for, picked at random")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds a request may take before it counts as timed out")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="file to save the JSON report to")
+    parser.add_argument("--baseline", help="saved report to compare with")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="allowed relative change for --baseline")
+    asyncio.run(run(parser.parse_args()))
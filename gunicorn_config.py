@@ -1,6 +1,6 @@
+import os
+import shutil
 import logging
-from app.services.translation_engine import get_translation_pipeline
-from app.core.config import LANGUAGE_CODES
 
 # --- Gunicorn Settings ---
 bind = "0.0.0.0:5000"
@@ -12,6 +12,20 @@ logger = logging.getLogger(__name__)
 
 # -- Server Hooks ---
 #this gunicorn hook runs in each worker process after it has been forked
-#this is a safe place to pre-load models for the web server if needed
+#the web server never loads models, they live in the separate worker service
 def post_fork(server, worker):
     logger.info(f"Gunicorn worker {worker.pid} started.")
+
+#with PROMETHEUS_MULTIPROC_DIR set, every worker writes its metrics to files in that directory
+#so GET /api/metrics reports the totals of all workers; files of a previous run are cleared first
+def on_starting(server):
+    metrics_dir = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if metrics_dir:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+        os.makedirs(metrics_dir)
+
+#drops the live gauges of a worker that has exited
+def child_exit(server, worker):
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,71 @@
+import os
+import json
+import time
+import asyncio
+os.environ.setdefault('SERVICE_TOKEN_SECRET', 'test-secret-value')
+
+import fakeredis
+
+from app.api.admission import AdmissionController
+from app.services.keys import get_request_queue_key, get_throughput_key
+from app.core.config import THROUGHPUT_BUCKET_SECONDS
+
+#queues n jobs for a language and records `jobs` finished in `busy` seconds in the current bucket
+async def setup(redis_client, lang, queued, jobs, busy, priority="interactive"):
+    for i in range(queued):
+        await redis_client.rpush(get_request_queue_key(lang, priority), json.dumps({'id': str(i)}))
+    if jobs:
+        throughput_key = get_throughput_key(lang, int(time.time() // THROUGHPUT_BUCKET_SECONDS))
+        await redis_client.hset(throughput_key, mapping={'jobs': jobs, 'busy': busy})
+
+#tests that a queue the workers can drain within the SLO admits new jobs
+def test_admits_within_slo():
+    async def scenario():
+        redis_client = fakeredis.FakeAsyncRedis(decode_responses=True)
+        #10 jobs/s, so 100 queued jobs take about 10s
+        await setup(redis_client, "french", queued=100, jobs=50, busy=5.0)
+        return await AdmissionController(redis_client, slo=30, language_slos={}).check("french")
+
+    assert asyncio.run(scenario()) is None
+
+#tests that a queue over its SLO is rejected with the time it needs to drain back to the SLO
+def test_rejects_over_slo():
+    async def scenario():
+        redis_client = fakeredis.FakeAsyncRedis(decode_responses=True)
+        #2 jobs/s, so 100 queued jobs take about 50s
+        await setup(redis_client, "hindi", queued=100, jobs=10, busy=5.0)
+        return await AdmissionController(redis_client, slo=30, language_slos={}).check("hindi")
+
+    assert asyncio.run(scenario()) == 20
+
+#tests that per-language SLOs override the default, and that an SLO of 0 admits everything
+def test_language_slos():
+    async def scenario():
+        redis_client = fakeredis.FakeAsyncRedis(decode_responses=True)
+        await setup(redis_client, "spanish", queued=100, jobs=10, busy=5.0)
+        await setup(redis_client, "arabic", queued=100, jobs=10, busy=5.0)
+        controller = AdmissionController(redis_client, slo=30, language_slos={"spanish": 120, "arabic": 0})
+        return await controller.check("Spanish"), await controller.check("arabic")
+
+    assert asyncio.run(scenario()) == (None, None)
+
+#tests that jobs are admitted while no batches have been recorded, e.g. after an idle spell
+def test_admits_without_throughput():
+    async def scenario():
+        redis_client = fakeredis.FakeAsyncRedis(decode_responses=True)
+        await setup(redis_client, "chinese", queued=500, jobs=0, busy=0)
+        return await AdmissionController(redis_client, slo=30, language_slos={}).check("chinese")
+
+    assert asyncio.run(scenario()) is None
+
+#tests that bulk jobs count the interactive jobs ahead of them, while interactive jobs ignore the bulk lane
+def test_lanes_ahead_count_towards_the_wait():
+    async def scenario():
+        redis_client = fakeredis.FakeAsyncRedis(decode_responses=True)
+        #2 jobs/s: 40 interactive jobs take 20s, 100 more bulk jobs take 70s in total
+        await setup(redis_client, "french", queued=40, jobs=10, busy=5.0)
+        await setup(redis_client, "french", queued=100, jobs=0, busy=0, priority="bulk")
+        controller = AdmissionController(redis_client, slo=30, language_slos={})
+        return await controller.check("french", "interactive"), await controller.check("french", "bulk")
+
+    assert asyncio.run(scenario()) == (None, 40)
@@ -1,45 +1,111 @@
 import os
+import sys
 import json
+import asyncio
+import pytest
+import redis
+import subprocess
 os.environ['SERVICE_TOKEN_SECRET'] = 'test-secret-value'
 
 from fastapi.testclient import TestClient
-from unittest.mock import patch, MagicMock
+from unittest.mock import AsyncMock, MagicMock, patch
 from app.main import app
+from app.api import endpoints
+from app.api.endpoints import get_redis
+from app.api.l1_cache import translation_l1_cache
+from app.services.keys import get_translation_cache_key
+from app.services.translation_memory import TranslationMemory
+from app.core.config import INFLIGHT_TTL, TRANSLATION_CACHE_TTL
 
 #this client allows you to make "fake" requests to your app for testing purposes
 client = TestClient(app)
 
+#replaces the asyncio Redis client with a mock for the duration of a test
+#commands are awaited, except pipeline() which returns a pipeline whose commands are queued synchronously
+@pytest.fixture
+def mock_redis():
+    mock = AsyncMock()
+    mock.pipeline = MagicMock()
+    pipe = MagicMock()
+    #cache lookups reply with [value, remaining TTL in ms], a miss by default
+    pipe.execute = AsyncMock(return_value=[None, -2])
+    mock.pipeline.return_value.__aenter__.return_value = pipe
+    #the registered submit script is awaitable and queues the job by default
+    mock.submit_script = AsyncMock(return_value=['queued', 'leader-id'])
+    app.dependency_overrides[get_redis] = lambda: mock
+    app.dependency_overrides[endpoints.get_submit_script] = lambda: mock.submit_script
+    #start every test with an empty in-process cache
+    translation_l1_cache.clear()
+    yield mock
+    app.dependency_overrides.clear()
+
+#returns the mocked pipeline used inside 'async with redis_client.pipeline()'
+def get_pipe(mock_redis):
+    return mock_redis.pipeline.return_value.__aenter__.return_value
+
+#stands in for the completion listener, announcing the given request IDs as soon as they are registered
+class FakeCompletionListener:
+    def __init__(self, completed=()):
+        self.completed = list(completed)
+        self.registered = []
+
+    def register(self, request_ids):
+        completions = asyncio.Queue()
+        for request_id in self.completed:
+            if request_id in request_ids:
+                completions.put_nowait(request_id)
+        self.registered.append(request_ids)
+        return completions
+
+    def unregister(self, request_ids, completions):
+        self.registered.remove(request_ids)
+
+#returns the mocked submit script that queues or coalesces jobs
+def get_submit_script(mock_redis):
+    return mock_redis.submit_script
+
 # --- Test Suite ---
 
 #tests the /health endpoint when Redis connection is sucessful
-def test_health_check_sucess():
-    #patch redis_client.ping() to simulate a successful connection
-    with patch('app.api.endpoints.redis_client') as mock_redis:
-        mock_redis.ping.return_value = True
+def test_health_check_sucess(mock_redis):
+    #mock redis_client.ping() to simulate a successful connection
+    mock_redis.ping.return_value = True
 
-        #make request to the health endpoint
-        response = client.get("/api/health")
+    #make request to the health endpoint
+    response = client.get("/api/health")
 
-        assert response.status_code == 200 #request sucessful
-        assert response.json() == {"api_status": "ok", "redis_status": "ok"}
+    assert response.status_code == 200 #request sucessful
+    assert response.json() == {"api_status": "ok", "redis_status": "ok"}
 
 #tests the /health endpoint when Redis connection fails
-def test_health_check_redis_failure():
-    #patch redis_client.ping() to simulate a failed connection
-    with patch('app.api.endpoints.redis_client') as mock_redis:
-        mock_redis.ping.return_value = False
-        response = client.get("/api/health")
+def test_health_check_redis_failure(mock_redis):
+    #mock redis_client.ping() to simulate a failed connection
+    mock_redis.ping.return_value = False
+    response = client.get("/api/health")
+
+    assert response.status_code == 503 #service unavailable error
+    assert response.json() == {"detail": "Service Unavailable: Cannot connect to Redis."}
+
+#tests the /health endpoint when the Redis connection raises instead of answering
+def test_health_check_redis_error(mock_redis):
+    mock_redis.ping.side_effect = redis.exceptions.ConnectionError("Connection refused")
+    response = client.get("/api/health")
 
-        assert response.status_code == 503 #service unavailable error
-        assert response.json() == {"detail": "Service Unavailable: Cannot connect to Redis."}
+    assert response.status_code == 503
+    assert response.json() == {"detail": "Service Unavailable: Cannot connect to Redis."}
+
+#tests that requests fail cleanly when the lifespan hook has not created a Redis client
+def test_missing_redis_client():
+    response = client.get("/api/health")
+
+    assert response.status_code == 503
 
 #tests the POST /translate endpoint when a translation is found in the cache
-@patch('app.api.endpoints.redis_client', new_callable=MagicMock)
 def test_translate_cache_hit(mock_redis):
     #configure mock to simulate a cache hit
     cached_translation = "Ceci est un test"
-    #the 'get' method should return a translated string
-    mock_redis.get.return_value = cached_translation
+    #the cache lookup pipeline should return a translated string and its remaining TTL
+    get_pipe(mock_redis).execute.return_value = [cached_translation, 3_600_000]
     
     #make a request to the endpoint
     response = client.post(
@@ -54,14 +120,12 @@ def test_translate_cache_hit(mock_redis):
     assert data["result"] == cached_translation
     assert data["from_cache"] is True
 
-    #assert 'rpush' method (for queueing a new job) was NOT called
-    mock_redis.rpush.assert_not_called()
+    #assert the submit script (for queueing a new job) was NOT called
+    get_submit_script(mock_redis).assert_not_called()
 
 #tests the POST /translation endpoint when a translation is NOT in the cache
-@patch('app.api.endpoints.redis_client', new_callable=MagicMock)
 def test_translate_cache_miss(mock_redis):
-    #Configure the mock to simulate a cache miss
-    mock_redis.get.return_value = None
+    #the fixture's cache lookup pipeline simulates a cache miss by default
 
     #make request to the endpoint
     response = client.post(
@@ -75,61 +139,384 @@ def test_translate_cache_miss(mock_redis):
     assert data["message"] == "Request accepted."
     assert "request_id" in data #check that a request ID was returned
 
-    #assert that 'set' and 'rpush' methods were called to queue the job
-    mock_redis.set.assert_called_once()
-    mock_redis.rpush.assert_called_once()
+    #assert the submit script was called once to queue the job, with this request's ID
+    submit_script = get_submit_script(mock_redis)
+    submit_script.assert_awaited_once()
+    keys = submit_script.call_args.kwargs["keys"]
+    args = submit_script.call_args.kwargs["args"]
+    assert keys[3] == f"translation_result:{data['request_id']}"
+    assert keys[4] == "translation_request_queue:es"
+    assert json.loads(args[2])["text"] == "This is a new test"
+    assert args[4] == INFLIGHT_TTL
+
+#tests that an identical submission attaches to the pending job instead of queueing a new one
+def test_translate_attaches_to_inflight_job(mock_redis):
+    get_submit_script(mock_redis).return_value = ['attached', 'leader-id']
+
+    response = client.post(
+        "/api/translate",
+        json={"text": "This is a new test", "target_language": "spanish"}
+    )
+
+    #the client still gets its own request ID to poll
+    assert response.status_code == 202
+    assert response.json()["request_id"] != 'leader-id'
+
+#tests that a translation saved between the cache check and the submit is returned directly
+def test_translate_cached_during_submit(mock_redis):
+    get_submit_script(mock_redis).return_value = ['cached', 'Esta es una nueva prueba']
+
+    response = client.post(
+        "/api/translate",
+        json={"text": "This is a new test", "target_language": "spanish"}
+    )
+
+    assert response.status_code == 200
+    assert response.json()["result"] == "Esta es una nueva prueba"
+    assert response.json()["from_cache"] is True
+
+#tests that a Redis miss found in the translation memory is served and copied back into Redis
+def test_translate_translation_memory_hit(mock_redis, tmp_path):
+    memory = TranslationMemory(str(tmp_path / "memory.sqlite3"))
+    cache_key = get_translation_cache_key("This is an old test", "french")
+    memory.put_many({cache_key: "Ceci est un vieux test"})
+    app.dependency_overrides[endpoints.get_translation_memory] = lambda: memory
+
+    response = client.post("/api/translate", json={"text": "This is an old test", "target_language": "french"})
+
+    assert response.status_code == 200
+    assert response.json()["result"] == "Ceci est un vieux test"
+    get_submit_script(mock_redis).assert_not_awaited()
+    get_pipe(mock_redis).set.assert_called_once_with(cache_key, "Ceci est un vieux test", ex=TRANSLATION_CACHE_TTL)
+
+#tests that a repeated cache hit is served from the in-process cache without touching Redis
+def test_translate_l1_cache_hit(mock_redis):
+    pipe = get_pipe(mock_redis)
+    pipe.execute.return_value = ["Ceci est un test", 3_600_000]
+    payload = {"text": "This is a test", "target_language": "french"}
+    before = client.get("/api/cache/stats").json()["l1"]
+
+    first = client.post("/api/translate", json=payload)
+    second = client.post("/api/translate", json=payload)
+
+    assert first.status_code == second.status_code == 200
+    assert second.json()["result"] == "Ceci est un test"
+    #only the first request needed a Redis round-trip
+    pipe.execute.assert_awaited_once()
+
+    after = client.get("/api/cache/stats").json()["l1"]
+    assert after["hits"] - before["hits"] == 1
+    assert after["misses"] - before["misses"] == 1
+
+#tests that the in-process copy of a cached translation expires no later than its Redis key
+def test_translate_l1_entry_capped_at_redis_ttl(mock_redis):
+    pipe = get_pipe(mock_redis)
+    pipe.execute.return_value = ["Ceci est un test", 1500]
+    payload = {"text": "This is a test", "target_language": "french"}
+
+    with patch('app.api.l1_cache.time.monotonic', return_value=100.0):
+        client.post("/api/translate", json=payload)
+    #the Redis key had 1.5s left, so the next lookup after that goes back to Redis
+    with patch('app.api.l1_cache.time.monotonic', return_value=101.6):
+        client.post("/api/translate", json=payload)
+
+    assert pipe.execute.await_count == 2
+
+#tests that a language without a worker queue is rejected before anything is queued
+def test_translate_unsupported_language(mock_redis):
+    response = client.post(
+        "/api/translate",
+        json={"text": "This is a test", "target_language": "klingon"}
+    )
+
+    assert response.status_code == 422
+    assert "not supported" in response.text
+    get_pipe(mock_redis).execute.assert_not_called()
+
+#tests that an unsupported language only fails its own item in a bulk submit
+def test_translate_batch_unsupported_language(mock_redis):
+    pipe = get_pipe(mock_redis)
+    #the cache lookup (MGET and one PTTL), then the submit
+    pipe.execute.side_effect = [[[None], -2], [['queued', 'new-id']]]
+
+    response = client.post(
+        "/api/translate/batch",
+        json={"items": [
+            {"text": "Hello", "target_language": "klingon"},
+            {"text": "Hello", "target_language": "French"}
+        ]}
+    )
+
+    assert response.status_code == 202
+    items = response.json()["items"]
+    assert items[0]["status"] == "failed"
+    assert "not supported" in items[0]["result"]
+    assert items[1]["status"] == "queued"
+    #the unsupported item never reaches Redis, and the language is normalized for the keys
+    assert len(pipe.mget.call_args[0][0]) == 1
+    submit_args = get_submit_script(mock_redis).call_args.kwargs
+    assert submit_args["keys"][4] == "translation_request_queue:fr"
+    assert json.loads(submit_args["args"][2])["lang"] == "french"
 
 #test the GET /result/{request_id} endpoint for a completed job
-def test_get_result_completed():
+def test_get_result_completed(mock_redis):
     request_id = "test-id-123"
     job_result = {
         "status": "completed",
         "result": "Este es un resultado"
     }
 
-    with patch('app.api.endpoints.redis_client') as mock_redis:
-        #arrange mock reddis to return the JSON string of the completed job
-        mock_redis.get.return_value = json.dumps(job_result)
+    #arrange mock reddis to return the JSON string of the completed job
+    mock_redis.get.return_value = json.dumps(job_result)
 
-        #make the request
-        response = client.get(f"/api/result/{request_id}")
+    #make the request
+    response = client.get(f"/api/result/{request_id}")
 
-        #check response
-        assert response.status_code == 200
-        data = response.json()
-        assert data["status"] == "completed"
-        assert data["result"] == "Este es un resultado"
-        assert data["from_cache"] is False #should default to False
+    #check response
+    assert response.status_code == 200
+    data = response.json()
+    assert data["status"] == "completed"
+    assert data["result"] == "Este es un resultado"
+    assert data["from_cache"] is False #should default to False
 
 #tests the GET /result/{request_id} endpoint for an ID that doesn't exist
-def test_get_result_not_found():
+def test_get_result_not_found(mock_redis):
     request_id = "non-existent-id"
-    with patch('app.api.endpoints.redis_client') as mock_redis:
-        #arrange mock Redis to return None, as if key doesn't exist
-        mock_redis.get.return_value = None
+    #arrange mock Redis to return None, as if key doesn't exist
+    mock_redis.get.return_value = None
 
-        #make the request
-        response = client.get(f"/api/result/{request_id}")
+    #make the request
+    response = client.get(f"/api/result/{request_id}")
 
-        assert response.status_code == 404 # not found error
-        assert response.json() == {"detail": "Request ID not found."}
+    assert response.status_code == 404 # not found error
+    assert response.json() == {"detail": "Request ID not found."}
 
 #tests the GET /request/{request_id} endpoint for a job that is still in progress
-def test_get_result_still_queued():
+def test_get_result_still_queued(mock_redis):
     request_id = "queued-id-456"
     job_result = {
         "status": "queued",
         "result": None
     }
 
-    with patch('app.api.endpoints.redis_client') as mock_redis:
-        #arrange mock Redis to return the JSON of the queued job
-        mock_redis.get.return_value = json.dumps(job_result)
+    #arrange mock Redis to return the JSON of the queued job
+    mock_redis.get.return_value = json.dumps(job_result)
+
+    #make the request
+    response = client.get(f"/api/result/{request_id}")
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["status"] == "queued"
+    assert data["result"] is None
+
+#tests that ?wait= holds the request until the worker announces the job's completion
+def test_get_result_wait_for_completion(mock_redis):
+    request_id = "waiting-id-789"
+    listener = FakeCompletionListener(completed=[request_id])
+    app.dependency_overrides[endpoints.get_completion_listener] = lambda: listener
+    mock_redis.get.side_effect = [
+        json.dumps({"status": "queued", "result": None}),
+        json.dumps({"status": "completed", "result": "Bonjour"}),
+    ]
+
+    response = client.get(f"/api/result/{request_id}?wait=5")
+
+    assert response.status_code == 200
+    assert response.json()["result"] == "Bonjour"
+    #the request stopped listening once it had its answer
+    assert listener.registered == []
+
+#tests that ?wait= returns the current status once the wait is over
+def test_get_result_wait_timeout(mock_redis):
+    app.dependency_overrides[endpoints.get_completion_listener] = lambda: FakeCompletionListener()
+    mock_redis.get.return_value = json.dumps({"status": "queued", "result": None})
+
+    response = client.get("/api/result/slow-id?wait=0.05")
+
+    assert response.status_code == 200
+    assert response.json()["status"] == "queued"
+    assert mock_redis.get.await_count == 2
+
+#tests that the stream sends each result as its job finishes, then a final 'done' event
+def test_stream_results(mock_redis):
+    app.dependency_overrides[endpoints.get_completion_listener] = lambda: FakeCompletionListener(completed=["job-1"])
+    #the first read finds job-1 still queued and the other ID unknown, the second finds job-1 completed
+    mock_redis.mget.side_effect = [
+        [json.dumps({"status": "queued", "result": None}), None],
+        [json.dumps({"status": "completed", "result": "Hola"})],
+    ]
+
+    with client.stream("GET", "/api/results/stream?request_id=job-1&request_id=missing-id") as response:
+        assert response.headers["content-type"].startswith("text/event-stream")
+        body = "".join(response.iter_text())
+
+    events = [
+        (block.split("\n")[0].removeprefix("event: "), json.loads(block.split("\n")[1].removeprefix("data: ")))
+        for block in body.strip().split("\n\n")
+    ]
+    assert [(name, data.get("request_id"), data.get("status")) for name, data in events] == [
+        ("result", "missing-id", "not_found"),
+        ("result", "job-1", "completed"),
+        ("done", None, None),
+    ]
+
+#tests the POST /translate/batch endpoint with a mix of cache hits and misses
+def test_translate_batch_mixed(mock_redis):
+    #first item is cached, second is not
+    pipe = get_pipe(mock_redis)
+    #the cache lookup (MGET and a PTTL per key), then the submit
+    pipe.execute.side_effect = [[["Bonjour", None], 3_600_000, -2], [['queued', 'new-id']]]
+
+    response = client.post(
+        "/api/translate/batch",
+        json={"items": [
+            {"text": "Hello", "target_language": "french"},
+            {"text": "Goodbye", "target_language": "french"}
+        ]}
+    )
+
+    assert response.status_code == 202
+    items = response.json()["items"]
+    assert items[0] == {"status": "completed", "request_id": None, "result": "Bonjour", "from_cache": True}
+    assert items[1]["status"] == "queued"
+    assert items[1]["request_id"]
+
+    #all cache keys are resolved in one MGET, and the single miss is submitted through the pipeline
+    pipe.mget.assert_called_once()
+    assert len(pipe.mget.call_args[0][0]) == 2
+    submit_script = get_submit_script(mock_redis)
+    submit_script.assert_awaited_once()
+    assert submit_script.call_args.kwargs["client"] is pipe
+    assert pipe.execute.await_count == 2
+
+#tests the POST /translate/batch endpoint when every item is cached
+def test_translate_batch_all_cached(mock_redis):
+    pipe = get_pipe(mock_redis)
+    pipe.execute.return_value = [["Hola", "Adios"], 3_600_000, 3_600_000]
+
+    response = client.post(
+        "/api/translate/batch",
+        json={"items": [
+            {"text": "Hello", "target_language": "spanish"},
+            {"text": "Goodbye", "target_language": "spanish"}
+        ]}
+    )
+
+    assert response.status_code == 200
+    assert [item["result"] for item in response.json()["items"]] == ["Hola", "Adios"]
+    get_submit_script(mock_redis).assert_not_called()
+    #only the cache lookup reached Redis
+    pipe.execute.assert_awaited_once()
+
+#tests the POST /results endpoint with a completed, a queued and an unknown job
+def test_get_results_batch(mock_redis):
+    mock_redis.mget.return_value = [
+        json.dumps({"status": "completed", "result": "Hola"}),
+        json.dumps({"status": "queued", "result": None}),
+        None
+    ]
+    pipe = get_pipe(mock_redis)
+
+    response = client.post("/api/results", json={"request_ids": ["a", "b", "c"]})
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [r["request_id"] for r in results] == ["a", "b", "c"]
+    assert [r["status"] for r in results] == ["completed", "queued", "not_found"]
+    assert results[0]["result"] == "Hola"
+
+    #only the finished job has its lifetime shortened
+    pipe.expire.assert_called_once()
+
+#tests that loading the API does not pull in the ML stack, which only the worker needs
+def test_api_does_not_import_ml_stack():
+    code = "import sys, app.main; print(sorted(m for m in ('torch', 'transformers') if m in sys.modules))"
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert output.stdout.strip() == "[]"
+
+#tests that cache lookups and Redis round-trips show up in the Prometheus metrics
+def test_metrics_endpoint(mock_redis):
+    get_pipe(mock_redis).execute.return_value = ["Ceci est un test", 3_600_000]
+    client.post("/api/translate", json={"text": "This is a test", "target_language": "french"})
+
+    response = client.get("/api/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'translation_cache_lookups_total{layer="redis",result="hit"}' in response.text
+    assert 'translation_redis_round_trip_seconds_count{operation="cache_lookup"}' in response.text
+
+#stands in for the admission controller, rejecting every language with the given Retry-After
+class RejectingAdmissionController:
+    def __init__(self, retry_after):
+        self.retry_after = retry_after
+
+    async def check(self, lang, priority):
+        return self.retry_after
+
+#tests that a job over its language's SLO is rejected with 429 and a Retry-After header, and not queued
+def test_translate_rejected_by_admission_control(mock_redis):
+    app.dependency_overrides[endpoints.get_admission_controller] = lambda: RejectingAdmissionController(12)
+
+    response = client.post("/api/translate", json={"text": "This is a test", "target_language": "french"})
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "12"
+    get_submit_script(mock_redis).assert_not_called()
+
+#tests that cached translations are still served while the queue is over its SLO
+def test_cache_hit_bypasses_admission_control(mock_redis):
+    app.dependency_overrides[endpoints.get_admission_controller] = lambda: RejectingAdmissionController(12)
+    get_pipe(mock_redis).execute.return_value = ["Ceci est un test", 3_600_000]
+
+    response = client.post("/api/translate", json={"text": "This is a test", "target_language": "french"})
+
+    assert response.status_code == 200
+
+#tests that a bulk submit is queued in the bulk lane and only coalesces with other bulk jobs
+def test_translate_bulk_priority(mock_redis):
+    response = client.post(
+        "/api/translate",
+        json={"text": "This is a new test", "target_language": "spanish", "priority": "bulk"}
+    )
+
+    assert response.status_code == 202
+    keys = get_submit_script(mock_redis).call_args.kwargs["keys"]
+    args = get_submit_script(mock_redis).call_args.kwargs["args"]
+    assert keys[1].endswith(":bulk")
+    assert keys[4] == "translation_request_queue:es:bulk"
+    assert json.loads(args[2])["priority"] == "bulk"
+
+#tests that an unknown priority is rejected
+def test_translate_unknown_priority(mock_redis):
+    response = client.post(
+        "/api/translate",
+        json={"text": "This is a new test", "target_language": "spanish", "priority": "urgent"}
+    )
+
+    assert response.status_code == 422
 
-        #make the request
-        response = client.get(f"/api/result/{request_id}")
+#tests that a non-default quality tier is carried by the job and keyed apart from the default tier
+def test_translate_fast_quality(mock_redis):
+    response = client.post(
+        "/api/translate",
+        json={"text": "This is a new test", "target_language": "spanish", "quality": "fast"}
+    )
+
+    assert response.status_code == 202
+    keys = get_submit_script(mock_redis).call_args.kwargs["keys"]
+    args = get_submit_script(mock_redis).call_args.kwargs["args"]
+    assert keys[0] == get_translation_cache_key("This is a new test", "spanish", "fast")
+    assert keys[0] != get_translation_cache_key("This is a new test", "spanish")
+    assert json.loads(args[2])["quality"] == "fast"
+
+#tests that an unknown quality tier is rejected
+def test_translate_unknown_quality(mock_redis):
+    response = client.post(
+        "/api/translate",
+        json={"text": "This is a new test", "target_language": "spanish", "quality": "perfect"}
+    )
 
-        assert response.status_code == 200
-        data = response.json()
-        assert data["status"] == "queued"
-        assert data["result"] is None
+    assert response.status_code == 422
@@ -0,0 +1,29 @@
+import os
+os.environ.setdefault('SERVICE_TOKEN_SECRET', 'test-secret-value')
+
+import pytest
+from unittest.mock import patch, MagicMock
+
+from app.services import translation_engine
+from app.core import config
+from app.services.backends import load_translator
+from app.services.model_cache import ModelCache
+
+#tests that a misconfigured backend name fails with a clear error
+def test_unknown_backend():
+    with pytest.raises(ValueError, match="Unknown inference backend 'tensorrt'"):
+        load_translator('tensorrt', "Helsinki-NLP/opus-mt-en-fr")
+
+#tests that the backend is chosen per language and each backend keeps its own cached model
+def test_backend_per_language():
+    loader = MagicMock(side_effect=lambda backend, model_name: f"{backend}:{model_name}")
+    with patch.dict(config.LANGUAGE_BACKENDS, {"french": "ctranslate2"}), \
+         patch.object(translation_engine, 'model_cache', ModelCache(max_bytes=2**40)), \
+         patch.object(translation_engine, 'load_translator', loader):
+        assert translation_engine.get_translation_pipeline("French") == ("ctranslate2:Helsinki-NLP/opus-mt-en-fr", None)
+        assert translation_engine.get_translation_pipeline("spanish") == ("transformers:Helsinki-NLP/opus-mt-en-es", None)
+        #the reference backend can still be loaded next to the configured one
+        assert translation_engine.get_translation_pipeline("french", backend="transformers")[0] == "transformers:Helsinki-NLP/opus-mt-en-fr"
+        translation_engine.get_translation_pipeline("french")
+
+    assert loader.call_count == 3
@@ -0,0 +1,49 @@
+import os
+os.environ.setdefault('SERVICE_TOKEN_SECRET', 'test-secret-value')
+
+from unittest.mock import MagicMock
+
+from app.services.bucketing import bucket_by_length
+from app.services.translation_engine import run_bucketed, split_by_quality
+
+#tests that inputs are grouped with others of similar length under the padded token budget
+def test_buckets_similar_lengths():
+    lengths = [90, 5, 6, 88, 7]
+    buckets = bucket_by_length(lengths, max_tokens=200)
+
+    assert buckets == [[1, 2, 4], [3, 0]]
+    for bucket in buckets:
+        assert len(bucket) * max(lengths[i] for i in bucket) <= 200
+
+#tests that an input longer than the budget is still translated, alone
+def test_oversized_input_gets_own_bucket():
+    assert bucket_by_length([10, 500, 10], max_tokens=100) == [[0, 2], [1]]
+    assert bucket_by_length([], max_tokens=100) == []
+
+#tests that each bucket is one pipeline call and translations come back in input order
+def test_run_bucketed_keeps_input_order():
+    long_note = "patient_notes: " + "word " * 60
+    texts = [long_note, "recommended_treatment: Observation", long_note + "again", "Yes"]
+    translator = MagicMock(side_effect=lambda texts, batch_size: [{"translation_text": text.upper()} for text in texts])
+    translator.tokenizer = None
+
+    translations = run_bucketed(translator, texts, max_tokens=100)
+
+    assert translations == [text.upper() for text in texts]
+    #the two short texts share a call, each long note is padded only against itself
+    assert [call.args[0] for call in translator.call_args_list] == [
+        ["Yes", "recommended_treatment: Observation"], [long_note], [long_note + "again"]
+    ]
+
+#tests that a batch is split by quality tier and each tier's generation settings reach the pipeline
+def test_quality_tiers_translated_apart():
+    jobs = [{'id': "1", 'text': "a"}, {'id': "2", 'text': "b", 'quality': "fast"}, {'id': "3", 'text': "c"}]
+    assert [[job['id'] for job in batch] for batch in split_by_quality(jobs)] == [["1", "3"], ["2"]]
+
+    translator = MagicMock(side_effect=lambda texts, batch_size, **kwargs: [{"translation_text": text} for text in texts])
+    translator.tokenizer = None
+    run_bucketed(translator, ["Yes"], quality="best")
+    run_bucketed(translator, ["Yes"])
+
+    assert translator.call_args_list[0].kwargs == {"batch_size": 1, "num_beams": 8}
+    assert translator.call_args_list[1].kwargs == {"batch_size": 1}
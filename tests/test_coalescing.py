@@ -0,0 +1,119 @@
+import os
+import json
+os.environ.setdefault('SERVICE_TOKEN_SECRET', 'test-secret-value')
+
+import fakeredis
+from unittest.mock import patch
+from prometheus_client import REGISTRY
+
+from app.services.coalescing import get_inflight_keys, SUBMIT_SCRIPT, FINISH_SCRIPT
+from app.services.translation_engine import process_batch
+from app.services.keys import get_translation_cache_key, get_request_queue_key, get_request_stream_key
+from app.core.config import RESULTS_CACHE_PREFIX, INFLIGHT_TTL, COMPLETIONS_CHANNEL
+
+QUEUE_KEY = get_request_queue_key("french")
+
+CACHE_KEY = get_translation_cache_key("recommended_treatment: Observation", "french")
+
+#runs the submit script the same way the API does for a cache miss
+def submit(redis_client, request_id):
+    inflight_key, waiters_key = get_inflight_keys(CACHE_KEY)
+    task = json.dumps({'id': request_id, 'text': "recommended_treatment: Observation", 'lang': "french"})
+    return redis_client.register_script(SUBMIT_SCRIPT)(
+        keys=[CACHE_KEY, inflight_key, waiters_key, f"{RESULTS_CACHE_PREFIX}{request_id}", QUEUE_KEY],
+        args=[request_id, json.dumps({'status': 'queued', 'result': None}), task, 3600, INFLIGHT_TTL, 'list']
+    )
+
+#runs the finish script the same way the worker does after saving a result
+def finish(redis_client, job_id, payload):
+    return redis_client.register_script(FINISH_SCRIPT)(
+        keys=list(get_inflight_keys(CACHE_KEY)),
+        args=[job_id, payload, 300, RESULTS_CACHE_PREFIX, COMPLETIONS_CHANNEL]
+    )
+
+#tests that identical submissions queue one job and all receive its result
+def test_identical_requests_share_one_job():
+    redis_client = fakeredis.FakeRedis(decode_responses=True)
+    pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(COMPLETIONS_CHANNEL)
+    pubsub.get_message(timeout=0.1)
+
+    assert submit(redis_client, "first") == ['queued', 'first']
+    assert submit(redis_client, "second") == ['attached', 'first']
+    assert submit(redis_client, "third") == ['attached', 'first']
+    #only the first request was pushed to the worker queue
+    assert redis_client.llen(QUEUE_KEY) == 1
+    assert json.loads(redis_client.get(f"{RESULTS_CACHE_PREFIX}second"))['status'] == 'queued'
+
+    payload = json.dumps({'status': 'completed', 'result': "recommended_treatment: Observation"})
+    redis_client.set(f"{RESULTS_CACHE_PREFIX}first", payload)
+    assert finish(redis_client, "first", payload) == 2
+
+    for request_id in ["first", "second", "third"]:
+        assert redis_client.get(f"{RESULTS_CACHE_PREFIX}{request_id}") == payload
+    #every request ID that received the result is announced to the waiting API processes
+    messages = iter(lambda: pubsub.get_message(timeout=0.1), None)
+    assert [message['data'] for message in messages] == ["first", "second", "third"]
+    #nothing is left pending, so the next miss starts a fresh job
+    assert not any(redis_client.exists(key) for key in get_inflight_keys(CACHE_KEY))
+    assert submit(redis_client, "fourth") == ['queued', 'fourth']
+
+#tests that a submission arriving after the worker cached the result is answered from the cache
+def test_submit_after_completion_returns_cached():
+    redis_client = fakeredis.FakeRedis(decode_responses=True)
+    redis_client.set(CACHE_KEY, "recommended_treatment: Observation")
+
+    assert submit(redis_client, "late") == ['cached', "recommended_treatment: Observation"]
+    assert redis_client.llen(QUEUE_KEY) == 0
+    assert not redis_client.exists(f"{RESULTS_CACHE_PREFIX}late")
+
+#tests that the in-flight marker is short-lived, so a job lost to a crashed worker stops absorbing requests
+def test_inflight_marker_expires():
+    redis_client = fakeredis.FakeRedis(decode_responses=True)
+    inflight_key, _ = get_inflight_keys(CACHE_KEY)
+
+    submit(redis_client, "first")
+    assert 0 < redis_client.ttl(inflight_key) <= INFLIGHT_TTL
+
+    #simulate the marker running out after the worker holding the job died
+    redis_client.delete(inflight_key)
+    assert submit(redis_client, "retry") == ['queued', 'retry']
+    assert redis_client.llen(QUEUE_KEY) == 2
+
+#tests that the worker's process_batch saves the result and fans it out to attached requests
+def test_process_batch_finishes_coalesced_requests():
+    redis_client = fakeredis.FakeRedis(decode_responses=True)
+    submit(redis_client, "first")
+    submit(redis_client, "second")
+    job = json.loads(redis_client.lpop(QUEUE_KEY))
+
+    translator = lambda texts, batch_size: [{'translation_text': "traitement_recommandé : Observation"} for _ in texts]
+    with patch("app.services.translation_engine.get_translation_pipeline", return_value=(translator, None)):
+        process_batch(redis_client, "french", [job], redis_client.register_script(FINISH_SCRIPT))
+
+    for request_id in ["first", "second"]:
+        result = json.loads(redis_client.get(f"{RESULTS_CACHE_PREFIX}{request_id}"))
+        assert result == {'status': 'completed', 'result': "traitement_recommandé : Observation"}
+    assert redis_client.get(CACHE_KEY) == "traitement_recommandé : Observation"
+    assert not any(redis_client.exists(key) for key in get_inflight_keys(CACHE_KEY))
+    #the batch was recorded in the worker's metrics
+    assert REGISTRY.get_sample_value('translation_batch_jobs_count', {'language': 'french'}) >= 1
+    #and in the throughput buckets read by the API's admission control
+    [throughput_key] = redis_client.keys("translation_throughput:fr:*")
+    assert redis_client.hget(throughput_key, 'jobs') == "1"
+
+#tests that the submit script queues on a stream when the stream backend is selected
+def test_submit_to_stream():
+    redis_client = fakeredis.FakeRedis(decode_responses=True)
+    inflight_key, waiters_key = get_inflight_keys(CACHE_KEY)
+    task = json.dumps({'id': "req-1", 'text': "recommended_treatment: Observation", 'lang': "french"})
+
+    outcome = redis_client.register_script(SUBMIT_SCRIPT)(
+        keys=[CACHE_KEY, inflight_key, waiters_key, f"{RESULTS_CACHE_PREFIX}req-1", get_request_stream_key("french")],
+        args=["req-1", json.dumps({'status': 'queued', 'result': None}), task, 3600, INFLIGHT_TTL, 'stream']
+    )
+
+    assert outcome == ['queued', "req-1"]
+    [(_, fields)] = redis_client.xrange(get_request_stream_key("french"))
+    assert json.loads(fields['task'])['id'] == "req-1"
+    assert redis_client.llen(QUEUE_KEY) == 0
@@ -0,0 +1,71 @@
+import os
+import json
+os.environ.setdefault('SERVICE_TOKEN_SECRET', 'test-secret-value')
+
+import fakeredis
+
+from app.services.codec import encode_job, decode_job, encode_translation, decode_translation
+from app.worker.migrate_storage import migrate
+from app.services.keys import get_translation_cache_key
+
+LONG_TRANSLATION = "Su informe muestra un cáncer de endometrio de bajo grado confinado al revestimiento uterino. " * 4
+
+#a client configured like the service's, so binary values come back as str
+def make_redis():
+    return fakeredis.FakeRedis(decode_responses=True, encoding_errors='surrogateescape')
+
+#tests that jobs round-trip in both formats, and that JSON jobs from older versions are still read
+def test_job_round_trip():
+    job = {'id': "abc", 'text': "Hello", 'lang': "french", 'queued_at': 1700000000.5, 'priority': "bulk"}
+
+    compact = encode_job(job, compact=True)
+
+    assert decode_job(compact) == job
+    assert decode_job(encode_job(job, compact=False)) == job
+    assert len(compact) < len(json.dumps(job))
+    #fields outside the fixed layout are kept, and missing ones stay missing
+    assert decode_job(encode_job({'id': "x", 'text': "Hi", 'lang': "hindi", 'tier': "fast"}, compact=True)) == \
+        {'id': "x", 'text': "Hi", 'lang': "hindi", 'tier': "fast"}
+
+#tests that only long translations are compressed, and that both forms decode to the text
+def test_translation_compression_threshold():
+    assert encode_translation("Observación", compact=True, min_bytes=200) == "Observación"
+    assert encode_translation(LONG_TRANSLATION, compact=False) == LONG_TRANSLATION
+
+    compressed = encode_translation(LONG_TRANSLATION, compact=True, min_bytes=200)
+
+    assert isinstance(compressed, bytes)
+    assert len(compressed) < len(LONG_TRANSLATION.encode('utf-8'))
+    assert decode_translation(compressed) == LONG_TRANSLATION
+    assert decode_translation("Observación") == "Observación"
+    assert decode_translation(None) is None
+
+#tests that compressed values and msgpack jobs survive a round-trip through a decoding Redis client
+def test_binary_values_through_redis():
+    redis_client = make_redis()
+    redis_client.set("translation_cache:a", encode_translation(LONG_TRANSLATION, compact=True))
+    redis_client.rpush("queue", encode_job({'id': "j", 'text': "Hello", 'lang': "french"}, compact=True))
+
+    assert decode_translation(redis_client.get("translation_cache:a")) == LONG_TRANSLATION
+    assert decode_job(redis_client.lpop("queue")) == {'id': "j", 'text': "Hello", 'lang': "french"}
+
+#tests that the migration compresses existing translations in place, keeps their TTL, and can be undone
+def test_migrate_storage():
+    redis_client = make_redis()
+    long_key = get_translation_cache_key("long note", "spanish")
+    short_key = get_translation_cache_key("short", "spanish")
+    redis_client.set(long_key, LONG_TRANSLATION, ex=3600)
+    redis_client.set(short_key, "Observación", ex=3600)
+
+    stats = migrate(redis_client, compact=True, batch_size=1)
+
+    assert stats["keys"] == 2 and stats["rewritten"] == 1
+    assert stats["bytes_after"] < stats["bytes_before"]
+    assert redis_client.get(long_key).startswith('\x00z')
+    assert decode_translation(redis_client.get(long_key)) == LONG_TRANSLATION
+    assert 0 < redis_client.ttl(long_key) <= 3600
+
+    migrate(redis_client, compact=False)
+
+    assert redis_client.get(long_key) == LONG_TRANSLATION
+    assert redis_client.get(short_key) == "Observación"
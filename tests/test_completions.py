@@ -0,0 +1,34 @@
+import os
+os.environ.setdefault('SERVICE_TOKEN_SECRET', 'test-secret-value')
+
+import asyncio
+import fakeredis
+
+from app.api.completions import CompletionListener
+
+#tests that a published request ID wakes only the requests waiting for it
+def test_listener_wakes_waiting_requests():
+    async def scenario():
+        redis_client = fakeredis.FakeAsyncRedis(decode_responses=True)
+        listener = CompletionListener(redis_client, channel="test_completed")
+        listener.start()
+        #let the listener subscribe
+        while (await redis_client.pubsub_numsub("test_completed"))[0][1] == 0:
+            await asyncio.sleep(0.01)
+
+        waiting = listener.register(["a", "b"])
+        other = listener.register(["c"])
+        await redis_client.publish("test_completed", "b")
+
+        assert await asyncio.wait_for(waiting.get(), timeout=1) == "b"
+        assert other.empty()
+
+        #nothing is delivered once the request has stopped waiting
+        listener.unregister(["a", "b"], waiting)
+        await redis_client.publish("test_completed", "a")
+        await asyncio.sleep(0.05)
+        assert waiting.empty()
+        assert listener._waiters == {"c": {other}}
+        await listener.stop()
+
+    asyncio.run(scenario())
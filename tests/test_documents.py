@@ -0,0 +1,91 @@
+import os
+os.environ.setdefault('SERVICE_TOKEN_SECRET', 'test-secret-value')
+
+import json
+from unittest.mock import patch
+
+import pytest
+import fakeredis
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.api.endpoints import get_redis
+from app.services.codec import decode_job
+from app.services.coalescing import FINISH_SCRIPT
+from app.services.keys import get_translation_cache_key, get_request_queue_key
+from app.services.translation_engine import process_batch
+
+client = TestClient(app)
+
+#points the API at an in-memory Redis and returns a synchronous client on the same data, as the worker sees it
+#every request gets its own asyncio client, since the test client runs each request on a new event loop
+@pytest.fixture
+def redis_client():
+    server = fakeredis.FakeServer()
+    app.dependency_overrides[get_redis] = lambda: fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+    yield fakeredis.FakeRedis(server=server, decode_responses=True)
+    app.dependency_overrides.clear()
+
+#pops the queued jobs of a language's bulk lane and translates them the way the worker does
+def run_worker(redis_client, lang):
+    queue_key = get_request_queue_key(lang, "bulk")
+    jobs = [decode_job(value) for value in redis_client.lpop(queue_key, redis_client.llen(queue_key))]
+    translator = lambda texts, batch_size: [{'translation_text': f"<{text}>"} for text in texts]
+    with patch("app.services.translation_engine.get_translation_pipeline", return_value=(translator, None)):
+        process_batch(redis_client, lang, jobs, redis_client.register_script(FINISH_SCRIPT))
+    return jobs
+
+def read_results(document_id, **params):
+    with client.stream("GET", f"/api/documents/{document_id}/results", params=params) as response:
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        return [json.loads(line) for line in response.iter_lines() if line]
+
+#tests that a JSONL upload answers cache hits at once, queues the rest and streams every result
+def test_jsonl_document(redis_client):
+    redis_client.set(get_translation_cache_key("Observation", "french"), "Surveillance")
+    body = "\n".join([
+        json.dumps({"text": "Observation"}),
+        json.dumps({"text": "Take with food."}),
+        "not json",
+        json.dumps({"text": "Rest at home."}),
+    ])
+
+    response = client.post("/api/documents?target_language=French", content=body,
+                           headers={"Content-Type": "application/x-ndjson"})
+
+    assert response.status_code == 202
+    progress = response.json()
+    assert (progress["status"], progress["total"], progress["cached"], progress["failed"], progress["pending"]) == \
+        ("processing", 4, 1, 1, 2)
+    #the results so far: the cache hit and the unreadable line
+    assert {(line["index"], line["status"]) for line in read_results(progress["document_id"], follow="false")} == \
+        {(0, "completed"), (2, "failed")}
+
+    jobs = run_worker(redis_client, "french")
+
+    assert [(job["index"], job["text"]) for job in jobs] == [(1, "Take with food."), (3, "Rest at home.")]
+    assert client.get(f"/api/documents/{progress['document_id']}").json()["status"] == "completed"
+    results = read_results(progress["document_id"])
+    assert sorted((line["index"], line["result"], line["from_cache"]) for line in results if line["status"] == "completed") == [
+        (0, "Surveillance", True), (1, "<Take with food.>", False), (3, "<Rest at home.>", False)
+    ]
+    #a client that reconnects with the last cursor it received gets nothing twice
+    assert read_results(progress["document_id"], after=results[1]["cursor"]) == results[2:]
+
+#tests that CSV records are read from the named column, including quoted fields that span lines
+def test_csv_document(redis_client):
+    body = 'id,note\n1,"Take twice daily.\nWith food."\n2,"Rest, then walk."\n3,\n'
+
+    response = client.post("/api/documents?target_language=spanish&text_field=note", content=body,
+                           headers={"Content-Type": "text/csv"})
+
+    assert response.json()["total"] == 3 and response.json()["failed"] == 1
+    queued = [decode_job(value)["text"] for value in redis_client.lrange(get_request_queue_key("spanish", "bulk"), 0, -1)]
+    assert queued == ["Take twice daily.\nWith food.", "Rest, then walk."]
+
+#tests that a CSV file without the text column is rejected before anything is queued
+def test_csv_document_without_text_column(redis_client):
+    response = client.post("/api/documents?target_language=spanish&format=csv", content="id,body\n1,Hello\n")
+
+    assert response.status_code == 422
+    assert not redis_client.keys("translation_document*")
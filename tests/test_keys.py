@@ -0,0 +1,43 @@
+import os
+os.environ.setdefault('SERVICE_TOKEN_SECRET', 'test-secret-value')
+
+import unicodedata
+from unittest.mock import patch
+
+from app.services import keys
+from app.services.keys import get_translation_cache_key, canonicalize_text
+from app.core import config
+
+#tests that requests differing only in language spelling, whitespace or Unicode form share a key
+def test_equivalent_requests_share_a_key():
+    key = get_translation_cache_key("Café au lait, please.", "french")
+
+    assert get_translation_cache_key("Café au lait, please.", "French") == key
+    assert get_translation_cache_key("Café au lait, please.", "fr") == key
+    assert get_translation_cache_key("  Café  au lait,\tplease. \n", "french") == key
+    assert get_translation_cache_key(unicodedata.normalize('NFD', "Café au lait, please."), "french") == key
+    assert get_translation_cache_key("Café au lait, please.", "spanish") != key
+    assert get_translation_cache_key("café au lait, please.", "french") != key
+
+#tests that line breaks are kept, since they shape the translation, while line endings are unified
+def test_line_breaks_are_kept():
+    assert canonicalize_text("Take twice daily. \r\n\r\nWith food.\r\n") == "Take twice daily.\n\nWith food."
+    assert get_translation_cache_key("One.\nTwo.", "french") != get_translation_cache_key("One. Two.", "french")
+
+#tests that a language's translations are keyed apart once its backend or the key version changes
+def test_key_includes_model_and_version():
+    key = get_translation_cache_key("Hello", "french")
+
+    with patch.dict(config.LANGUAGE_BACKENDS, {"french": "ctranslate2"}):
+        assert get_translation_cache_key("Hello", "french") != key
+        assert get_translation_cache_key("Hello", "spanish") == get_translation_cache_key("Hello", "es")
+    with patch.object(keys, 'CACHE_KEY_VERSION', "2"):
+        assert get_translation_cache_key("Hello", "french") != key
+
+#tests that each quality tier is keyed apart, while the default tier keeps the keys it had before tiers
+def test_key_includes_quality():
+    key = get_translation_cache_key("Hello", "french")
+
+    assert get_translation_cache_key("Hello", "french", config.DEFAULT_QUALITY) == key
+    assert get_translation_cache_key("Hello", "french", "fast") != key
+    assert get_translation_cache_key("Hello", "french", "best") != get_translation_cache_key("Hello", "french", "fast")
@@ -0,0 +1,66 @@
+import os
+os.environ.setdefault('SERVICE_TOKEN_SECRET', 'test-secret-value')
+
+from unittest.mock import patch
+
+from app.api.l1_cache import LocalTTLCache
+
+#tests that the least recently used entry is evicted once the entry limit is reached
+def test_evicts_least_recently_used():
+    cache = LocalTTLCache(max_entries=2, max_bytes=1024, ttl=60)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    #reading 'a' makes 'b' the least recently used entry
+    assert cache.get("a") == "1"
+    cache.set("c", "3")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.get("c") == "3"
+    assert cache.stats()["evictions"] == 1
+
+#tests that the byte budget is enforced and oversized values are never stored
+def test_respects_byte_budget():
+    cache = LocalTTLCache(max_entries=100, max_bytes=10, ttl=60)
+    cache.set("a", "1234")
+    cache.set("b", "5678")
+    assert cache.stats()["bytes"] == 10
+
+    #pushes the total over budget, so 'a' is evicted
+    cache.set("c", "9")
+    assert cache.get("a") is None
+    assert cache.stats()["bytes"] <= 10
+
+    cache.set("big", "x" * 100)
+    assert cache.get("big") is None
+
+#tests that entries stop being served once their TTL has passed
+def test_expires_entries():
+    cache = LocalTTLCache(max_entries=10, max_bytes=1024, ttl=5)
+    with patch('app.api.l1_cache.time.monotonic', return_value=100.0):
+        cache.set("a", "1")
+    with patch('app.api.l1_cache.time.monotonic', return_value=104.0):
+        assert cache.get("a") == "1"
+    with patch('app.api.l1_cache.time.monotonic', return_value=105.0):
+        assert cache.get("a") is None
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["expirations"] == 1
+    assert stats["entries"] == 0
+
+#tests that a per-entry TTL shortens, but never extends, the cache-wide TTL
+def test_entry_ttl_is_capped():
+    cache = LocalTTLCache(max_entries=10, max_bytes=1024, ttl=5)
+    with patch('app.api.l1_cache.time.monotonic', return_value=100.0):
+        cache.set("short", "1", ttl=2)
+        cache.set("long", "2", ttl=60)
+        #a key that has already expired in Redis is not cached at all
+        cache.set("gone", "3", ttl=0)
+    with patch('app.api.l1_cache.time.monotonic', return_value=103.0):
+        assert cache.get("short") is None
+        assert cache.get("long") == "2"
+        assert cache.get("gone") is None
+    with patch('app.api.l1_cache.time.monotonic', return_value=105.0):
+        assert cache.get("long") is None
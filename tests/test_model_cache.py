@@ -0,0 +1,74 @@
+import os
+os.environ.setdefault('SERVICE_TOKEN_SECRET', 'test-secret-value')
+
+import time
+import pytest
+from threading import Thread, Event
+from unittest.mock import patch
+
+from app.services.model_cache import ModelCache
+
+#every fake model is counted as 100 bytes
+@pytest.fixture(autouse=True)
+def fixed_model_size():
+    with patch('app.services.model_cache.estimate_model_bytes', return_value=100):
+        yield
+
+#tests that the least recently used model is evicted once the memory budget is exceeded
+def test_evicts_least_recently_used():
+    cache = ModelCache(max_bytes=200)
+    cache.get("fr", lambda: "fr-model")
+    cache.get("es", lambda: "es-model")
+    #using 'fr' makes 'es' the coldest model
+    assert cache.get("fr", lambda: "reloaded") == "fr-model"
+    cache.get("zh", lambda: "zh-model")
+
+    assert cache.keys() == ["fr", "zh"]
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["loads"], stats["evictions"]) == (1, 3, 3, 1)
+    assert stats["bytes"] == 200
+
+#tests that pinned models stay loaded however cold they are
+def test_pinned_models_are_not_evicted():
+    cache = ModelCache(max_bytes=200, pinned={"fr"})
+    for key in ["fr", "es", "zh", "hi"]:
+        cache.get(key, lambda key=key: f"{key}-model")
+
+    assert cache.keys() == ["fr", "hi"]
+
+#tests that a failed load is reported to the caller and retried on the next use
+def test_failed_load_is_not_cached():
+    cache = ModelCache(max_bytes=200)
+    def broken():
+        raise OSError("download failed")
+
+    with pytest.raises(OSError):
+        cache.get("fr", broken)
+    assert cache.get("fr", lambda: "fr-model") == "fr-model"
+    assert cache.stats()["load_failures"] == 1
+
+#tests that a slow load only blocks threads waiting for the same model
+def test_slow_load_does_not_block_other_models():
+    cache = ModelCache(max_bytes=1000)
+    release = Event()
+    loads = []
+
+    def slow_loader():
+        loads.append("fr")
+        release.wait(5)
+        return "fr-model"
+
+    threads = [Thread(target=cache.get, args=("fr", slow_loader)) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+
+    #another language loads while 'fr' is still loading
+    assert cache.get("es", lambda: "es-model") == "es-model"
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    #the three concurrent requests for 'fr' shared a single load
+    assert loads == ["fr"]
+    assert cache.get("fr", lambda: "reloaded") == "fr-model"
@@ -0,0 +1,65 @@
+import os
+os.environ.setdefault('SERVICE_TOKEN_SECRET', 'test-secret-value')
+
+import json
+from unittest.mock import patch
+
+import pytest
+import fakeredis
+
+from app.worker import prewarm
+from app.services.keys import get_translation_cache_key
+
+#records the texts sent to the model and translates them to "<text>"
+class FakeTranslator:
+    tokenizer = None
+
+    def __init__(self, fail_after: int | None = None):
+        self.calls = []
+        self.fail_after = fail_after
+
+    def __call__(self, texts, batch_size):
+        if self.fail_after is not None and len(self.calls) >= self.fail_after:
+            raise RuntimeError("killed")
+        self.calls.append(texts)
+        return [{'translation_text': f"<{text}>"} for text in texts]
+
+def write_corpus(tmp_path, lines):
+    corpus = tmp_path / "phrases.txt"
+    corpus.write_text("\n".join(lines) + "\n")
+    return str(corpus)
+
+#tests that only phrases missing from the cache are translated, once each, and cached with the TTL
+def test_prewarm_translates_misses_once(tmp_path):
+    redis_client = fakeredis.FakeRedis(decode_responses=True)
+    redis_client.set(get_translation_cache_key("Observation", "french"), "Surveillance")
+    corpus = write_corpus(tmp_path, ["Observation", "Follow-up", "Follow-up ", "", "Observation"])
+    translator = FakeTranslator()
+
+    with patch.object(prewarm, 'get_translation_pipeline', return_value=(translator, None)):
+        stats = prewarm.prewarm(redis_client, corpus, ["french"], ttl=600)
+
+    assert translator.calls == [["Follow-up"]]
+    assert stats['requests'] == 4 and stats['unique'] == 2 and stats['cached'] == 1 and stats['translated'] == 1
+    key = get_translation_cache_key("Follow-up", "french")
+    assert redis_client.get(key) == "<Follow-up>"
+    assert 0 < redis_client.ttl(key) <= 600
+
+#tests that an interrupted run resumes after the last finished chunk of its checkpoint
+def test_prewarm_resumes_from_checkpoint(tmp_path):
+    redis_client = fakeredis.FakeRedis(decode_responses=True)
+    corpus = write_corpus(tmp_path, [f"Phrase {i}" for i in range(6)])
+    checkpoint = str(tmp_path / "prewarm.json")
+
+    with patch.object(prewarm, 'get_translation_pipeline', return_value=(FakeTranslator(fail_after=2), None)):
+        with pytest.raises(RuntimeError):
+            prewarm.prewarm(redis_client, corpus, ["french"], chunk_size=2, checkpoint=checkpoint)
+    assert json.load(open(checkpoint))['stats']['phrases'] == 4
+
+    translator = FakeTranslator()
+    with patch.object(prewarm, 'get_translation_pipeline', return_value=(translator, None)):
+        stats = prewarm.prewarm(redis_client, corpus, ["french"], chunk_size=2, checkpoint=checkpoint)
+
+    assert translator.calls == [["Phrase 4", "Phrase 5"]]
+    assert stats['phrases'] == 6 and stats['translated'] == 6
+    assert all(redis_client.get(get_translation_cache_key(f"Phrase {i}", "french")) for i in range(6))
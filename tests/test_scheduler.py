@@ -0,0 +1,105 @@
+import os
+import json
+import time
+os.environ.setdefault('SERVICE_TOKEN_SECRET', 'test-secret-value')
+
+import fakeredis
+
+from app.services.scheduler import BatchScheduler, LanePicker, get_request_queue_key, migrate_legacy_queue
+from app.core.config import REQUEST_QUEUE_KEY, RESULTS_CACHE_PREFIX
+
+#pushes n jobs for one language and lane, enqueued `age` seconds ago
+def enqueue(redis_client, lang, n, age=0.0, priority="interactive"):
+    for i in range(n):
+        task = {'id': f"{lang}-{i}", 'text': f"text {i}", 'lang': lang, 'queued_at': time.time() - age, 'priority': priority}
+        redis_client.rpush(get_request_queue_key(lang, priority), json.dumps(task))
+
+#tests that the fullest queue is served first and drained in a single batch
+def test_serves_fullest_queue():
+    redis_client = fakeredis.FakeRedis(decode_responses=True)
+    enqueue(redis_client, "french", 2)
+    enqueue(redis_client, "spanish", 10)
+    scheduler = BatchScheduler(redis_client, batch_size=8, max_wait=60)
+
+    lang, jobs = scheduler.next_batch()
+
+    assert lang == "spanish"
+    assert len(jobs) == 8
+    assert {job['lang'] for job in jobs} == {"spanish"}
+    assert redis_client.llen(get_request_queue_key("spanish")) == 2
+
+#tests that a queue whose oldest job has waited too long is served before a fuller one
+def test_serves_old_jobs_before_full_queues():
+    redis_client = fakeredis.FakeRedis(decode_responses=True)
+    enqueue(redis_client, "hindi", 1, age=5.0)
+    enqueue(redis_client, "spanish", 8)
+    scheduler = BatchScheduler(redis_client, batch_size=8, max_wait=2.0)
+
+    lang, jobs = scheduler.next_batch()
+
+    assert lang == "hindi"
+    assert [job['id'] for job in jobs] == ["hindi-0"]
+
+#tests that an idle scheduler returns an empty batch after its blocking timeout
+def test_empty_queues():
+    redis_client = fakeredis.FakeRedis(decode_responses=True)
+    scheduler = BatchScheduler(redis_client, block_timeout=0.01)
+
+    assert scheduler.next_batch() == (None, [])
+
+#tests that jobs from the old shared queue are moved to their language queues
+def test_migrate_legacy_queue():
+    redis_client = fakeredis.FakeRedis(decode_responses=True)
+    redis_client.rpush(REQUEST_QUEUE_KEY, json.dumps({'id': "a", 'text': "Hello", 'lang': "French"}))
+    redis_client.rpush(REQUEST_QUEUE_KEY, json.dumps({'id': "b", 'text': "Hello", 'lang': "klingon"}))
+
+    assert migrate_legacy_queue(redis_client) == 2
+
+    assert redis_client.llen(REQUEST_QUEUE_KEY) == 0
+    assert json.loads(redis_client.lindex(get_request_queue_key("french"), 0))['id'] == "a"
+    #the unsupported job is failed instead of queued
+    assert json.loads(redis_client.get(f"{RESULTS_CACHE_PREFIX}b"))['status'] == "failed"
+
+#tests that jobs pushed to the old shared queue after startup are still routed and served
+def test_routes_legacy_jobs_while_running():
+    redis_client = fakeredis.FakeRedis(decode_responses=True)
+    scheduler = BatchScheduler(redis_client, block_timeout=0.01)
+    redis_client.rpush(REQUEST_QUEUE_KEY, json.dumps({'id': "old", 'text': "Hello", 'lang': "Spanish"}))
+
+    lang, jobs = scheduler.next_batch()
+
+    assert lang == "spanish"
+    assert [job['id'] for job in jobs] == ["old"]
+    assert redis_client.llen(REQUEST_QUEUE_KEY) == 0
+
+#tests that a job without a timestamp counts as due, and one from a fast API clock as not waiting
+def test_job_age_without_or_ahead_of_clock():
+    scheduler = BatchScheduler(fakeredis.FakeRedis(decode_responses=True), max_wait=2.0)
+
+    assert scheduler._age(json.dumps({'id': "a"}), now=100.0) == 2.0
+    assert scheduler._age(json.dumps({'id': "b", 'queued_at': 105.0}), now=100.0) == 0.0
+    assert scheduler._age(json.dumps({'id': "c", 'queued_at': 97.0}), now=100.0) == 3.0
+
+#tests that the lane picker serves lanes in proportion to their weights, and the only ready lane otherwise
+def test_lane_picker_weights():
+    picker = LanePicker({"interactive": 4, "bulk": 1})
+
+    lanes = [picker.pick(["interactive", "bulk"]) for _ in range(10)]
+
+    assert lanes.count("bulk") == 2
+    assert lanes[:3] == ["interactive", "interactive", "bulk"]
+    assert picker.pick(["bulk"]) == "bulk"
+
+#tests that interactive jobs are served ahead of a bulk back-fill, which still gets its share
+def test_interactive_lane_served_ahead_of_bulk():
+    redis_client = fakeredis.FakeRedis(decode_responses=True)
+    enqueue(redis_client, "spanish", 40, age=60.0, priority="bulk")
+    enqueue(redis_client, "french", 40, priority="interactive")
+    scheduler = BatchScheduler(redis_client, batch_size=4, max_wait=2.0, lane_weights={"interactive": 4, "bulk": 1})
+
+    batches = [scheduler.next_batch() for _ in range(5)]
+
+    #the bulk jobs are much older, yet get one batch out of five
+    assert [lang for lang, _ in batches] == ["french", "french", "spanish", "french", "french"]
+    assert {job['priority'] for _, jobs in batches for job in jobs if job['lang'] == "spanish"} == {"bulk"}
+    assert redis_client.llen(get_request_queue_key("spanish", "bulk")) == 36
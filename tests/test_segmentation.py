@@ -0,0 +1,68 @@
+import os
+os.environ.setdefault('SERVICE_TOKEN_SECRET', 'test-secret-value')
+
+from unittest.mock import MagicMock
+
+from app.services.segmentation import split_into_segments, join_segments
+from app.services.translation_engine import translate_texts
+from app.services.keys import get_translation_cache_key
+
+NOTE = (
+    "patient_notes: Your report shows a low-grade endometrial cancer confined to the uterine lining. "
+    "No further treatment is typically necessary.  We recommend close monitoring, e.g. regular follow-up appointments!"
+)
+
+#tests that a paragraph is split into sentences and joins back to the exact original text
+def test_split_round_trip():
+    segments, separators = split_into_segments(NOTE)
+
+    assert segments == [
+        "patient_notes: Your report shows a low-grade endometrial cancer confined to the uterine lining.",
+        "No further treatment is typically necessary.",
+        "We recommend close monitoring, e.g. regular follow-up appointments!",
+    ]
+    assert separators == [" ", "  ", ""]
+    assert join_segments(segments, separators) == NOTE
+
+#tests that short labels without sentence punctuation stay a single segment
+def test_split_single_segment():
+    assert split_into_segments("recommended_treatment: Observation") == (["recommended_treatment: Observation"], [""])
+
+#tests that an overlong sentence is cut at word boundaries instead of being truncated
+def test_split_long_sentence():
+    sentence = " ".join(["word"] * 50)
+    segments, separators = split_into_segments(sentence, max_chars=42)
+
+    assert all(len(segment) <= 42 for segment in segments)
+    assert len(segments) > 1
+    assert join_segments(segments, separators) == sentence
+
+#tests that sentences are joined without spaces for languages written without them
+def test_join_without_spaces():
+    assert join_segments(["你好。", "再见。"], [" ", ""], "chinese") == "你好。再见。"
+    assert join_segments(["Bonjour.", "Au revoir."], [" ", ""], "french") == "Bonjour. Au revoir."
+
+#tests that only uncached, unique sentences are sent to the model and results are reassembled
+def test_translate_texts_uses_segment_cache():
+    cached_key = get_translation_cache_key("No further treatment is needed.", "french")
+    redis_client = MagicMock()
+    redis_client.mget.side_effect = lambda keys: ["Aucun traitement." if key == cached_key else None for key in keys]
+    translator = MagicMock(side_effect=lambda texts, batch_size: [{"translation_text": f"<{text}>"} for text in texts])
+    translator.tokenizer = None
+
+    texts = [
+        "You are healthy. No further treatment is needed.",
+        "You are healthy. See you soon.",
+    ]
+    results, new_cache_entries = translate_texts(redis_client, translator, "french", texts)
+
+    #'You are healthy.' is translated once even though both texts contain it, shortest input first
+    translator.assert_called_once_with(["See you soon.", "You are healthy."], batch_size=2)
+    assert results == [
+        "<You are healthy.> Aucun traitement.",
+        "<You are healthy.> <See you soon.>",
+    ]
+    assert new_cache_entries == {
+        get_translation_cache_key("You are healthy.", "french"): "<You are healthy.>",
+        get_translation_cache_key("See you soon.", "french"): "<See you soon.>",
+    }
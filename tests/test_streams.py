@@ -0,0 +1,113 @@
+import os
+import json
+import time
+os.environ.setdefault('SERVICE_TOKEN_SECRET', 'test-secret-value')
+
+import fakeredis
+
+from app.services.streams import StreamScheduler, migrate_lists_to_streams
+from app.services.keys import get_request_queue_key, get_request_stream_key
+from app.core.config import RESULTS_CACHE_PREFIX, STREAM_GROUP
+
+#adds n jobs for one language to its stream, the way the submit script does
+def enqueue(redis_client, lang, n):
+    for i in range(n):
+        task = {'id': f"{lang}-{i}", 'text': f"text {i}", 'lang': lang, 'queued_at': time.time()}
+        redis_client.xadd(get_request_stream_key(lang), {'task': json.dumps(task)})
+
+def make_scheduler(redis_client, consumer, **kwargs):
+    options = dict(batch_size=8, max_wait=60, block_timeout=0.01, claim_idle=0.05, claim_interval=0)
+    options.update(kwargs)
+    return StreamScheduler(redis_client, consumer=consumer, **options)
+
+def pending_count(redis_client, lang):
+    return redis_client.xpending(get_request_stream_key(lang), STREAM_GROUP)['pending']
+
+#tests that jobs stay pending until acknowledged, and are deleted from the stream then
+def test_ack_after_save():
+    redis_client = fakeredis.FakeRedis(decode_responses=True)
+    scheduler = make_scheduler(redis_client, "worker-a")
+    enqueue(redis_client, "french", 3)
+
+    lang, jobs = scheduler.next_batch()
+
+    assert lang == "french"
+    assert [job['id'] for job in jobs] == ["french-0", "french-1", "french-2"]
+    assert pending_count(redis_client, "french") == 3
+
+    scheduler.ack(jobs)
+
+    assert pending_count(redis_client, "french") == 0
+    assert redis_client.xlen(get_request_stream_key("french")) == 0
+
+#tests that the jobs of a worker that died before acknowledging are taken over by another one
+def test_reclaims_jobs_of_dead_consumer():
+    redis_client = fakeredis.FakeRedis(decode_responses=True)
+    dead = make_scheduler(redis_client, "worker-dead")
+    enqueue(redis_client, "spanish", 2)
+    _, lost_jobs = dead.next_batch()
+    assert len(lost_jobs) == 2
+
+    time.sleep(0.1)
+    survivor = make_scheduler(redis_client, "worker-alive")
+    lang, jobs = survivor.next_batch()
+
+    assert lang == "spanish"
+    assert [job['id'] for job in jobs] == ["spanish-0", "spanish-1"]
+    consumers = redis_client.xpending(get_request_stream_key("spanish"), STREAM_GROUP)['consumers']
+    assert consumers == [{'name': "worker-alive", 'pending': 2}]
+
+#tests that a redelivered job whose result was already saved is acknowledged, not translated again
+def test_redelivered_finished_job_is_skipped():
+    redis_client = fakeredis.FakeRedis(decode_responses=True)
+    dead = make_scheduler(redis_client, "worker-dead")
+    enqueue(redis_client, "hindi", 2)
+    dead.next_batch()
+    #the worker saved the first result, then died before acknowledging
+    redis_client.set(f"{RESULTS_CACHE_PREFIX}hindi-0", json.dumps({'status': 'completed', 'result': "done"}))
+
+    time.sleep(0.1)
+    lang, jobs = make_scheduler(redis_client, "worker-alive").next_batch()
+
+    assert [job['id'] for job in jobs] == ["hindi-1"]
+    assert pending_count(redis_client, "hindi") == 1
+
+#tests that a job that keeps getting lost is failed once it reaches max_deliveries
+def test_fails_job_after_max_deliveries():
+    redis_client = fakeredis.FakeRedis(decode_responses=True)
+    enqueue(redis_client, "arabic", 1)
+    make_scheduler(redis_client, "worker-0").next_batch()
+    time.sleep(0.1)
+    make_scheduler(redis_client, "worker-1", max_deliveries=2).next_batch()
+    time.sleep(0.1)
+
+    lang, jobs = make_scheduler(redis_client, "worker-2", max_deliveries=2).next_batch()
+
+    assert jobs == []
+    assert json.loads(redis_client.get(f"{RESULTS_CACHE_PREFIX}arabic-0"))['status'] == 'failed'
+    assert pending_count(redis_client, "arabic") == 0
+
+#tests that jobs left on the list queues are moved to the streams in order
+def test_migrate_lists_to_streams():
+    redis_client = fakeredis.FakeRedis(decode_responses=True)
+    for i in range(10):
+        redis_client.rpush(get_request_queue_key("french"), json.dumps({'id': f"french-{i}", 'text': "Hi", 'lang': "french"}))
+
+    assert migrate_lists_to_streams(redis_client) == 10
+
+    assert redis_client.llen(get_request_queue_key("french")) == 0
+    _, jobs = make_scheduler(redis_client, "worker-a", batch_size=16).next_batch()
+    assert [job['id'] for job in jobs] == [f"french-{i}" for i in range(10)]
+
+#tests that the stream scheduler weighs the lanes like the list scheduler
+def test_stream_lanes():
+    redis_client = fakeredis.FakeRedis(decode_responses=True)
+    scheduler = make_scheduler(redis_client, "worker-a", batch_size=2, lane_weights={"interactive": 1, "bulk": 1})
+    for i in range(4):
+        task = {'id': f"bulk-{i}", 'text': "Hi", 'lang': "french", 'priority': "bulk"}
+        redis_client.xadd(get_request_stream_key("french", "bulk"), {'task': json.dumps(task)})
+    enqueue(redis_client, "spanish", 4)
+
+    lanes = [scheduler.next_batch()[0] for _ in range(2)]
+
+    assert lanes == ["spanish", "french"]
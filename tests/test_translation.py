@@ -111,7 +111,8 @@ def test_batch(target_language):
         while pending_ids and (time.time() - start_time) < timeout_seconds:
             for req_id in list(pending_ids):
                 try:
-                    result_response = requests.get(f"{BASE_URL}/result/{req_id}")
+                    #the server holds the request until the job finishes (or 10s pass) instead of us sleeping
+                    result_response = requests.get(f"{BASE_URL}/result/{req_id}", params={"wait": 10})
                     #check if the /result endpoint is working
                     if result_response.status_code == 200:
                         result_data = result_response.json()
@@ -122,8 +123,6 @@ def test_batch(target_language):
                             pending_ids.remove(req_id)
                 except requests.exceptions.RequestException as e:
                     print(f"Warning: Could not poll for request ID {req_id}: {e}")
-
-            time.sleep(1)
         assert len(pending_ids) == 0, f"Test timed out. {len(pending_ids)} jobs did not complete for {target_language}."
 
     end_time = time.time()
@@ -138,6 +137,8 @@ def test_batch(target_language):
     openai_client = OpenAI(api_key=openai_api_key)
     similarity_scores = []
     current_language_results = []
+    #entries to score, with their service and OpenAI translations; they are encoded together once every reference is in
+    to_score = []
 
     for data in completed_results:
         result_entry = {"Original Term": data.get('original', 'N/A')}
@@ -151,12 +152,7 @@ def test_batch(target_language):
 
             #check if OpenAI call was successful
             if openai_translation != "N/A":
-                #compare the results using embeddings
-                service_embedding = embedding_model.encode([service_translation])
-                openai_embedding = embedding_model.encode([openai_translation])
-                score = cosine_similarity(service_embedding, openai_embedding)[0][0]
-                similarity_scores.append(score)
-                result_entry["Similarity Score"] = f"{score:.4f}"
+                to_score.append((result_entry, service_translation, openai_translation))
         else:
             result_entry["Service Translation"] = data.get('service_translation', 'SERVICE FAILED')
             result_entry["OpenAI Translation"] = "N/A"
@@ -164,6 +160,15 @@ def test_batch(target_language):
 
         current_language_results.append(result_entry)
 
+    #compare the results using embeddings: every translation in one encode call, every pair in one matrix operation
+    if to_score:
+        embeddings = embedding_model.encode([pair[1] for pair in to_score] + [pair[2] for pair in to_score])
+        service_embeddings, openai_embeddings = embeddings[:len(to_score)], embeddings[len(to_score):]
+        scores = cosine_similarity(service_embeddings, openai_embeddings).diagonal()
+        for (result_entry, _, _), score in zip(to_score, scores):
+            similarity_scores.append(score)
+            result_entry["Similarity Score"] = f"{score:.4f}"
+
     ANALYSIS_DIR = os.path.join("tests", "analysis")
     os.makedirs(ANALYSIS_DIR, exist_ok=True)
     #read existing json, update it, and write back
@@ -0,0 +1,62 @@
+import os
+os.environ.setdefault('SERVICE_TOKEN_SECRET', 'test-secret-value')
+
+import time
+from unittest.mock import patch
+
+import fakeredis
+
+from app.services import translation_engine
+from app.services.translation_memory import TranslationMemory
+from app.services.translation_engine import process_batch
+from app.services.coalescing import FINISH_SCRIPT
+from app.services.keys import get_translation_cache_key
+
+#tests that translations are stored and read back by key, long ones compressed
+def test_put_and_get(tmp_path):
+    memory = TranslationMemory(str(tmp_path / "memory.sqlite3"))
+    note = "Le traitement recommandé est l'observation. " * 20
+    memory.put_many({"a": "Bonjour", "b": note})
+
+    assert memory.get_many(["a", "b", "missing"]) == {"a": "Bonjour", "b": note}
+    #a second handle on the same file, as another process would open it, sees the same rows
+    assert TranslationMemory(memory.path).get_many(["a"]) == {"a": "Bonjour"}
+
+#tests that compaction deletes the least recently used translations until the data fits the budget
+def test_compact_deletes_least_recently_used(tmp_path):
+    memory = TranslationMemory(str(tmp_path / "memory.sqlite3"))
+    for i in range(200):
+        memory.put_many({f"key-{i}": f"translation {i} " * 20})
+    time.sleep(0.01)
+    #the oldest row is read again, so it is kept over the rows written after it
+    memory.get_many(["key-0"])
+    memory.max_bytes = memory.size() // 2
+
+    stats = memory.compact()
+
+    assert stats['deleted'] > 0
+    assert stats['bytes_after'] <= memory.max_bytes
+    assert memory.get_many(["key-0", "key-1", "key-199"]).keys() == {"key-0", "key-199"}
+
+#tests that the worker remembers what it translated and reads it back once Redis has lost it
+def test_worker_reads_translation_memory(tmp_path):
+    memory = TranslationMemory(str(tmp_path / "memory.sqlite3"))
+    redis_client = fakeredis.FakeRedis(decode_responses=True)
+    finish_script = redis_client.register_script(FINISH_SCRIPT)
+    translator = lambda texts, batch_size: [{'translation_text': f"<{text}>"} for text in texts]
+    job = {'id': "first", 'text': "You are healthy. See you soon.", 'lang': "french"}
+
+    with patch.object(translation_engine, 'translation_memory', memory), \
+         patch.object(translation_engine, 'get_translation_pipeline', return_value=(translator, None)):
+        process_batch(redis_client, "french", [dict(job)], finish_script)
+        #as after the Redis TTL or a restart
+        redis_client.flushdb()
+        model_calls = []
+        counting = lambda texts, batch_size: model_calls.append(texts) or translator(texts, batch_size)
+        with patch.object(translation_engine, 'get_translation_pipeline', return_value=(counting, None)):
+            process_batch(redis_client, "french", [dict(job, id="second", text="You are healthy. Goodbye.")], finish_script)
+
+    #only the sentence never seen before went to the model, the other one came back from the memory
+    assert model_calls == [["Goodbye."]]
+    assert redis_client.get(get_translation_cache_key("You are healthy.", "french")) == "<You are healthy.>"
+    assert memory.get_many([get_translation_cache_key(job['text'], "french")])
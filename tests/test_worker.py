@@ -0,0 +1,16 @@
+import os
+os.environ.setdefault('SERVICE_TOKEN_SECRET', 'test-secret-value')
+
+from unittest.mock import patch
+
+from app.worker import worker
+
+#tests that the available cores are split into one disjoint group per worker process
+def test_core_groups_split_available_cores():
+    with patch.object(worker.os, 'sched_getaffinity', return_value=set(range(8)), create=True):
+        assert worker.get_core_groups(3, 2) == [[0, 1], [2, 3], [4, 5]]
+
+#tests that processes are left unpinned when there are not enough cores for every group
+def test_core_groups_unpinned_when_oversubscribed():
+    with patch.object(worker.os, 'sched_getaffinity', return_value={0, 1}, create=True):
+        assert worker.get_core_groups(2, 4) == [None, None]